@@ -0,0 +1,115 @@
+"""Compares the Prophet and the NumPy forecast engines: fit latency, memory and alert agreement.
+
+Histories come from an organization's recorded test history (needs MONGODB_DB_URL and MONGODB_DB_NAME), from a json file
+mapping suite ids to [[executed_on, value], ...] lists, or are generated when neither is given:
+
+    python benchmarks/forecast_engine_benchmark.py --org <organizationId> --suites 200
+    python benchmarks/forecast_engine_benchmark.py --file histories.json
+
+Every history is replayed as (window, next point). Next to the recorded point, a shifted copy checks agreement on anomalies.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from quant_model import CommonModel, buildForecastEngine  # noqa: E402
+
+WINDOW_SIZE = 25
+TEST_TYPE = 'MaterializationRowCount'
+
+
+def _toProphetDtFormat(executedOn: str) -> str:
+    return datetime.fromisoformat(executedOn.replace('Z', '')).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def loadRecorded(organizationId: str, suites: int) -> "list[list[tuple[str, float]]]":
+    from pymongo import MongoClient
+    from cito_data_query import CitoTableType, getHistoryData
+
+    dbConnection = MongoClient(os.environ['MONGODB_DB_URL'])[os.environ['MONGODB_DB_NAME']]
+    testSuiteIds = dbConnection[CitoTableType.TestHistory.value + '_' + organizationId].distinct('test_suite_id')[:suites]
+
+    return [sorted((_toProphetDtFormat(entry['executed_on']), entry['value']) for entry in getHistoryData(testSuiteId, dbConnection, organizationId, WINDOW_SIZE + 1))
+            for testSuiteId in testSuiteIds]
+
+
+def loadFile(path: str) -> "list[list[tuple[str, float]]]":
+    with open(path) as file:
+        return [sorted((_toProphetDtFormat(executedOn), value) for executedOn, value in points) for points in json.load(file).values()]
+
+
+def generate(suites: int) -> "list[list[tuple[str, float]]]":
+    start = datetime(2023, 1, 1)
+    histories = []
+    for _ in range(suites):
+        level, slope, amplitude, noise = random.uniform(50, 5000), random.uniform(-2, 2), random.choice([0, 0, 0.1]), random.uniform(0.01, 0.05)
+        stepHours = random.choice([1, 6, 24])
+        histories.append([((start + timedelta(hours=index * stepHours)).strftime('%Y-%m-%d %H:%M:%S'),
+                           level + slope * index + amplitude * level * (index * stepHours % 24 < 12) + random.gauss(0, noise * level)) for index in range(WINDOW_SIZE + 1)])
+    return histories
+
+
+def _shifted(newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]") -> "tuple[str, float]":
+    values = [value for _, value in historicalData]
+    return newDataPoint[0], newDataPoint[1] + 8 * (statistics.pstdev(values) or abs(newDataPoint[1]) or 1)
+
+
+def run(engineName: str, cases: "list[tuple[tuple[str, float], list[tuple[str, float]]]]") -> "tuple[list[float], int, int, list[bool]]":
+    durations, anomalies = [], []
+    childrenBefore = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    tracemalloc.start()
+    for newDataPoint, historicalData in cases:
+        start = time.perf_counter()
+        result = CommonModel(newDataPoint, historicalData, TEST_TYPE, None, None, buildForecastEngine(engineName)).run()
+        durations.append((time.perf_counter() - start) * 1000)
+        anomalies.append(result.anomaly is not None)
+    _, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Prophet fits in a cmdstan child process, which tracemalloc does not see
+    childrenPeakKb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss - childrenBefore
+
+    return durations, peakBytes, childrenPeakKb, anomalies
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--org', help='organization whose recorded history is replayed')
+    parser.add_argument('--file', help='json file with recorded histories')
+    parser.add_argument('--suites', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    histories = loadRecorded(args.org, args.suites) if args.org else (loadFile(args.file) if args.file else generate(args.suites))
+    histories = [history for history in histories if len(history) > 10]
+
+    cases = []
+    for history in histories:
+        newDataPoint, historicalData = history[-1], history[:-1]
+        cases.append((newDataPoint, historicalData))
+        cases.append((_shifted(newDataPoint, historicalData), historicalData))
+
+    print(f'{len(histories)} histories, {len(cases)} cases (recorded and shifted next point)\n')
+
+    results = {engineName: run(engineName, cases) for engineName in ('prophet', 'numpy')}
+
+    for engineName, (durations, peakBytes, childrenPeakKb, anomalies) in results.items():
+        durations.sort()
+        print(f'{engineName:<8} mean {statistics.mean(durations):8.2f} ms   p95 {durations[int(len(durations) * 0.95)]:8.2f} ms   '
+              f'python peak {peakBytes / 1024 / 1024:6.1f} MiB   child rss growth {childrenPeakKb / 1024:6.1f} MiB   alerts {sum(anomalies)}')
+
+    prophetAnomalies, numpyAnomalies = results['prophet'][3], results['numpy'][3]
+    agreement = sum(prophetAnomaly == numpyAnomaly for prophetAnomaly, numpyAnomaly in zip(prophetAnomalies, numpyAnomalies))
+    onlyProphet = sum(prophetAnomaly and not numpyAnomaly for prophetAnomaly, numpyAnomaly in zip(prophetAnomalies, numpyAnomalies))
+    onlyNumpy = sum(numpyAnomaly and not prophetAnomaly for prophetAnomaly, numpyAnomaly in zip(prophetAnomalies, numpyAnomalies))
+    print(f'\nalert agreement {agreement / len(cases):.1%} (only prophet {onlyProphet}, only numpy {onlyNumpy})')
@@ -0,0 +1,86 @@
+"""Compares cold and warm started Prophet fits on a sliding history window: optimizer iterations, fit time and forecast drift.
+
+Every step moves the window by one point, like consecutive executions of a suite. The warm fit is initialised from the
+parameters of the previous step's warm fit:
+
+    python benchmarks/forecast_warm_start_benchmark.py --suites 10 --steps 30
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from prophet_forecast_engine import ProphetForecastEngine  # noqa: E402
+
+WINDOW_SIZE = 25
+
+
+def generate(steps: int) -> pd.DataFrame:
+    start = datetime(2023, 1, 1)
+    level, slope, noise = random.uniform(50, 5000), random.uniform(-2, 2), random.uniform(0.01, 0.05)
+    stepHours = random.choice([1, 6, 24])
+    return pd.DataFrame({'ds': [start + timedelta(hours=index * stepHours) for index in range(WINDOW_SIZE + steps)],
+                         'y': [level + slope * index + random.gauss(0, noise * level) for index in range(WINDOW_SIZE + steps)]})
+
+
+def iterations(engine: ProphetForecastEngine) -> int:
+    # cmdstan reports the optimizer progress in its console output
+    stdout = open(engine.stanFit.runset.stdout_files[0]).read()
+    return max([int(iteration) for iteration in re.findall(r'^\s*(\d+)\s+-?\d', stdout, re.MULTILINE)] +
+               [int(iteration) for iteration in re.findall(r'Iteration\s+(\d+)', stdout)] + [0])
+
+
+class _InstrumentedEngine(ProphetForecastEngine):
+    stanFit = None
+
+    def _fit(self, historicalData):
+        m = super()._fit(historicalData)
+        self.stanFit = m.stan_fit
+        return m
+
+
+def fit(window: pd.DataFrame, warmStartParams):
+    engine = _InstrumentedEngine(warmStartParams)
+    start = time.perf_counter()
+    forecast = engine.forecast(window, window['ds'].iloc[-1] + (window['ds'].iloc[-1] - window['ds'].iloc[-2]))
+    return (time.perf_counter() - start) * 1000, iterations(engine), forecast.yhat, engine.fittedParams
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--suites', type=int, default=5)
+    parser.add_argument('--steps', type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    cold, warm, drift = {'ms': [], 'iterations': []}, {'ms': [], 'iterations': []}, []
+    for _ in range(args.suites):
+        series = generate(args.steps)
+        params = None
+        for step in range(args.steps):
+            window = series.iloc[step:step + WINDOW_SIZE].reset_index(drop=True)
+
+            coldMs, coldIterations, coldYhat, _ = fit(window, None)
+            warmMs, warmIterations, warmYhat, fittedParams = fit(window, params)
+
+            # the first step of a suite has nothing to start from
+            if params is not None:
+                cold['ms'].append(coldMs)
+                cold['iterations'].append(coldIterations)
+                warm['ms'].append(warmMs)
+                warm['iterations'].append(warmIterations)
+                drift.append(abs(warmYhat - coldYhat) / (abs(coldYhat) or 1))
+            params = fittedParams
+
+    for label, results in (('cold', cold), ('warm', warm)):
+        print(f'{label:<5} fit mean {statistics.mean(results["ms"]):8.2f} ms   iterations mean {statistics.mean(results["iterations"]):6.1f}   '
+              f'median {statistics.median(results["iterations"]):5.1f}')
+    print(f'\nforecast drift warm vs cold: mean {statistics.mean(drift):.2e}, max {max(drift):.2e} (relative)')
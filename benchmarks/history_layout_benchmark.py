@@ -0,0 +1,92 @@
+"""Compares reading the model window and storage per point across the split, consolidated and bucketed history layouts.
+
+Needs a MongoDB (4.4+) server. Runs against a throwaway database that is dropped afterwards:
+
+    MONGODB_DB_URL=mongodb://localhost:27017 python benchmarks/history_layout_benchmark.py --suites 200 --points 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from pymongo import MongoClient  # noqa: E402
+from cito_data_query import CitoTableType, getHistoryData, getRunHistoryData, getBucketHistoryData  # noqa: E402
+from migrate_history_layout import migrateOrganization, migrateOrganizationToBuckets  # noqa: E402
+
+ORGANIZATION_ID = 'benchmark'
+WINDOW_SIZE = 25
+
+
+def seed(dbConnection, suites: int, points: int):
+    start = datetime(2023, 1, 1)
+    for suiteIndex in range(suites):
+        testSuiteId = str(uuid.uuid4())
+        executions, history, results = [], [], []
+        for pointIndex in range(points):
+            executionId = str(uuid.uuid4())
+            isAnomaly = random.random() < 0.02
+            executions.append({'id': executionId, 'executed_on': (start + timedelta(hours=pointIndex)).isoformat(), 'test_suite_id': testSuiteId})
+            history.append({'id': str(uuid.uuid4()), 'test_type': 'MaterializationRowCount', 'value': random.gauss(1000, 50), 'is_anomaly': isAnomaly,
+                            'user_feedback_is_anomaly': -1, 'test_suite_id': testSuiteId, 'execution_id': executionId, 'alert_id': None})
+            results.append({'id': str(uuid.uuid4()), 'test_type': 'MaterializationRowCount', 'mean_ad': 1.0, 'median_ad': 1.0, 'modified_z_score': 0.1,
+                            'expected_value': 1000.0, 'expected_value_upper_bound': 1100.0, 'expected_value_lower_bound': 900.0, 'deviation': 0.01,
+                            'is_anomalous': isAnomaly, 'test_suite_id': testSuiteId, 'execution_id': executionId, 'importance': None, 'forecast_skip_reason': None})
+        dbConnection[CitoTableType.TestExecutions.value + '_' + ORGANIZATION_ID].insert_many(executions)
+        dbConnection[CitoTableType.TestHistory.value + '_' + ORGANIZATION_ID].insert_many(history)
+        dbConnection[CitoTableType.TestResults.value + '_' + ORGANIZATION_ID].insert_many(results)
+        yield testSuiteId
+
+
+def storageBytes(dbConnection, tableTypes: "list[CitoTableType]") -> int:
+    return sum(dbConnection.command('collStats', tableType.value + '_' + ORGANIZATION_ID)['size'] for tableType in tableTypes)
+
+
+def measure(label: str, read, testSuiteIds: "list[str]", repetitions: int):
+    durations = []
+    for _ in range(repetitions):
+        testSuiteId = random.choice(testSuiteIds)
+        start = time.perf_counter()
+        read(testSuiteId)
+        durations.append((time.perf_counter() - start) * 1000)
+    durations.sort()
+    print(f'{label:<14} mean {statistics.mean(durations):7.2f} ms   p95 {durations[int(len(durations) * 0.95)]:7.2f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--suites', type=int, default=100)
+    parser.add_argument('--points', type=int, default=500)
+    parser.add_argument('--bucket-size', type=int, default=100)
+    parser.add_argument('--repetitions', type=int, default=500)
+    args = parser.parse_args()
+
+    client = MongoClient(os.environ.get('MONGODB_DB_URL', 'mongodb://localhost:27017'))
+    dbConnection = client['history_layout_benchmark']
+    client.drop_database(dbConnection.name)
+
+    try:
+        random.seed(0)
+        testSuiteIds = list(seed(dbConnection, args.suites, args.points))
+        migrateOrganization(dbConnection, ORGANIZATION_ID)
+        migrateOrganizationToBuckets(dbConnection, ORGANIZATION_ID, args.bucket_size)
+
+        totalPoints = args.suites * args.points
+        print(f'{args.suites} suites x {args.points} points, window {WINDOW_SIZE}, bucket size {args.bucket_size}\n')
+
+        print('storage per point (uncompressed bson)')
+        print(f'{"split":<14} {storageBytes(dbConnection, [CitoTableType.TestHistory, CitoTableType.TestExecutions]) / totalPoints:7.1f} bytes (history + executions)')
+        print(f'{"consolidated":<14} {storageBytes(dbConnection, [CitoTableType.TestRuns]) / totalPoints:7.1f} bytes (incl. model result)')
+        print(f'{"bucketed":<14} {storageBytes(dbConnection, [CitoTableType.TestHistoryBuckets]) / totalPoints:7.1f} bytes\n')
+
+        print('window read latency')
+        measure('split', lambda testSuiteId: getHistoryData(testSuiteId, dbConnection, ORGANIZATION_ID, WINDOW_SIZE), testSuiteIds, args.repetitions)
+        measure('consolidated', lambda testSuiteId: getRunHistoryData(testSuiteId, dbConnection, ORGANIZATION_ID, WINDOW_SIZE), testSuiteIds, args.repetitions)
+        measure('bucketed', lambda testSuiteId: getBucketHistoryData(testSuiteId, dbConnection, ORGANIZATION_ID, args.bucket_size, WINDOW_SIZE), testSuiteIds, args.repetitions)
+    finally:
+        client.drop_database(dbConnection.name)
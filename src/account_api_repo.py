@@ -1,3 +1,5 @@
+from typing import Union
+import aiohttp
 import requests
 
 from i_account_api_repo import IAccountApiRepo
@@ -13,6 +15,16 @@ class AccountApiRepo(IAccountApiRepo):
     def __init__(self) -> None:
         self._version = 'v1'
         self._apiRoot = getAccountApiRoot()
+        self._session: Union[aiohttp.ClientSession, None] = None
+
+    def _getSession(self) -> aiohttp.ClientSession:
+        if not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
 
     def getBy(self, params: "dict[str, str]", jwt: str) -> "list[AccountDto]":
         response = requests.get(f'{self._apiRoot}/api/{self._version}/accounts',
@@ -23,3 +35,13 @@ class AccountApiRepo(IAccountApiRepo):
             return list(map((lambda x: AccountDto(x['id'], x['userId'], x['organizationId'], x['modifiedOn'])), jsonPayload))
         raise Exception(
             jsonPayload['message'] if jsonPayload['message'] else 'Unknown Error')
+
+    async def getByAsync(self, params: "dict[str, str]", jwt: str) -> "list[AccountDto]":
+        async with self._getSession().get(f'{self._apiRoot}/api/{self._version}/accounts',
+                                          params=params, headers={'Authorization': f'Bearer {jwt}'}) as response:
+            jsonPayload = await response.json(content_type=None)
+
+            if response.status == 200:
+                return list(map((lambda x: AccountDto(x['id'], x['userId'], x['organizationId'], x['modifiedOn'])), jsonPayload))
+            raise Exception(
+                jsonPayload['message'] if jsonPayload['message'] else 'Unknown Error')
@@ -7,6 +7,7 @@ from base_controller import Request
 from token_required import processAuth
 
 from execute_test_controller import ExecuteTestController
+from execution_budget import ExecutionBudget
 
 import logging
 
@@ -52,6 +53,9 @@ def lambda_handler(event, context):
     #     raise e
 
     try:
+        budget = ExecutionBudget.fromRemainingTime(context.get_remaining_time_in_millis(
+        )) if hasattr(context, 'get_remaining_time_in_millis') else None
+
         request = event
 
         processedAuthObject = processAuth(request['headers']['Authorization'])
@@ -79,7 +83,7 @@ def lambda_handler(event, context):
             None, {'testId': testId}, None, mappedBody, processedAuthObject)
 
         controller = ExecuteTestController(
-            register['getAccounts'], register['querySnowflake'])
+            register['getAccounts'], register['querySnowflake'], budget)
         result = controller.execute(controllerRequest)
 
         return {
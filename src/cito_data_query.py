@@ -1,6 +1,11 @@
+from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any, Union
-from pymongo import database
+from pymongo import database, InsertOne, UpdateOne, ReturnDocument
+from pymongo.results import BulkWriteResult
+from pymongo.write_concern import WriteConcern
+from bson.objectid import ObjectId
+from motor import motor_asyncio
 from test_type import QuantColumnTest, QuantMatTest, QualMatTest, CustomTest
 
 
@@ -16,6 +21,13 @@ class CitoTableType(Enum):
     TestExecutionsQual = 'test_executions_qual'
     TestAlertsQual = 'test_alerts_qual'
     TestSuitesCustom = 'test_suites_custom'
+    TestQueryMetrics = 'test_query_metrics'
+    TestRuns = 'test_runs'
+    TestHistoryBuckets = 'test_history_buckets'
+    TestSuiteStates = 'test_suite_states'
+    TestHistoryRollups = 'test_history_rollups'
+    TestCompactionJobs = 'test_compaction_jobs'
+    TestSchemaSnapshots = 'test_schema_snapshots'
 
 
 quantColumnTest = set(item.value for item in QuantColumnTest)
@@ -23,27 +35,95 @@ quantMatTest = set(item.value for item in QuantMatTest)
 qualMatTest = set(item.value for item in QualMatTest)
 customTest = set(item.value for item in CustomTest)
 
+_COLLECTION_CACHE_SIZE = 1024
+_collectionCache: "dict[tuple[int, str, Any], tuple[Any, Any]]" = {}
+
+def _getCollection(tableType: CitoTableType, dbConnection: Any, organizationId: str, writeConcern: Union[WriteConcern, None] = None):
+    """Returns the per-org collection handle, reusing the handle built by earlier calls on the same connection."""
+    name = tableType.value + '_' + organizationId
+    key = (id(dbConnection), name, tuple(sorted(writeConcern.document.items())) if writeConcern else None)
+
+    cached = _collectionCache.get(key)
+    # the connection is kept next to its handle, so an id() reused by another connection never hits
+    if cached is None or cached[0] is not dbConnection:
+        if len(_collectionCache) >= _COLLECTION_CACHE_SIZE:
+            _collectionCache.clear()
+        cached = (dbConnection, dbConnection.get_collection(name, write_concern=writeConcern))
+        _collectionCache[key] = cached
+
+    return cached[1]
+
 
 def insertTableData(document: "dict[str, Any]", tableType: CitoTableType, dbConnection: database.Database, organizationId: str):
-    collection = dbConnection[tableType.value + '_' + organizationId]
+    collection = _getCollection(tableType, dbConnection, organizationId)
 
     result = collection.insert_one(document)
 
     if not result.acknowledged:
         raise Exception('Insertion of documents failed')
 
-def getHistoryData(testSuiteId: str, dbConnection: database.Database, organizationId: str):
-    collection = dbConnection[CitoTableType.TestHistory.value + '_' + organizationId]
-    pipeline = [
-        {
-          '$match': {
-            'test_suite_id': testSuiteId,
-            '$or': [
-              { 'is_anomaly': { '$ne': True } },
-              { 'user_feedback_is_anomaly': { '$eq': 0 } }
-            ]
-          }
-        },
+async def insertTableDataAsync(document: "dict[str, Any]", tableType: CitoTableType, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    collection = _getCollection(tableType, dbConnection, organizationId)
+
+    result = await collection.insert_one(document)
+
+    if not result.acknowledged:
+        raise Exception('Insertion of documents failed')
+
+def insertManyTableData(documents: "list[dict[str, Any]]", tableType: CitoTableType, dbConnection: database.Database, organizationId: str):
+    collection = _getCollection(tableType, dbConnection, organizationId)
+
+    result = collection.insert_many(documents)
+
+    if not result.acknowledged:
+        raise Exception('Insertion of documents failed')
+
+async def insertManyTableDataAsync(documents: "list[dict[str, Any]]", tableType: CitoTableType, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    collection = _getCollection(tableType, dbConnection, organizationId)
+
+    result = await collection.insert_many(documents)
+
+    if not result.acknowledged:
+        raise Exception('Insertion of documents failed')
+
+def _buildEligibleHistoryFilter(testSuiteId: str, metric: Union[str, None]) -> "dict[str, Any]":
+    # anomalies are excluded from the model input, unless the user marked them as false positives
+    return {
+        'test_suite_id': testSuiteId,
+        'metric': metric,
+        '$or': [
+          { 'is_anomaly': { '$ne': True } },
+          { 'user_feedback_is_anomaly': { '$eq': 0 } }
+        ]
+    }
+
+def _buildHistoryPipeline(testSuiteId: str, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+    match = { '$match': _buildEligibleHistoryFilter(testSuiteId, metric) }
+
+    pipeline: "list[dict[str, Any]]" = [match]
+
+    if limit:
+        # _id is monotonically increasing with insertion, so { test_suite_id, metric, _id } serves as an index backed
+        # order of execution. Next to the latest entries the very first entry is loaded, since the warm-up check relies on it.
+        pipeline.extend([
+            { '$sort': { '_id': -1 } },
+            { '$limit': limit },
+            {
+                '$unionWith': {
+                    'coll': CitoTableType.TestHistory.value + '_' + organizationId,
+                    'pipeline': [match, { '$sort': { '_id': 1 } }, { '$limit': 1 }]
+                }
+            },
+            { '$group': { '_id': '$_id', 'doc': { '$first': '$$ROOT' } } },
+            { '$replaceRoot': { 'newRoot': '$doc' } }
+        ])
+
+    pipeline.extend(_buildExecutedOnStages(organizationId))
+
+    return pipeline
+
+def _buildExecutedOnStages(organizationId: str) -> "list[dict[str, Any]]":
+    return [
         {
           '$lookup': {
             'from': 'test_executions_' + organizationId,
@@ -67,6 +147,59 @@ def getHistoryData(testSuiteId: str, dbConnection: database.Database, organizati
          }
     ]
 
+def _buildDownsampleStages(bucketKeyLength: int, bucketLimit: int) -> "list[dict[str, Any]]":
+    # a bucket is a prefix of the ISO executed_on. It keeps its latest point, which unlike a mean leaves the spread
+    # the z-score analysis measures intact
+    return [
+        { '$sort': { 'executed_on': 1 } },
+        { '$group': { '_id': { '$substr': ['$executed_on', 0, bucketKeyLength] }, 'executed_on': { '$last': '$executed_on' }, 'value': { '$last': '$value' } } },
+        { '$sort': { '_id': -1 } },
+        { '$limit': bucketLimit },
+        { '$project': { '_id': 0, 'executed_on': 1, 'value': 1 } }
+    ]
+
+def _buildHistorySpanPipeline(testSuiteId: str, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+    eligible = _buildEligibleHistoryFilter(testSuiteId, metric)
+    # an entry is inserted after its execution, so entries with an older _id cannot be part of the window
+    match = { '$match': { **eligible, '_id': { '$gte': ObjectId.from_datetime(datetime.fromisoformat(start)) } } }
+
+    return [
+        match,
+        *_buildExecutedOnStages(organizationId),
+        { '$match': { 'executed_on': { '$gte': start } } },
+        *_buildDownsampleStages(bucketKeyLength, bucketLimit),
+        # the warm-up check relies on the very first entry, unless it is part of the window anyway
+        {
+            '$unionWith': {
+                'coll': CitoTableType.TestHistory.value + '_' + organizationId,
+                'pipeline': [
+                    { '$match': eligible },
+                    { '$sort': { '_id': 1 } },
+                    { '$limit': 1 },
+                    *_buildExecutedOnStages(organizationId),
+                    { '$match': { 'executed_on': { '$lt': start } } }
+                ]
+            }
+        }
+    ]
+
+def getHistorySpanData(testSuiteId: str, dbConnection: database.Database, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None):
+    """Loads the entries executed since start, downsampled to at most bucketLimit time buckets, and the very first entry."""
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+    pipeline = _buildHistorySpanPipeline(testSuiteId, organizationId, start, bucketKeyLength, bucketLimit, metric)
+
+    return list(collection.aggregate(pipeline))
+
+async def getHistorySpanDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+    pipeline = _buildHistorySpanPipeline(testSuiteId, organizationId, start, bucketKeyLength, bucketLimit, metric)
+
+    return await collection.aggregate(pipeline).to_list(None)
+
+def getHistoryData(testSuiteId: str, dbConnection: database.Database, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+    pipeline = _buildHistoryPipeline(testSuiteId, organizationId, limit, metric)
+
     results = list(collection.aggregate(pipeline))
 
     if results is not None:
@@ -74,14 +207,323 @@ def getHistoryData(testSuiteId: str, dbConnection: database.Database, organizati
     else:
         raise Exception('History data matching testSuiteId not found')
 
-def getLastMatSchemaData(testSuiteId: str, dbConnection: database.Database, organizationId: str):
-    testExecQualCollectionName = CitoTableType.TestExecutionsQual.value + '_' + organizationId
+async def getHistoryDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+    pipeline = _buildHistoryPipeline(testSuiteId, organizationId, limit, metric)
+
+    results = await collection.aggregate(pipeline).to_list(None)
+
+    if results is not None:
+        return results
+    else:
+        raise Exception('History data matching testSuiteId not found')
+
+# $documents and $lookup with both localField and a pipeline need MongoDB 5.1, every other query runs on 4.4
+_HISTORY_BULK_MIN_SERVER_VERSION = [5, 1]
+_historyBulkSupport: "dict[int, bool]" = {}
+
+def _supportsHistoryBulk(buildInfo: "dict[str, Any]") -> bool:
+    return buildInfo['versionArray'][:2] >= _HISTORY_BULK_MIN_SERVER_VERSION
+
+def supportsHistoryBulk(dbConnection: database.Database) -> bool:
+    """Whether the server can run the bulk history read. Checked once per connection."""
+    key = id(dbConnection)
+    if key not in _historyBulkSupport:
+        _historyBulkSupport[key] = _supportsHistoryBulk(dbConnection.command('buildInfo'))
+    return _historyBulkSupport[key]
+
+async def supportsHistoryBulkAsync(dbConnection: motor_asyncio.AsyncIOMotorDatabase) -> bool:
+    key = id(dbConnection)
+    if key not in _historyBulkSupport:
+        _historyBulkSupport[key] = _supportsHistoryBulk(await dbConnection.command('buildInfo'))
+    return _historyBulkSupport[key]
+
+def _buildHistoryBulkPipeline(testSuiteIds: "list[str]", organizationId: str, limit: int, metric: Union[str, None], tableType: CitoTableType) -> "list[dict[str, Any]]":
+    # the eligible entries of each suite are read with an index backed sort and limit, so no suite's full history is held
+    eligible = _buildEligibleHistoryFilter(testSuiteIds[0], metric)
+    del eligible['test_suite_id']
+
+    isRuns = tableType == CitoTableType.TestRuns
+    order = 'executed_on' if isRuns else '_id'
+    fields = { '_id': 1, 'executed_on': 1, 'value': 1 } if isRuns else { '_id': 1, 'execution_id': 1, 'value': 1 }
+
+    def lookup(name: str, direction: int, size: int) -> "dict[str, Any]":
+        return {
+            '$lookup': {
+                'from': tableType.value + '_' + organizationId,
+                'localField': 'test_suite_id',
+                'foreignField': 'test_suite_id',
+                'pipeline': [{ '$match': eligible }, { '$sort': { order: direction } }, { '$limit': size }, { '$project': fields }],
+                'as': name
+            }
+        }
+
+    pipeline: "list[dict[str, Any]]" = [
+        { '$documents': [{ 'test_suite_id': testSuiteId } for testSuiteId in testSuiteIds] },
+        # same window per suite as getHistoryData: the latest entries and the very first one
+        lookup('latest', -1, limit),
+        lookup('first', 1, 1),
+        { '$project': { 'test_suite_id': 1, 'entries': { '$setUnion': ['$latest', '$first'] } } },
+        { '$unwind': '$entries' }
+    ]
+
+    if isRuns:
+        return pipeline + [{ '$project': { '_id': 0, 'test_suite_id': 1, 'executed_on': '$entries.executed_on', 'value': '$entries.value' } }]
+
+    return pipeline + [
+        {
+          '$lookup': {
+            'from': 'test_executions_' + organizationId,
+            'localField': 'entries.execution_id',
+            'foreignField': 'id',
+            'as': 'test_executions'
+          }
+        },
+        {
+          '$unwind': {
+            'path': '$test_executions',
+            'preserveNullAndEmptyArrays': False
+          }
+        },
+        {
+          '$project': {
+            '_id': 0,
+            'test_suite_id': 1,
+            'executed_on': '$test_executions.executed_on',
+            'value': '$entries.value'
+          }
+        }
+    ]
+
+def _toHistoryBulk(testSuiteIds: "list[str]", results: "list[dict[str, Any]]") -> "dict[str, list[dict[str, Any]]]":
+    histories: "dict[str, list[dict[str, Any]]]" = { testSuiteId: [] for testSuiteId in testSuiteIds }
+    for result in results:
+        histories[result.pop('test_suite_id')].append(result)
+    return histories
+
+def getHistoryDataBulk(testSuiteIds: "list[str]", dbConnection: database.Database, organizationId: str, limit: int, metric: Union[str, None] = None, tableType: CitoTableType = CitoTableType.TestHistory) -> "dict[str, list[dict[str, Any]]]":
+    """Loads the model windows of many suites with one aggregation, from test_history or (consolidated layout) test_runs.
+    Suites without history map to an empty list. Needs MongoDB 5.1 or newer, see supportsHistoryBulk."""
+    if not len(testSuiteIds):
+        return {}
+
+    pipeline = _buildHistoryBulkPipeline(testSuiteIds, organizationId, limit, metric, tableType)
+
+    return _toHistoryBulk(testSuiteIds, list(dbConnection.aggregate(pipeline)))
+
+async def getHistoryDataBulkAsync(testSuiteIds: "list[str]", dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, limit: int, metric: Union[str, None] = None, tableType: CitoTableType = CitoTableType.TestHistory) -> "dict[str, list[dict[str, Any]]]":
+    if not len(testSuiteIds):
+        return {}
+
+    pipeline = _buildHistoryBulkPipeline(testSuiteIds, organizationId, limit, metric, tableType)
+
+    return _toHistoryBulk(testSuiteIds, await dbConnection.aggregate(pipeline).to_list(None))
+
+def _toCountOptions(limit: int) -> "dict[str, Any]":
+    # with a limit counting stops once it is reached, 0 counts every entry
+    return { 'limit': limit } if limit else {}
+
+def countHistoryData(testSuiteId: str, dbConnection: database.Database, organizationId: str, metric: Union[str, None] = None, limit: int = 0) -> int:
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+
+    return collection.count_documents(_buildEligibleHistoryFilter(testSuiteId, metric), **_toCountOptions(limit))
+
+async def countHistoryDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, metric: Union[str, None] = None, limit: int = 0) -> int:
+    collection = _getCollection(CitoTableType.TestHistory, dbConnection, organizationId)
+
+    return await collection.count_documents(_buildEligibleHistoryFilter(testSuiteId, metric), **_toCountOptions(limit))
+
+def _buildRunHistoryPipeline(testSuiteId: str, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+    # consolidated layout: executed_on and value live on the same document, so no $lookup is needed
+    match = {
+        '$match': {
+            'test_suite_id': testSuiteId,
+            'metric': metric,
+            '$or': [
+              { 'is_anomaly': { '$ne': True } },
+              { 'user_feedback_is_anomaly': { '$eq': 0 } }
+            ]
+        }
+    }
+    project = { '$project': { '_id': 0, 'executed_on': 1, 'value': 1 } }
+
+    if not limit:
+        return [match, project]
+
+    return [
+        match,
+        { '$sort': { 'executed_on': -1 } },
+        { '$limit': limit },
+        {
+            '$unionWith': {
+                'coll': CitoTableType.TestRuns.value + '_' + organizationId,
+                'pipeline': [match, { '$sort': { 'executed_on': 1 } }, { '$limit': 1 }]
+            }
+        },
+        { '$group': { '_id': '$id', 'doc': { '$first': '$$ROOT' } } },
+        { '$replaceRoot': { 'newRoot': '$doc' } },
+        project
+    ]
+
+def getRunHistoryData(testSuiteId: str, dbConnection: database.Database, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestRuns, dbConnection, organizationId)
+    pipeline = _buildRunHistoryPipeline(testSuiteId, organizationId, limit, metric)
+
+    return list(collection.aggregate(pipeline))
+
+async def getRunHistoryDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestRuns, dbConnection, organizationId)
+    pipeline = _buildRunHistoryPipeline(testSuiteId, organizationId, limit, metric)
 
-    testExecQualCollection = dbConnection[testExecQualCollectionName]
-    
+    return await collection.aggregate(pipeline).to_list(None)
+
+def _buildRunHistorySpanPipeline(testSuiteId: str, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+    eligible = _buildEligibleHistoryFilter(testSuiteId, metric)
+
+    return [
+        { '$match': { **eligible, 'executed_on': { '$gte': start } } },
+        *_buildDownsampleStages(bucketKeyLength, bucketLimit),
+        {
+            '$unionWith': {
+                'coll': CitoTableType.TestRuns.value + '_' + organizationId,
+                'pipeline': [
+                    { '$match': { **eligible, 'executed_on': { '$lt': start } } },
+                    { '$sort': { 'executed_on': 1 } },
+                    { '$limit': 1 },
+                    { '$project': { '_id': 0, 'executed_on': 1, 'value': 1 } }
+                ]
+            }
+        }
+    ]
+
+def getRunHistorySpanData(testSuiteId: str, dbConnection: database.Database, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestRuns, dbConnection, organizationId)
+    pipeline = _buildRunHistorySpanPipeline(testSuiteId, organizationId, start, bucketKeyLength, bucketLimit, metric)
+
+    return list(collection.aggregate(pipeline))
+
+async def getRunHistorySpanDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, start: str, bucketKeyLength: int, bucketLimit: int, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestRuns, dbConnection, organizationId)
+    pipeline = _buildRunHistorySpanPipeline(testSuiteId, organizationId, start, bucketKeyLength, bucketLimit, metric)
+
+    return await collection.aggregate(pipeline).to_list(None)
+
+def _buildBucketHistoryPipeline(testSuiteId: str, organizationId: str, bucketLimit: Union[int, None] = None, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+    match = { '$match': { 'test_suite_id': testSuiteId, 'metric': metric } }
+    project = {
+        '$project': {
+            '_id': 0,
+            'points': {
+                '$filter': {
+                    'input': '$points',
+                    'as': 'point',
+                    'cond': { '$or': [{ '$ne': ['$$point.a', True] }, { '$eq': ['$$point.f', 0] }] }
+                }
+            }
+        }
+    }
+
+    if not bucketLimit:
+        return [match, project]
+
+    return [
+        match,
+        { '$sort': { 'last_executed_on': -1 } },
+        { '$limit': bucketLimit },
+        {
+            '$unionWith': {
+                'coll': CitoTableType.TestHistoryBuckets.value + '_' + organizationId,
+                'pipeline': [match, { '$sort': { 'last_executed_on': 1 } }, { '$limit': 1 }]
+            }
+        },
+        { '$group': { '_id': '$_id', 'doc': { '$first': '$$ROOT' } } },
+        { '$replaceRoot': { 'newRoot': '$doc' } },
+        project
+    ]
+
+def _getBucketLimit(limit: Union[int, None], bucketSize: int) -> Union[int, None]:
+    # the newest bucket is usually only partially filled
+    return -(-limit // bucketSize) + 1 if limit else None
+
+def _toBucketHistory(buckets: "list[dict[str, Any]]", limit: Union[int, None]) -> "list[dict[str, Any]]":
+    points = sorted((point['t'], point['v']) for bucket in buckets for point in bucket['points'])
+
+    # next to the latest points the very first point is kept, since the warm-up check relies on it
+    if limit and len(points) > limit:
+        points = points[:1] + points[-limit:]
+
+    return [{ 'executed_on': executedOn, 'value': value } for executedOn, value in points]
+
+def getBucketHistoryData(testSuiteId: str, dbConnection: database.Database, organizationId: str, bucketSize: int, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestHistoryBuckets, dbConnection, organizationId)
+    pipeline = _buildBucketHistoryPipeline(testSuiteId, organizationId, _getBucketLimit(limit, bucketSize), metric)
+
+    return _toBucketHistory(list(collection.aggregate(pipeline)), limit)
+
+async def getBucketHistoryDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, bucketSize: int, limit: Union[int, None] = None, metric: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestHistoryBuckets, dbConnection, organizationId)
+    pipeline = _buildBucketHistoryPipeline(testSuiteId, organizationId, _getBucketLimit(limit, bucketSize), metric)
+
+    return _toBucketHistory(await collection.aggregate(pipeline).to_list(None), limit)
+
+def buildBucketPointUpsert(testSuiteId: str, metric: Union[str, None], bucketSize: int, point: "dict[str, Any]") -> "tuple[dict[str, Any], dict[str, Any]]":
+    """Appends a point { id, t, v, a, f } to the open bucket of a suite, opening a new bucket once the open one is full."""
+    filter = { 'test_suite_id': testSuiteId, 'metric': metric, 'count': { '$lt': bucketSize } }
+    update = {
+        '$push': { 'points': point },
+        '$inc': { 'count': 1 },
+        '$min': { 'first_executed_on': point['t'] },
+        '$max': { 'last_executed_on': point['t'] }
+    }
+
+    return filter, update
+
+def getSuiteStateData(stateId: str, dbConnection: database.Database, organizationId: str) -> Union["dict[str, Any]", None]:
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    return collection.find_one({ '_id': stateId })
+
+async def getSuiteStateDataAsync(stateId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str) -> Union["dict[str, Any]", None]:
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    return await collection.find_one({ '_id': stateId })
+
+def getSuiteStatesData(testSuiteId: str, fields: "list[str]", dbConnection: database.Database, organizationId: str) -> "dict[Union[str, None], dict[str, Any]]":
+    """Loads the given fields of all states of a suite (one per metric), keyed by metric."""
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    results = collection.find({ 'test_suite_id': testSuiteId }, dict({ '_id': 0, 'metric': 1 }, **{ field: 1 for field in fields }))
+
+    return { result.get('metric'): result for result in results }
+
+async def getSuiteStatesDataAsync(testSuiteId: str, fields: "list[str]", dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str) -> "dict[Union[str, None], dict[str, Any]]":
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    results = await collection.find({ 'test_suite_id': testSuiteId }, dict({ '_id': 0, 'metric': 1 }, **{ field: 1 for field in fields })).to_list(None)
+
+    return { result.get('metric'): result for result in results }
+
+def setSuiteStateData(stateId: str, fields: "dict[str, Any]", dbConnection: database.Database, organizationId: str):
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    # only the given fields are replaced, other state kept for the suite stays untouched
+    result = collection.update_one({ '_id': stateId }, { '$set': fields }, upsert=True)
+
+    if not result.acknowledged:
+        raise Exception('Updating suite state failed')
+
+async def setSuiteStateDataAsync(stateId: str, fields: "dict[str, Any]", dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    collection = _getCollection(CitoTableType.TestSuiteStates, dbConnection, organizationId)
+
+    result = await collection.update_one({ '_id': stateId }, { '$set': fields }, upsert=True)
+
+    if not result.acknowledged:
+        raise Exception('Updating suite state failed')
+
+def _buildLastMatSchemaPipeline(testSuiteId: str, organizationId: str) -> "list[dict[str, Any]]":
     testHistoryQualCollectionName = CitoTableType.TestHistoryQual.value + '_' + organizationId
 
-    pipeline = [
+    return [
         {
             '$match': {
                 'test_suite_id': testSuiteId
@@ -109,28 +551,54 @@ def getLastMatSchemaData(testSuiteId: str, dbConnection: database.Database, orga
                 'preserveNullAndEmptyArrays': False
             }
         },
+        {
+            # entries written before content addressing carry the schema themselves, newer ones only its hash
+            '$lookup': {
+                'from': CitoTableType.TestSchemaSnapshots.value + '_' + organizationId,
+                'localField': 'test_history_qual.schema_hash',
+                'foreignField': '_id',
+                'as': 'test_schema_snapshots'
+            }
+        },
         {
             '$project': {
                 'id': 1,
-                'value': '$test_history_qual.value'
+                'schema_hash': '$test_history_qual.schema_hash',
+                'value': { '$ifNull': ['$test_history_qual.value', { '$arrayElemAt': ['$test_schema_snapshots.value', 0] }] }
             }
         }
     ]
 
+def getLastMatSchemaData(testSuiteId: str, dbConnection: database.Database, organizationId: str):
+    testExecQualCollection = _getCollection(CitoTableType.TestExecutionsQual, dbConnection, organizationId)
+
+    pipeline = _buildLastMatSchemaPipeline(testSuiteId, organizationId)
+
     results = list(testExecQualCollection.aggregate(pipeline))
 
     return results
 
-def getTestData(testSuiteId: str, testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest], dbConnection: database.Database, organizationId: str):
+async def getLastMatSchemaDataAsync(testSuiteId: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    testExecQualCollection = _getCollection(CitoTableType.TestExecutionsQual, dbConnection, organizationId)
+
+    pipeline = _buildLastMatSchemaPipeline(testSuiteId, organizationId)
 
+    results = await testExecQualCollection.aggregate(pipeline).to_list(None)
+
+    return results
+
+def _getTestSuiteTableType(testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]) -> CitoTableType:
     if testType in quantColumnTest or testType in quantMatTest:
-        table = CitoTableType.TestSuites
+        return CitoTableType.TestSuites
     elif testType in qualMatTest:
-        table = CitoTableType.TestSuitesQual
+        return CitoTableType.TestSuitesQual
     else:
-        table = CitoTableType.TestSuitesCustom
+        return CitoTableType.TestSuitesCustom
+
+def getTestData(testSuiteId: str, testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest], dbConnection: database.Database, organizationId: str):
+    table = _getTestSuiteTableType(testType)
 
-    collection = dbConnection[table.value + '_' + organizationId]
+    collection = _getCollection(table, dbConnection, organizationId)
 
     result = collection.find_one({ 'id': testSuiteId })
 
@@ -139,10 +607,150 @@ def getTestData(testSuiteId: str, testType: Union[QuantColumnTest, QuantMatTest,
     else:
         raise Exception('Test data matching testSuiteId not found')
 
+async def getTestDataAsync(testSuiteId: str, testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest], dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    table = _getTestSuiteTableType(testType)
+
+    collection = _getCollection(table, dbConnection, organizationId)
+
+    result = await collection.find_one({ 'id': testSuiteId })
+
+    if result is not None:
+        return result
+    else:
+        raise Exception('Test data matching testSuiteId not found')
+
+def _groupByTestSuiteTableType(testSuites: "list[tuple[str, Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]]]") -> "dict[CitoTableType, list[str]]":
+    grouped: "dict[CitoTableType, list[str]]" = {}
+    for testSuiteId, testType in testSuites:
+        grouped.setdefault(_getTestSuiteTableType(testType), []).append(testSuiteId)
+    return grouped
+
+def getTestDataBulk(testSuites: "list[tuple[str, Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]]]", dbConnection: database.Database, organizationId: str) -> "dict[str, dict[str, Any]]":
+    """Loads the definitions of many (testSuiteId, testType) pairs with one $in query per suite collection. Unknown suites are missing from the result."""
+    definitions: "dict[str, dict[str, Any]]" = {}
+    for table, testSuiteIds in _groupByTestSuiteTableType(testSuites).items():
+        collection = _getCollection(table, dbConnection, organizationId)
+        definitions.update({ result['id']: result for result in collection.find({ 'id': { '$in': testSuiteIds } }) })
+
+    return definitions
+
+async def getTestDataBulkAsync(testSuites: "list[tuple[str, Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]]]", dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str) -> "dict[str, dict[str, Any]]":
+    definitions: "dict[str, dict[str, Any]]" = {}
+    for table, testSuiteIds in _groupByTestSuiteTableType(testSuites).items():
+        collection = _getCollection(table, dbConnection, organizationId)
+        definitions.update({ result['id']: result for result in await collection.find({ 'id': { '$in': testSuiteIds } }).to_list(None) })
+
+    return definitions
+
 def updateTableData(testSuiteId: str, tableType: CitoTableType, columnName: str, value: str, dbConnection: database.Database, organizationId: str):
-    collection = dbConnection[tableType.value + '_' + organizationId]
+    collection = _getCollection(tableType, dbConnection, organizationId)
 
     result = collection.update_one({ 'id': testSuiteId }, { '$set': { columnName: value } })
 
     if result.modified_count != 1:
-        raise Exception('Updating document failed')
\ No newline at end of file
+        raise Exception('Updating document failed')
+
+async def updateTableDataAsync(testSuiteId: str, tableType: CitoTableType, columnName: str, value: str, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    collection = _getCollection(tableType, dbConnection, organizationId)
+
+    result = await collection.update_one({ 'id': testSuiteId }, { '$set': { columnName: value } })
+
+    if result.modified_count != 1:
+        raise Exception('Updating document failed')
+
+def _buildAlertClaimUpdate(now: str, cutoff: str) -> "list[dict[str, Any]]":
+    # iso timestamps compare like strings, so the window check runs on the server as part of the update
+    isClaimable = { '$or': [{ '$eq': [{ '$ifNull': ['$last_alert_sent', None] }, None] }, { '$lte': ['$last_alert_sent', cutoff] }] }
+
+    return [{ '$set': { 'last_alert_sent': { '$cond': [isClaimable, now, '$last_alert_sent'] } } }]
+
+def _toAlertClaim(result: Union["dict[str, Any]", None], cutoff: str) -> "tuple[bool, Union[str, None]]":
+    if result is None:
+        raise Exception('Test data matching testSuiteId not found')
+
+    lastAlertSent = result.get('last_alert_sent')
+    return (not lastAlertSent or lastAlertSent <= cutoff), lastAlertSent
+
+def claimAlertSlot(testSuiteId: str, tableType: CitoTableType, dbConnection: database.Database, organizationId: str, windowHours: int) -> "tuple[bool, Union[str, None]]":
+    """Sets last_alert_sent to now if it is unset or older than windowHours, in one atomic round trip. Returns whether this call set it and the previous value."""
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(hours=windowHours)).isoformat()
+
+    result = _getCollection(tableType, dbConnection, organizationId).find_one_and_update(
+        { 'id': testSuiteId }, _buildAlertClaimUpdate(now.isoformat(), cutoff), projection={ '_id': 0, 'last_alert_sent': 1 }, return_document=ReturnDocument.BEFORE)
+
+    return _toAlertClaim(result, cutoff)
+
+async def claimAlertSlotAsync(testSuiteId: str, tableType: CitoTableType, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, windowHours: int) -> "tuple[bool, Union[str, None]]":
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(hours=windowHours)).isoformat()
+
+    result = await _getCollection(tableType, dbConnection, organizationId).find_one_and_update(
+        { 'id': testSuiteId }, _buildAlertClaimUpdate(now.isoformat(), cutoff), projection={ '_id': 0, 'last_alert_sent': 1 }, return_document=ReturnDocument.BEFORE)
+
+    return _toAlertClaim(result, cutoff)
+
+def _checkBulkWriteResult(result: BulkWriteResult, operations: "list[Union[InsertOne, UpdateOne]]"):
+    # unacknowledged writes (w=0) cannot be checked
+    if not result.acknowledged:
+        return
+
+    # every insert has to land and every update has to find (or upsert) its document
+    if result.inserted_count + result.matched_count + result.upserted_count != len(operations):
+        raise Exception('Bulk write of documents failed')
+
+def bulkWriteTableData(operations: "list[Union[InsertOne, UpdateOne]]", tableType: CitoTableType, dbConnection: database.Database, organizationId: str, writeConcern: Union[WriteConcern, None] = None):
+    result = _getCollection(tableType, dbConnection, organizationId, writeConcern).bulk_write(operations, ordered=False)
+
+    _checkBulkWriteResult(result, operations)
+
+async def bulkWriteTableDataAsync(operations: "list[Union[InsertOne, UpdateOne]]", tableType: CitoTableType, dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, writeConcern: Union[WriteConcern, None] = None):
+    result = await _getCollection(tableType, dbConnection, organizationId, writeConcern).bulk_write(operations, ordered=False)
+
+    _checkBulkWriteResult(result, operations)
+
+def getCostliestSuitesData(organizationId: str, dbConnection: database.Database, limit: int = 10, since: Union[str, None] = None):
+    collection = _getCollection(CitoTableType.TestQueryMetrics, dbConnection, organizationId)
+
+    pipeline: "list[dict[str, Any]]" = []
+    if since:
+        pipeline.append({ '$match': { 'executed_on': { '$gte': since } } })
+
+    pipeline.extend([
+        {
+            '$group': {
+                '_id': '$test_suite_id',
+                'test_type': { '$last': '$test_type' },
+                'executions': { '$sum': 1 },
+                'total_bytes_scanned': { '$sum': { '$ifNull': ['$bytes_scanned', 0] } },
+                'total_rows_scanned': { '$sum': { '$ifNull': ['$rows_scanned', 0] } },
+                'total_elapsed_ms': { '$sum': { '$ifNull': ['$elapsed_ms', '$round_trip_ms'] } },
+                'avg_elapsed_ms': { '$avg': { '$ifNull': ['$elapsed_ms', '$round_trip_ms'] } },
+                'warehouses': { '$addToSet': '$warehouse' }
+            }
+        },
+        {
+            '$sort': {
+                'total_bytes_scanned': -1,
+                'total_elapsed_ms': -1
+            }
+        },
+        {
+            '$limit': limit
+        },
+        {
+            '$project': {
+                '_id': 0,
+                'test_suite_id': '$_id',
+                'test_type': 1,
+                'executions': 1,
+                'total_bytes_scanned': 1,
+                'total_rows_scanned': 1,
+                'total_elapsed_ms': 1,
+                'avg_elapsed_ms': 1,
+                'warehouses': 1
+            }
+        }
+    ])
+
+    return list(collection.aggregate(pipeline))
\ No newline at end of file
@@ -0,0 +1,251 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Union
+from pymongo import ReplaceOne, database
+from cito_data_query import CitoTableType
+from config import getRetentionDetails, getSuiteStateWindowSize
+from index_manager import ensureOrgIndexes
+from suite_state import rebuildSuiteState, toSuiteStateId
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Compaction walks day by day through raw executions older than the retention period.
+# Every day has a job document that moves pending -> rolled_up -> done:
+#   pending    raw data untouched, roll-ups are (re)computed from it
+#   rolled_up  roll-ups written, raw data is archived (optional), its points are removed from the history buckets
+#              and it is deleted. The suite states it touched are noted on the job and rebuilt. All steps are idempotent
+#   done       nothing left to do
+# An interrupted run therefore resumes with the first day that is not done.
+# Only the raw history, results, runs, buckets and executions are compacted: query metrics, alerts and qual collections are not.
+
+_granularityKeyLength = {'hourly': len('YYYY-MM-DDTHH'), 'daily': len('YYYY-MM-DD')}
+
+
+def _collection(dbConnection: database.Database, tableType: CitoTableType, organizationId: str):
+    return dbConnection[tableType.value + '_' + organizationId]
+
+
+def _archiveCollection(dbConnection: database.Database, tableType: CitoTableType, organizationId: str):
+    # archive_ prefix, so archives are not mistaken for org collections of another table type
+    return dbConnection['archive_' + tableType.value + '_' + organizationId]
+
+
+def _isKept(historyEntry: "dict[str, Any]") -> bool:
+    # alerts and points labelled by users stay raw
+    return bool(historyEntry.get('alert_id')) or bool(historyEntry.get('is_anomaly')) or historyEntry.get('user_feedback_is_anomaly', -1) != -1
+
+
+def _toRollups(historyEntries: "list[dict[str, Any]]", executedOnById: "dict[str, str]", granularity: str) -> "list[dict[str, Any]]":
+    keyLength = _granularityKeyLength[granularity]
+
+    groups: "dict[tuple[str, Union[str, None], str], list[dict[str, Any]]]" = {}
+    for entry in historyEntries:
+        if not isinstance(entry.get('value'), (int, float)) or isinstance(entry.get('value'), bool):
+            continue
+        # kept entries stay raw, counting them in a roll-up as well would count them twice
+        if _isKept(entry):
+            continue
+        bucketStart = executedOnById[entry['execution_id']][:keyLength]
+        groups.setdefault(
+            (entry['test_suite_id'], entry.get('metric'), bucketStart), []).append(entry)
+
+    rollups = []
+    for (testSuiteId, metric, bucketStart), entries in groups.items():
+        values = [entry['value'] for entry in entries]
+        rollups.append({
+            '_id': f'{testSuiteId}:{metric}:{bucketStart}',
+            'test_suite_id': testSuiteId,
+            'test_type': entries[0]['test_type'],
+            'metric': metric,
+            'granularity': granularity,
+            'bucket_start': bucketStart,
+            'min': min(values),
+            'max': max(values),
+            'mean': sum(values) / len(values),
+            'count': len(values)
+        })
+
+    return rollups
+
+
+def _loadDay(dbConnection: database.Database, organizationId: str, dayStart: str, dayEnd: str) -> "tuple[dict[str, str], list[dict[str, Any]]]":
+    executions = _collection(dbConnection, CitoTableType.TestExecutions, organizationId).find(
+        {'executed_on': {'$gte': dayStart, '$lt': dayEnd}}, {'_id': 0, 'id': 1, 'executed_on': 1})
+    executedOnById = {execution['id']: execution['executed_on']
+                      for execution in executions}
+
+    historyEntries = list(_collection(dbConnection, CitoTableType.TestHistory, organizationId).find(
+        {'execution_id': {'$in': list(executedOnById.keys())}}, {'_id': 0}))
+
+    return executedOnById, historyEntries
+
+
+def _rollUpDay(dbConnection: database.Database, organizationId: str, dayStart: str, dayEnd: str, granularity: str):
+    executedOnById, historyEntries = _loadDay(
+        dbConnection, organizationId, dayStart, dayEnd)
+
+    rollups = _toRollups(historyEntries, executedOnById, granularity)
+    if len(rollups):
+        # roll-up ids are deterministic, so recomputing a day replaces instead of duplicating
+        _collection(dbConnection, CitoTableType.TestHistoryRollups, organizationId).bulk_write(
+            [ReplaceOne({'_id': rollup['_id']}, rollup, upsert=True) for rollup in rollups], ordered=False)
+
+
+def _archive(dbConnection: database.Database, tableType: CitoTableType, organizationId: str, documents: "list[dict[str, Any]]"):
+    if not len(documents):
+        return
+    _archiveCollection(dbConnection, tableType, organizationId).bulk_write(
+        [ReplaceOne({'id': document['id']}, document, upsert=True) for document in documents], ordered=False)
+
+
+def _trimBuckets(dbConnection: database.Database, organizationId: str, historyEntries: "list[dict[str, Any]]"):
+    if not len(historyEntries):
+        return
+
+    historyIds = [entry['id'] for entry in historyEntries]
+    buckets = _collection(dbConnection, CitoTableType.TestHistoryBuckets, organizationId)
+    # count is left as it is: it counts the points ever pushed, so a trimmed bucket does not reopen for new points
+    buckets.update_many({'test_suite_id': {'$in': list(set(entry['test_suite_id'] for entry in historyEntries))}, 'points.id': {'$in': historyIds}},
+                        {'$pull': {'points': {'id': {'$in': historyIds}}}})
+    buckets.delete_many({'points': {'$size': 0}})
+
+
+def _toStateKeys(historyEntries: "list[dict[str, Any]]") -> "list[dict[str, Any]]":
+    keys = set((entry['test_suite_id'], entry.get('metric')) for entry in historyEntries)
+    return [{'test_suite_id': testSuiteId, 'metric': metric} for testSuiteId, metric in sorted(keys, key=lambda key: (key[0], key[1] or ''))]
+
+
+def _deleteDay(dbConnection: database.Database, organizationId: str, dayStart: str, dayEnd: str, archive: bool):
+    executedOnById, historyEntries = _loadDay(
+        dbConnection, organizationId, dayStart, dayEnd)
+
+    keptExecutionIds = set(entry['execution_id']
+                           for entry in historyEntries if _isKept(entry))
+    executionIds = [executionId for executionId in executedOnById.keys()
+                    if executionId not in keptExecutionIds]
+    if not len(executionIds):
+        return
+
+    deletedEntries = [entry for entry in historyEntries if entry['execution_id'] not in keptExecutionIds]
+    # noted before anything is deleted, a resumed run no longer finds the deleted history but still has to rebuild the states
+    stateKeys = _toStateKeys(deletedEntries)
+    if len(stateKeys):
+        _collection(dbConnection, CitoTableType.TestCompactionJobs, organizationId).update_one(
+            {'_id': dayStart}, {'$addToSet': {'suite_states': {'$each': stateKeys}}}, upsert=True)
+
+    byExecution = {'execution_id': {'$in': executionIds}}
+    if archive:
+        _archive(dbConnection, CitoTableType.TestExecutions, organizationId, list(_collection(
+            dbConnection, CitoTableType.TestExecutions, organizationId).find({'id': {'$in': executionIds}}, {'_id': 0})))
+        for tableType in (CitoTableType.TestHistory, CitoTableType.TestResults):
+            _archive(dbConnection, tableType, organizationId, list(_collection(
+                dbConnection, tableType, organizationId).find(byExecution, {'_id': 0})))
+
+    _trimBuckets(dbConnection, organizationId, deletedEntries)
+
+    # executions go last: as long as they exist, a resumed run finds the day's history and results again
+    for tableType in (CitoTableType.TestHistory, CitoTableType.TestResults, CitoTableType.TestRuns):
+        _collection(dbConnection, tableType, organizationId).delete_many(byExecution)
+    _collection(dbConnection, CitoTableType.TestExecutions, organizationId).delete_many(
+        {'id': {'$in': executionIds}})
+
+
+def _refreshSuiteStates(dbConnection: database.Database, organizationId: str, dayStart: str, windowSize: int):
+    job = _collection(dbConnection, CitoTableType.TestCompactionJobs, organizationId).find_one({'_id': dayStart}) or {}
+    stateKeys = job.get('suite_states', [])
+    if not len(stateKeys):
+        return
+
+    # the deleted points were the oldest of their suites: first and count of the states changed, small windows lost points.
+    # States that do not exist yet are left to their first read
+    stateIds = [toSuiteStateId(key['test_suite_id'], key.get('metric')) for key in stateKeys]
+    existing = set(state['_id'] for state in _collection(
+        dbConnection, CitoTableType.TestSuiteStates, organizationId).find({'_id': {'$in': stateIds}}, {'_id': 1}))
+    for key, stateId in zip(stateKeys, stateIds):
+        if stateId in existing:
+            rebuildSuiteState(dbConnection, organizationId, key['test_suite_id'], key.get('metric'), windowSize)
+
+
+def _setJobStatus(dbConnection: database.Database, organizationId: str, dayStart: str, status: str):
+    _collection(dbConnection, CitoTableType.TestCompactionJobs, organizationId).update_one(
+        {'_id': dayStart}, {'$set': {'status': status, 'updated_on': datetime.utcnow().isoformat()}}, upsert=True)
+
+
+def _getDays(dbConnection: database.Database, organizationId: str, cutoff: datetime) -> "list[str]":
+    oldest = _collection(dbConnection, CitoTableType.TestExecutions, organizationId).find_one(
+        {}, {'_id': 0, 'executed_on': 1}, sort=[('executed_on', 1)])
+    if not oldest:
+        return []
+
+    day = datetime.fromisoformat(oldest['executed_on'][:10])
+    days = []
+    while day + timedelta(days=1) <= cutoff:
+        days.append(day.date().isoformat())
+        day += timedelta(days=1)
+
+    return days
+
+
+def compactOrganization(dbConnection: database.Database, organizationId: str, retentionDays: int, granularity: str, archive: bool, windowSize: int, now: Union[datetime, None] = None) -> int:
+    """Rolls raw quantitative history older than retentionDays up into test_history_rollups and removes it. Returns the number of compacted days.
+
+    windowSize is the suite state window size the touched suite states are rebuilt with."""
+    if granularity not in _granularityKeyLength:
+        raise Exception(f'Unknown roll-up granularity {granularity}')
+
+    ensureOrgIndexes(dbConnection, organizationId)
+
+    cutoff = datetime.fromisoformat(
+        ((now or datetime.utcnow()) - timedelta(days=retentionDays)).date().isoformat())
+    jobs = {job['_id']: job['status'] for job in _collection(
+        dbConnection, CitoTableType.TestCompactionJobs, organizationId).find()}
+
+    compacted = 0
+    # a day interrupted after its executions were deleted lies before the oldest execution, it is finished from its job
+    unfinished = [dayStart for dayStart, status in jobs.items() if status != 'done' and dayStart < cutoff.date().isoformat()]
+    for dayStart in sorted(set(_getDays(dbConnection, organizationId, cutoff) + unfinished)):
+        status = jobs.get(dayStart, 'pending')
+        if status == 'done':
+            continue
+
+        dayEnd = (datetime.fromisoformat(dayStart) + timedelta(days=1)).date().isoformat()
+
+        if status == 'pending':
+            _setJobStatus(dbConnection, organizationId, dayStart, 'pending')
+            _rollUpDay(dbConnection, organizationId, dayStart, dayEnd, granularity)
+            _setJobStatus(dbConnection, organizationId, dayStart, 'rolled_up')
+
+        _deleteDay(dbConnection, organizationId, dayStart, dayEnd, archive)
+        _refreshSuiteStates(dbConnection, organizationId, dayStart, windowSize)
+        _setJobStatus(dbConnection, organizationId, dayStart, 'done')
+        compacted += 1
+
+    logger.info(
+        f'Compacted {compacted} days of organization {organizationId} (cutoff {cutoff.date().isoformat()})')
+
+    return compacted
+
+
+if __name__ == '__main__':
+    from mongo_db import get_mongo_connection
+    from migrate_history_layout import getOrganizationIds
+
+    retentionDays, granularity, archive = getRetentionDetails()
+
+    parser = argparse.ArgumentParser(
+        description='Roll up and remove raw test history older than the retention period')
+    parser.add_argument('--org', action='append',
+                        help='organization id to compact, defaults to all organizations')
+    parser.add_argument('--retention-days', type=int, default=retentionDays)
+    parser.add_argument('--granularity', choices=list(_granularityKeyLength.keys()), default=granularity)
+    parser.add_argument('--archive', action='store_true', default=archive)
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    dbConnection = get_mongo_connection()
+    for organizationId in args.org or getOrganizationIds(dbConnection):
+        compactOrganization(dbConnection, organizationId,
+                            args.retention_days, args.granularity, args.archive, getSuiteStateWindowSize())
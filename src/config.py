@@ -1,4 +1,5 @@
 import os
+import json
 
 
 def getMode():
@@ -27,4 +28,77 @@ def getAccountApiRoot():
 
 def getMongoDetails():
     return (os.environ.get('MONGODB_DB_NAME'), 
-            os.environ.get('MONGODB_DB_URL'))
\ No newline at end of file
+            os.environ.get('MONGODB_DB_URL'))
+
+def getExecutionBudgetDetails():
+    # (forecast reserve, persistence reserve, max snowflake query time) in seconds
+    return (float(os.environ.get('BUDGET_FORECAST_RESERVE_S', '20')),
+            float(os.environ.get('BUDGET_PERSIST_RESERVE_S', '5')),
+            float(os.environ.get('BUDGET_MAX_QUERY_S', '120')))
+def getHistoryLayout():
+    # 'split' (history, results, alerts and executions in separate collections), 'consolidated' (additionally one test_runs document per execution, read without $lookup)
+    # or 'bucketed' (additionally many points per test_history_buckets document)
+    return os.environ.get('HISTORY_LAYOUT', 'split')
+
+def getHistoryBucketSize():
+    # points per document in the 'bucketed' history layout
+    return int(os.environ.get('HISTORY_BUCKET_SIZE', '100'))
+
+def getSuiteStateEnabled():
+    # read the model window from the incrementally maintained test_suite_states document
+    return os.environ.get('SUITE_STATE_ENABLED', 'false').lower() == 'true'
+
+def getSuiteStateWindowSize():
+    # points the suite state window keeps, suites with a window of at most as many latest points are read from it
+    return int(os.environ.get('SUITE_STATE_WINDOW_SIZE', '25'))
+
+def getForecastMode():
+    # 'eager' (always fit the forecast) or 'lazy' (fit it only if the z-score analysis flags the point)
+    return os.environ.get('FORECAST_MODE', 'eager')
+
+def getForecastEngine():
+    # 'prophet' or 'numpy', suites can override it with their forecast_engine field
+    return os.environ.get('FORECAST_ENGINE', 'prophet')
+
+def getForecastWarmStartEnabled():
+    # initialise Prophet fits from the parameters of the suite's previous fit (kept in test_suite_states)
+    return os.environ.get('FORECAST_WARM_START', 'false').lower() == 'true'
+
+def getPredictAheadEnabled():
+    # scheduled (system internal) executions precompute the forecast of the suite's next execution (kept in test_suite_states)
+    return os.environ.get('PREDICT_AHEAD', 'false').lower() == 'true'
+
+def getSeriesRoutingDetails():
+    # (classify each suite's series and fit the forecast only where it is needed, hours a cached classification is kept)
+    return (os.environ.get('SERIES_ROUTING', 'false').lower() == 'true',
+            float(os.environ.get('SERIES_CLASS_TTL_HOURS', '24')))
+
+def getStreamingStatisticsEnabled():
+    # keep the window's values sorted in test_suite_states and update median and MAD per point (needs SUITE_STATE_ENABLED)
+    return os.environ.get('STREAMING_STATISTICS', 'false').lower() == 'true'
+
+def getHistoryWindowMaxPoints():
+    # points the model sees at most, longer suite windows (history_window_points or history_window_days) are capped or downsampled to it
+    return int(os.environ.get('HISTORY_WINDOW_MAX_POINTS', '400'))
+
+def getBatchFlushSize():
+    # executions of a multi suite run whose writes are flushed together, a failed flush fails these executions only
+    return int(os.environ.get('BATCH_FLUSH_SIZE', '50'))
+
+def getModelWorkers():
+    # worker processes running the models of multi suite runs, 0 for one per available core (with one core models run in process)
+    return int(os.environ.get('MODEL_WORKERS', '0'))
+
+def getRetentionDetails():
+    # (days raw history is kept, roll-up granularity 'hourly' or 'daily', archive raw documents instead of only deleting them)
+    return (int(os.environ.get('HISTORY_RETENTION_DAYS', '90')),
+            os.environ.get('HISTORY_ROLLUP_GRANULARITY', 'daily'),
+            os.environ.get('HISTORY_ARCHIVE', 'false').lower() == 'true')
+
+def getSlowQueryThresholdMs():
+    # commands slower than this are logged
+    return float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '100'))
+
+def getWriteConcernDetails():
+    # per collection type write concern options, e.g. {"test_query_metrics": {"w": 0}}
+    return json.loads(os.environ.get('MONGODB_WRITE_CONCERNS', '{}'))
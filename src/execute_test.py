@@ -1,18 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, asdict
-from datetime import datetime, timedelta
+from datetime import datetime
 import json
+import time
 from typing import Any, Union
-from cito_data_query import CitoTableType, insertTableData, getTestData, getHistoryData, getLastMatSchemaData, updateTableData
+from cito_data_query import CitoTableType, getTestData, getHistoryData, getRunHistoryData, getBucketHistoryData, getHistorySpanData, getRunHistorySpanData, countHistoryData, buildBucketPointUpsert, getLastMatSchemaData, getSuiteStatesData, claimAlertSlot, quantColumnTest, quantMatTest, qualMatTest
 from mongo_db import get_mongo_connection
+from index_manager import ensureOrgIndexes
 from new_column_data_query import getCardinalityQuery, getDistributionQuery, getNullnessQuery, getUniquenessQuery, getFreshnessQuery as getColumnFreshnessQuery
 from new_materialization_data_query import MaterializationType, getColumnCountQuery, getFreshnessQuery, getRowCountQuery, getSchemaChangeQuery
-from qual_model import ColumnDefinition, SchemaChangeModel, ResultDto as QualResultDto
-from quant_model import ResultDto as QuantTestResultDto, CommonModel
-from query_snowflake import QuerySnowflake, QuerySnowflakeAuthDto, QuerySnowflakeRequestDto
+from qual_model import ColumnDefinition, SchemaChangeModel, SchemaSnapshot, ResultDto as QualResultDto, toSchemaJson, fromSchemaJson, hashSchemaJson
+from quant_model import ResultDto as QuantTestResultDto, ForecastSkipReason, buildForecastEngine
+from query_snowflake import QuerySnowflake, QuerySnowflakeAuthDto, QuerySnowflakeRequestDto, QuerySnowflakeResponseDto
 from i_forced_threshold import ForcedThreshold, ForcedThresholdMode, ForcedThresholdType
-from test_execution_result import CustomTestAlertData, CustomTestData, CustomTestExecutionResult, QualTestAlertData, QualTestData, QualTestExecutionResult, QuantTestAlertData, QuantTestData, QuantTestExecutionResult, AnomalyData
+from i_forecast_engine import ForecastDto, IForecastEngine
+from prophet_forecast_engine import ProphetForecastEngine
+from i_model_runner import IModelRunner, ModelTask
+from model_runner import InProcessModelRunner
+from history_window import HistoryWindow, toHistoryWindow, toModelWindow
+from predict_ahead import PendingPrediction, predict, toNextWindow, toPrecomputedForecast
+from series_router import ModelRoute, classifySeries, fromSeriesClassDocument, routeModel, toSeriesClassDocument
+from test_execution_result import CustomTestAlertData, CustomTestData, CustomTestExecutionResult, CustomTestMetricResult, QualTestAlertData, QualTestData, QualTestExecutionResult, QuantTestAlertData, QuantTestData, QuantTestExecutionResult, AnomalyData
 from test_type import QuantColumnTest, QuantMatTest, QualMatTest, CustomTest
 from use_case import IUseCase
+from execution_budget import ExecutionBudget
+from config import getHistoryLayout, getHistoryBucketSize, getSuiteStateEnabled, getSuiteStateWindowSize, getForecastMode, getForecastEngine, getForecastWarmStartEnabled, getPredictAheadEnabled, getSeriesRoutingDetails, getStreamingStatisticsEnabled, getHistoryWindowMaxPoints
+from suite_state import buildWindowPointUpdate, buildWindowResetUpdate, loadSuiteState, toHistoryEntries, toSuiteStateId, toWindowStatistics
+from window_statistics import WindowStatistics
+from write_buffer import WriteBuffer
 import logging
 import uuid
 
@@ -21,6 +36,9 @@ from result import Result
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# shared by all executions of the process, used to overlap independent fetches
+_ioExecutor = ThreadPoolExecutor(max_workers=4)
+
 
 def getAnomalyMessage(targetResourceId: Union[str, None], databaseName: Union[str, None], schemaName: Union[str, None], materializationName: Union[str, None], columnName: Union[str, None], testType: str):
     
@@ -56,6 +74,8 @@ class ExecuteTestRequestDto:
     testSuiteId: str
     testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]
     targetOrgId: Union[str, None]
+    # the response carries forecast bounds, so the forecast is fitted even if the evaluation is lazy
+    forecastBounds: bool = False
 
 
 @dataclass
@@ -74,6 +94,10 @@ class ExecuteTest(IUseCase):
 
     _MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION = 10
     _MIN_HISTORICAL_DATA_DAY_NUMBER_CONDITION = 7
+    _HISTORY_WINDOW_SIZE = 25
+    _ALERT_THROTTLE_HOURS = 24
+    # per suite (and metric) model state kept in test_suite_states next to the window
+    _MODEL_STATE_FIELDS = ['forecast_params', 'forecast_prediction', 'series_class']
 
     _testSuiteId: str
     _testType: Union[QuantColumnTest, QuantMatTest, QualMatTest, CustomTest]
@@ -86,14 +110,91 @@ class ExecuteTest(IUseCase):
     _jwt: str
 
     _requestLoggingInfo: str
+    _stageTimings: "dict[str, float]"
+    _queryMetrics: "list[dict[str, Any]]"
 
     _querySnowflake: QuerySnowflake
-
-    def __init__(self, querySnowflake: QuerySnowflake) -> None:
+    _budget: ExecutionBudget
+    _modelRunner: IModelRunner
+
+    _writeBuffer: WriteBuffer
+    _batchWriteBuffer: Union[WriteBuffer, None]
+
+    _historyLayout: str
+    _historyBucketSize: int
+    _historyWindowMaxPoints: int
+    # the suite's model window, resolved from its definition
+    _historyWindow: HistoryWindow
+    _suiteStateEnabled: bool
+    _streamingStatisticsEnabled: bool
+    _forecastMode: str
+    _forecastEngine: str
+    _forecastWarmStartEnabled: bool
+    _predictAheadEnabled: bool
+    _seriesRoutingEnabled: bool
+    _seriesClassTtlHours: float
+    _modelStates: "dict[Union[str, None], dict[str, Any]]"
+    _modelRoutes: "dict[Union[str, None], ModelRoute]"
+    # predictions of the next forecasts, fitted after the results are persisted
+    _pendingPredictions: "list[PendingPrediction]"
+    # eligible history entries per metric (up to the warm-up minimum), for windows that can hold fewer than that
+    _historyCounts: "dict[Union[str, None], int]"
+    # metrics whose suite state (with its window) was read by this execution
+    _loadedSuiteStates: "set[Union[str, None]]"
+    # statistics of the window read from the suite state and the state's count, per metric
+    _windowStatistics: "dict[Union[str, None], tuple[WindowStatistics, int]]"
+    _forecastBounds: bool
+    _isSystemInternal: bool
+    _executedOn: str
+    _stagedResults: "dict[Union[str, None], dict[str, Any]]"
+    _alertClaimTableType: Union[CitoTableType, None]
+
+    def __init__(self, querySnowflake: QuerySnowflake, budget: Union[ExecutionBudget, None] = None, writeBuffer: Union[WriteBuffer, None] = None, modelRunner: Union[IModelRunner, None] = None) -> None:
         self._querySnowflake = querySnowflake
+        self._budget = budget if budget else ExecutionBudget.unlimited()
+        self._batchWriteBuffer = writeBuffer
+        self._modelRunner = modelRunner if modelRunner else InProcessModelRunner()
+        self._pendingPredictions = []
+        self._loadSettings()
         self._dbConnection = get_mongo_connection()
 
+    def _loadSettings(self):
+        self._historyLayout = getHistoryLayout()
+        self._historyBucketSize = getHistoryBucketSize()
+        self._historyWindowMaxPoints = getHistoryWindowMaxPoints()
+        self._suiteStateEnabled = getSuiteStateEnabled()
+        self._suiteStateWindowSize = getSuiteStateWindowSize()
+        self._streamingStatisticsEnabled = getStreamingStatisticsEnabled()
+        self._forecastMode = getForecastMode()
+        self._forecastEngine = getForecastEngine()
+        self._forecastWarmStartEnabled = getForecastWarmStartEnabled()
+        self._predictAheadEnabled = getPredictAheadEnabled()
+        self._seriesRoutingEnabled, self._seriesClassTtlHours = getSeriesRoutingDetails()
+
+    def _stageInsert(self, document: "dict[str, Any]", tableType: CitoTableType):
+        self._writeBuffer.insert(document, tableType, self._organizationId)
+
+    def _handOverToBatch(self) -> bool:
+        # writes of a batch are flushed by its owner, only complete executions are handed over
+        if self._batchWriteBuffer is None:
+            return False
+
+        self._batchWriteBuffer.extend(self._writeBuffer)
+        self._writeBuffer.clear()
+        return True
+
+    def _persist(self):
+        if not self._handOverToBatch():
+            self._writeBuffer.flush(self._dbConnection)
+
+    def _isConsolidatedLayout(self) -> bool:
+        return self._historyLayout == 'consolidated'
+
+    def _isBucketedLayout(self) -> bool:
+        return self._historyLayout == 'bucketed'
+
     def _insertExecutionEntry(self, executedOn: str, tableType: CitoTableType):
+        self._executedOn = executedOn
 
         doc = {
             'id': self._executionId,
@@ -101,29 +202,28 @@ class ExecuteTest(IUseCase):
             'test_suite_id': self._testSuiteId
         }
 
-        insertTableData(doc, tableType, self._dbConnection,
-                        self._organizationId)
+        self._stageInsert(doc, tableType)
 
-    def _insertQualHistoryEntry(self, value: "dict[str, ColumnDefinition]", isIdentical: bool, alertId: Union[str, None]):
+    def _insertSchemaSnapshot(self, snapshot: SchemaSnapshot):
+        # content addressed: a schema is stored once per organization, no matter how many runs observe it
+        self._writeBuffer.upsert({'_id': snapshot.schemaHash}, {'$setOnInsert': {'value': snapshot.value, 'created_on': datetime.utcnow().isoformat()}},
+                                 CitoTableType.TestSchemaSnapshots, self._organizationId)
 
-        valueObj = {}
-        for key, val in value.items():
-            valueObj[key] = self._convertColumnDefToObject(val)
+    def _insertQualHistoryEntry(self, schemaHash: str, isIdentical: bool, alertId: Union[str, None]):
 
         doc = {
             'id': str(uuid.uuid4()),
             'test_type': self._testDefinition['test_type'],
-            'value': json.dumps(valueObj),
+            'schema_hash': schemaHash,
             'is_identical': isIdentical,
             'test_suite_id': self._testSuiteId,
             'execution_id': self._executionId,
             'alert_id': alertId
         }
 
-        insertTableData(doc, CitoTableType.TestHistoryQual,
-                        self._dbConnection, self._organizationId)
+        self._stageInsert(doc, CitoTableType.TestHistoryQual)
 
-    def _insertHistoryEntry(self, value: str, isAnomaly: bool, alertId: Union[str, None]):
+    def _insertHistoryEntry(self, value: str, isAnomaly: bool, alertId: Union[str, None], metric: Union[str, None] = None):
 
         if 'test_type' in self._testDefinition:
             testType = self._testDefinition['test_type']
@@ -140,9 +240,69 @@ class ExecuteTest(IUseCase):
             'execution_id': self._executionId,
             'alert_id': alertId
         }
+        if metric is not None:
+            doc['metric'] = metric
+
+        self._stageInsert(doc, CitoTableType.TestHistory)
+
+        if self._isConsolidatedLayout():
+            self._insertRunEntry(doc, metric)
+        elif self._isBucketedLayout():
+            self._insertBucketPoint(doc, metric)
+
+        if self._suiteStateEnabled and not isAnomaly:
+            self._stageWindowPoint(value, metric)
+
+    def _stageWindowPoint(self, value: Any, metric: Union[str, None]):
+        # e.g. suites with their own history window do not read the state, it might not exist or be outdated
+        if metric not in self._loadedSuiteStates:
+            filter, update = buildWindowResetUpdate(self._testSuiteId, metric)
+            self._writeBuffer.upsert(
+                filter, update, CitoTableType.TestSuiteStates, self._organizationId)
+            return
+
+        statistics, count = self._windowStatistics.get(metric, (None, None))
+        if statistics is not None:
+            statistics.add(value, self._suiteStateWindowSize)
+        filter, update = buildWindowPointUpdate(
+            self._testSuiteId, metric, self._suiteStateWindowSize, self._executedOn, value, statistics, count)
+        self._writeBuffer.updateOne(
+            filter, update, CitoTableType.TestSuiteStates, self._organizationId)
+
+    def _insertBucketPoint(self, historyDoc: "dict[str, Any]", metric: Union[str, None]):
+        point = {
+            'id': historyDoc['id'],
+            't': self._executedOn,
+            'v': historyDoc['value'],
+            'a': historyDoc['is_anomaly'],
+            'f': historyDoc['user_feedback_is_anomaly']
+        }
+
+        filter, update = buildBucketPointUpsert(
+            self._testSuiteId, metric, self._historyBucketSize, point)
+        self._writeBuffer.upsert(
+            filter, update, CitoTableType.TestHistoryBuckets, self._organizationId)
+
+    def _insertRunEntry(self, historyDoc: "dict[str, Any]", metric: Union[str, None]):
+        # one document per execution (and metric) holding everything the read path and the UI need
+        resultDoc = self._stagedResults.pop(metric, None)
+
+        doc = {
+            'id': historyDoc['id'],
+            'test_type': historyDoc['test_type'],
+            'test_suite_id': self._testSuiteId,
+            'execution_id': self._executionId,
+            'executed_on': self._executedOn,
+            'value': historyDoc['value'],
+            'is_anomaly': historyDoc['is_anomaly'],
+            'user_feedback_is_anomaly': historyDoc['user_feedback_is_anomaly'],
+            'alert_id': historyDoc['alert_id'],
+            'result': {key: value for key, value in resultDoc.items() if key not in ('id', 'test_type', 'test_suite_id', 'execution_id', 'metric')} if resultDoc else None
+        }
+        if metric is not None:
+            doc['metric'] = metric
 
-        insertTableData(doc, CitoTableType.TestHistory,
-                        self._dbConnection, self._organizationId)
+        self._stageInsert(doc, CitoTableType.TestRuns)
 
     def _convertColumnDefToObject(self, colDef: ColumnDefinition):
         obj = {}
@@ -154,7 +314,7 @@ class ExecuteTest(IUseCase):
 
         return obj
 
-    def _insertQualTestResultEntry(self, testResult: QualResultDto):
+    def _insertQualTestResultEntry(self, testResult: QualResultDto, expectedSchemaHash: Union[str, None]):
 
         expectedValue = {}        
         if testResult.expectedValue:
@@ -165,16 +325,16 @@ class ExecuteTest(IUseCase):
             'id': str(uuid.uuid4()),
             'test_type': self._testDefinition['test_type'],
             'expected_value': json.dumps(expectedValue) if testResult.expectedValue else None,
+            'expected_schema_hash': expectedSchemaHash,
             'deviation': json.dumps([asdict(el) for el in testResult.deviations]),
             'is_identical': testResult.isIdentical,
             'test_suite_id': self._testSuiteId,
             'execution_id': self._executionId
         }
 
-        insertTableData(doc, CitoTableType.TestResultsQual,
-                        self._dbConnection, self._organizationId)
+        self._stageInsert(doc, CitoTableType.TestResultsQual)
 
-    def _insertResultEntry(self, testResult: QuantTestResultDto):
+    def _insertResultEntry(self, testResult: QuantTestResultDto, metric: Union[str, None] = None):
 
         if 'test_type' in self._testDefinition:
             testType = self._testDefinition['test_type']
@@ -194,13 +354,20 @@ class ExecuteTest(IUseCase):
             'is_anomalous': bool(testResult.anomaly),
             'test_suite_id': self._testSuiteId,
             'execution_id': self._executionId,
-            'importance': testResult.anomaly.importance if testResult.anomaly else None
+            'importance': testResult.anomaly.importance if testResult.anomaly else None,
+            'forecast_skip_reason': testResult.forecastSkipReason.value if testResult.forecastSkipReason else None
         }
+        route = self._modelRoutes.get(metric)
+        if route:
+            doc['series_class'] = route.seriesClass.value if route.seriesClass else None
+            doc['forecast_engine'] = route.forecastEngine
+        if metric is not None:
+            doc['metric'] = metric
 
-        insertTableData(doc, CitoTableType.TestResults,
-                        self._dbConnection, self._organizationId)
+        self._stageInsert(doc, CitoTableType.TestResults)
+        self._stagedResults[metric] = doc
 
-    def _insertAlertEntry(self, id, message: str, tableType: CitoTableType):
+    def _insertAlertEntry(self, id, message: str, tableType: CitoTableType, metric: Union[str, None] = None):
 
         if 'test_type' in self._testDefinition:
             testType = self._testDefinition['test_type']
@@ -214,9 +381,10 @@ class ExecuteTest(IUseCase):
             'test_suite_id': self._testSuiteId,
             'execution_id': self._executionId
         }
+        if metric is not None:
+            doc['metric'] = metric
 
-        insertTableData(doc, tableType, self._dbConnection,
-                        self._organizationId)
+        self._stageInsert(doc, tableType)
 
     def _getTestEntry(self) -> Any:
 
@@ -228,31 +396,127 @@ class ExecuteTest(IUseCase):
     def _toProphetDtFormat(self, dt: datetime) -> str:
         return dt.strftime('%Y-%m-%d %H:%M:%S')
 
-    def _getHistoricalData(self) -> "list[tuple[str, float]]":
+    def _toHistoricalData(self, historyData: "list[dict[str, Any]]") -> "list[tuple[str, float]]":
+        return sorted([(self._toProphetDtFormat(self._fromIsoFormatToDateTime(element['executed_on'])), element['value']) for element in historyData])
 
-        historyData = getHistoryData(
-            self._testSuiteId, self._dbConnection, self._organizationId)
+    def _toStateHistoryEntries(self, state: "dict[str, Any]", metric: Union[str, None]) -> "list[dict[str, Any]]":
+        self._loadedSuiteStates.add(metric)
+        if self._streamingStatisticsEnabled:
+            self._windowStatistics[metric] = (
+                toWindowStatistics(state), state['count'])
+        return toHistoryEntries(state)
+
+    def _getWindowStatistics(self, historicalData: "list[tuple[str, float]]", metric: Union[str, None]) -> Union[WindowStatistics, None]:
+        statistics, _ = self._windowStatistics.get(metric, (None, None))
+        # the model window is the state's window unless the history holds fewer points than the window size
+        if statistics is None or len(statistics) != len(historicalData):
+            return None
+        return statistics
 
-        return sorted([(self._toProphetDtFormat(self._fromIsoFormatToDateTime(element['executed_on'])), element['value']) for element in historyData])
+    def _toHistoryWindow(self) -> HistoryWindow:
+        return toHistoryWindow(self._testDefinition, self._HISTORY_WINDOW_SIZE, self._historyWindowMaxPoints, datetime.utcnow())
+
+    def _readsSuiteState(self, window: HistoryWindow) -> bool:
+        # the model window is cut from the state's window, which holds the latest points only
+        return self._suiteStateEnabled and window.start is None and window.points <= self._suiteStateWindowSize
+
+    def _countsHistory(self) -> bool:
+        # short and downsampled windows hold fewer points than the suite has, warm-up needs the real number
+        return self._historyWindow.start is not None or self._historyWindow.points <= self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION
+
+    def _getHistoryEntries(self, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+        if self._countsHistory():
+            self._historyCounts[metric] = countHistoryData(
+                self._testSuiteId, self._dbConnection, self._organizationId, metric, self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION + 1)
+
+        window = self._historyWindow
+
+        # entries of multi metric custom tests are tagged with their metric, all others are untagged
+        if window.start is not None:
+            # time buckets are built from test_history (or test_runs), which the bucketed layout writes as well
+            readHistorySpan = getRunHistorySpanData if self._isConsolidatedLayout() else getHistorySpanData
+            return readHistorySpan(
+                self._testSuiteId, self._dbConnection, self._organizationId, window.start, window.bucketKeyLength, window.points, metric)
 
-    def _getLastMatSchema(self) -> Union["dict[str, ColumnDefinition]", None]:
+        if self._readsSuiteState(window):
+            return self._toStateHistoryEntries(loadSuiteState(
+                self._dbConnection, self._organizationId, self._testSuiteId, metric, self._suiteStateWindowSize), metric)
+
+        if self._isBucketedLayout():
+            return getBucketHistoryData(
+                self._testSuiteId, self._dbConnection, self._organizationId, self._historyBucketSize, window.points, metric)
+
+        readHistory = getRunHistoryData if self._isConsolidatedLayout() else getHistoryData
+        return readHistory(
+            self._testSuiteId, self._dbConnection, self._organizationId, window.points, metric)
+
+    def _toMatSchemaSnapshot(self, result: "list[dict[str, Any]]") -> Union[SchemaSnapshot, None]:
+        if not len(result):
+            return None
+
+        entry = result[0]
+        if entry.get('schema_hash'):
+            return SchemaSnapshot(entry['schema_hash'], entry.get('value'), entry.get('value') is not None)
+
+        # entries written before content addressing store the (non canonical) schema itself
+        value = toSchemaJson(fromSchemaJson(entry['value']))
+        return SchemaSnapshot(hashSchemaJson(value), value, False)
+
+    def _getLastMatSchema(self) -> Union[SchemaSnapshot, None]:
 
         result = getLastMatSchemaData(
             self._testSuiteId, self._dbConnection, self._organizationId)
 
-        oldSchema = {}
-        if len(result):
-            oldSchema = json.loads(result[0]['value'])
-            for key, value in oldSchema.items():
-                    colDef = ColumnDefinition(value['columnName'], value['dataType'], value['isIdentity'], value['isNullable'], value['ordinalPosition'])
-                    oldSchema[key] = colDef 
-
-        return (oldSchema if len(result) else None)
+        return self._toMatSchemaSnapshot(result)
 
     def _getNewData(self, query) -> "list[dict[str, Any]]":
+        start = time.perf_counter()
         getNewDataResult = self._querySnowflake.execute(
-            QuerySnowflakeRequestDto(query, self._targetOrgId), QuerySnowflakeAuthDto(self._jwt))
+            QuerySnowflakeRequestDto(query, self._targetOrgId, self._budget.queryTimeout()), QuerySnowflakeAuthDto(self._jwt))
+        self._recordQueryMetrics(getNewDataResult, start)
+
+        return self._toNewData(getNewDataResult)
+
+    def _recordQueryMetrics(self, getNewDataResult: QuerySnowflakeResponseDto, start: float):
+        roundTripMs = round((time.perf_counter() - start) * 1000, 1)
+        metadata = getNewDataResult.value.metadata if getNewDataResult.success and getNewDataResult.value else None
+        rows = getNewDataResult.value.content.get(self._organizationId) if getNewDataResult.success and getNewDataResult.value else None
+
+        self._queryMetrics.append({
+            'query_id': metadata.queryId if metadata else None,
+            'warehouse': metadata.warehouse if metadata else None,
+            'elapsed_ms': metadata.elapsedMs if metadata else None,
+            'round_trip_ms': roundTripMs,
+            'rows_scanned': metadata.rowsScanned if metadata else None,
+            'bytes_scanned': metadata.bytesScanned if metadata else None,
+            'rows_returned': len(rows) if rows is not None else None,
+            'success': getNewDataResult.success
+        })
+
+    def _stageQueryMetrics(self):
+        if 'test_type' in self._testDefinition:
+            testType = self._testDefinition['test_type']
+        else:
+            testType = self._testDefinition['name']
+
+        executedOn = datetime.utcnow().isoformat()
+
+        for metrics in self._queryMetrics:
+            doc = {
+                'id': str(uuid.uuid4()),
+                'test_type': testType,
+                'test_suite_id': self._testSuiteId,
+                'execution_id': self._executionId,
+                'executed_on': executedOn,
+                **metrics,
+                'stage_timings': dict(self._stageTimings)
+            }
 
+            self._stageInsert(doc, CitoTableType.TestQueryMetrics)
+
+        self._queryMetrics = []
+
+    def _toNewData(self, getNewDataResult: QuerySnowflakeResponseDto) -> "list[dict[str, Any]]":
         if not getNewDataResult.success:
             raise Exception(getNewDataResult.error)
         if not getNewDataResult.value:
@@ -262,72 +526,53 @@ class ExecuteTest(IUseCase):
 
         return newData
 
-    def _updateLastAlertSent(self, lastAlertSent: str, tableType: CitoTableType):
+    def _calculateLastAlertSent(self, lastAlertSent: str, tableType: CitoTableType):
+        # evaluation stays free of I/O: the throttle is claimed atomically in _claimAlert (after persisting), which replaces this value
+        self._alertClaimTableType = tableType
 
-        updateTableData(self._testSuiteId, tableType, 'last_alert_sent',
-                        lastAlertSent, self._dbConnection, self._organizationId)
+        return lastAlertSent
 
-    def _calculateLastAlertSent(self, lastAlertSent: str, tableType: CitoTableType):
-        if not lastAlertSent:
-            lastAlertSent = datetime.utcnow().isoformat()
-            self._updateLastAlertSent(lastAlertSent, tableType=tableType)
+    def _applyAlertClaim(self, testResult: Any, won: bool, previousLastAlertSent: Union[str, None]):
+        # the previous value is returned as before: None or older than the window if this execution won the alert
+        testResult.lastAlertSent = previousLastAlertSent
 
-            return None
-        
-        lastAlertSentDt = datetime.fromisoformat(lastAlertSent)
-        currTime = datetime.utcnow()
-        diff = currTime - lastAlertSentDt
-        if diff >= timedelta(hours=24):
-            currTimeISO = currTime.isoformat()
-            self._updateLastAlertSent(currTimeISO, tableType=tableType)
-        else:
-            lastAlertSentDt = self._fromIsoFormatToDateTime(lastAlertSent)
-            currTime = datetime.utcnow()
-            diff = currTime - lastAlertSentDt
-            if diff >= timedelta(hours=24):
-                currTimeISO = currTime.isoformat()
-                self._updateLastAlertSent(currTimeISO, tableType=tableType)
+        if not won:
+            logger.info(
+                f'Alert throttled, last alert sent {previousLastAlertSent} - {self._requestLoggingInfo}')
 
-        return lastAlertSent
+    def _claimAlert(self, testResult: Any):
+        if self._alertClaimTableType is None:
+            return
 
-    def _runCustomTest(self) -> CustomTestExecutionResult:
-        sqlLogic = self._testDefinition['sql_logic']
-        targetResourceIds = self._testDefinition['target_resource_ids']
-        testSuiteId = self._testDefinition['id']
+        won, previousLastAlertSent = claimAlertSlot(
+            self._testSuiteId, self._alertClaimTableType, self._dbConnection, self._organizationId, self._ALERT_THROTTLE_HOURS)
+        self._applyAlertClaim(testResult, won, previousLastAlertSent)
+
+    def claimBatchAlert(self, result: ExecuteTestResponseDto) -> ExecuteTestResponseDto:
+        """Claims the alert of an execution whose writes the batch flushed."""
+        if not result.success:
+            return result
+
+        try:
+            self._claimAlert(result.value)
+            return result
+        except Exception as e:
+            logger.exception(
+                f'error: {e}' if e.args[0] else f'error: unknown - {self._requestLoggingInfo}')
+            return Result.fail('')
+
+    def storeBatchPredictions(self):
+        """Fits and stores the predictions of an execution whose writes the batch flushed."""
+        if len(self._pendingPredictions):
+            self._storePredictions()
+
+    def _buildForcedThresholds(self) -> "tuple[Union[ForcedThreshold, None], Union[ForcedThreshold, None]]":
         customLowerThreshold = self._testDefinition['custom_lower_threshold']
         customLowerThresholdMode = self._testDefinition['custom_lower_threshold_mode']
         customUpperThreshold = self._testDefinition['custom_upper_threshold']
         customUpperThresholdMode = self._testDefinition['custom_upper_threshold_mode']
         feedbackLowerThreshold = self._testDefinition['feedback_lower_threshold']
         feedbackUpperThreshold = self._testDefinition['feedback_upper_threshold']
-        lastAlertSent = self._testDefinition['last_alert_sent']
-        testName = self._testDefinition['name']
-
-        newData = self._getNewData(sqlLogic)
-
-        if (len(newData) != 1):
-            raise Exception(
-                testName + '- More than one or no matching new data entries found')
-        
-        metric, newDataPoint = newData[0].popitem()
-
-        historicalData = self._getHistoricalData()
-
-        executedOn = datetime.utcnow()
-        executedOnISOFormat = executedOn.isoformat()
-        
-        self._insertExecutionEntry(
-            executedOnISOFormat, CitoTableType.TestExecutions)
-        
-        historicalDataLength = len(historicalData)
-        print('Historical data length: ' + str(historicalDataLength))
-        belowDayBoundary = True if historicalDataLength == 0 else (
-            executedOn - self._fromIsoFormatToDateTime(historicalData[0][0])).days <= self._MIN_HISTORICAL_DATA_DAY_NUMBER_CONDITION
-        if (belowDayBoundary or historicalDataLength <= self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION):
-            self._insertHistoryEntry(
-                newDataPoint, False, None)
-
-            return CustomTestExecutionResult(testSuiteId, CustomTest.CustomTest.value, self._executionId, self._organizationId, testName, targetResourceIds, True, None, None, lastAlertSent)
 
         lowerThreshold = None if feedbackLowerThreshold is None else ForcedThreshold(
             feedbackLowerThreshold, ForcedThresholdMode.ABSOLUTE, ForcedThresholdType.FEEDBACK)
@@ -351,14 +596,86 @@ class ExecuteTest(IUseCase):
 
         upperThreshold = upperThreshold if customUpperThreshold is None else ForcedThreshold(
             customUpperThreshold, forcedUpperThresholdMode, ForcedThresholdType.CUSTOM)
-        
-        relevantHistoricalData = historicalData if len(
-            historicalData) <= 25 else historicalData[-25:]
 
-        testResult = self._runModel(
-            (executedOnISOFormat, newDataPoint), relevantHistoricalData, CustomTest.CustomTest, lowerThreshold, upperThreshold)
+        return lowerThreshold, upperThreshold
 
-        self._insertResultEntry(testResult)
+    def _isWarmup(self, executedOn: datetime, historicalData: "list[tuple[str, float]]", metric: Union[str, None] = None) -> bool:
+        historicalDataLength = self._historyCounts.get(metric, len(historicalData))
+        print('Historical data length: ' + str(historicalDataLength))
+        belowDayBoundary = True if historicalDataLength == 0 else (
+            executedOn - self._fromIsoFormatToDateTime(historicalData[0][0])).days <= self._MIN_HISTORICAL_DATA_DAY_NUMBER_CONDITION
+        return belowDayBoundary or historicalDataLength <= self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION
+
+    def _getCustomTestMetrics(self, newData: "list[dict[str, Any]]") -> "list[tuple[str, Any]]":
+        testName = self._testDefinition['name']
+        metricColumn = self._testDefinition.get('metric_column')
+
+        if not metricColumn:
+            if (len(newData) != 1):
+                raise Exception(
+                    testName + '- More than one or no matching new data entries found')
+            return list(newData[0].items())
+
+        if not len(newData):
+            raise Exception(testName + '- No matching new data entries found')
+
+        metrics: "list[tuple[str, Any]]" = []
+        for row in newData:
+            row = dict(row)
+            metricKey = metricColumn if metricColumn in row else metricColumn.upper()
+            if metricKey not in row:
+                raise Exception(
+                    f'{testName}- Metric column {metricColumn} missing in new data entry')
+            metric = str(row.pop(metricKey))
+            if len(row) != 1:
+                raise Exception(
+                    f'{testName}- Expected exactly one value column next to metric column {metricColumn}')
+            metrics.append((metric, row.popitem()[1]))
+
+        if len(set(metric for metric, _ in metrics)) != len(metrics):
+            raise Exception(testName + '- Duplicate metrics in new data entries')
+
+        return metrics
+
+    def _isMultiMetric(self, metrics: "list[tuple[str, Any]]") -> bool:
+        return len(metrics) > 1 or bool(self._testDefinition.get('metric_column'))
+
+    def _getTaggedHistoryMetrics(self, newData: "list[dict[str, Any]]") -> "list[str]":
+        if not self._isCustomTest():
+            return []
+
+        metrics = self._getCustomTestMetrics(newData)
+        return [metric for metric, _ in metrics] if self._isMultiMetric(metrics) else []
+
+    def _startCustomTestMetric(self, metric: str, isTagged: bool, newDataPoint: Any, historicalData: "list[tuple[str, float]]", executedOn: datetime) -> Union[tuple, None]:
+        """Arguments of the metric's model run, None for a warmup."""
+        historyMetric = metric if isTagged else None
+
+        if self._isWarmup(executedOn, historicalData, historyMetric):
+            self._insertHistoryEntry(
+                newDataPoint, False, None, historyMetric)
+
+            return None
+
+        lowerThreshold, upperThreshold = self._buildForcedThresholds()
+
+        relevantHistoricalData = toModelWindow(self._historyWindow, historicalData)
+
+        return ((executedOn.isoformat(), newDataPoint), relevantHistoricalData, CustomTest.CustomTest, lowerThreshold, upperThreshold, historyMetric)
+
+    def _runCustomTestMetric(self, metric: str, isTagged: bool, newDataPoint: Any, historicalData: "list[tuple[str, float]]", executedOn: datetime) -> CustomTestMetricResult:
+        modelArgs = self._startCustomTestMetric(metric, isTagged, newDataPoint, historicalData, executedOn)
+        if modelArgs is None:
+            return CustomTestMetricResult(metric, True, None, None)
+
+        return self._finishCustomTestMetric(metric, isTagged, newDataPoint, executedOn, self._runModel(*modelArgs))
+
+    def _finishCustomTestMetric(self, metric: str, isTagged: bool, newDataPoint: Any, executedOn: datetime, testResult: QuantTestResultDto) -> CustomTestMetricResult:
+        testSuiteId = self._testDefinition['id']
+        historyMetric = metric if isTagged else None
+        executedOnISOFormat = executedOn.isoformat()
+
+        self._insertResultEntry(testResult, historyMetric)
 
         alertData = None
         alertId = None
@@ -370,86 +687,251 @@ class ExecuteTest(IUseCase):
                 None, None, None, None, metric, CustomTest.CustomTest.value)
             alertId = str(uuid.uuid4())
             self._insertAlertEntry(
-                alertId, anomalyMessage, CitoTableType.TestAlerts)
+                alertId, anomalyMessage, CitoTableType.TestAlerts, historyMetric)
 
             alertData = CustomTestAlertData(alertId, anomalyMessage, testResult.expectedValue)
 
-            lastAlertSent = self._calculateLastAlertSent(lastAlertSent, tableType=CitoTableType.TestSuitesCustom)
-        
         testData = CustomTestData(
             executedOnISOFormat, newDataPoint, testResult.expectedValueUpper,
             testResult.expectedValueLower, testResult.modifiedZScore, testResult.deviation, AnomalyData(testResult.anomaly.importance) if testResult.anomaly else None)
 
         self._insertHistoryEntry(
-            newDataPoint, bool(testResult.anomaly), alertId)
+            newDataPoint, bool(testResult.anomaly), alertId, historyMetric)
 
-        return CustomTestExecutionResult(testSuiteId, CustomTest.CustomTest.value, self._executionId, self._organizationId, testName, targetResourceIds, False, testData, alertData, lastAlertSent)
+        return CustomTestMetricResult(metric, False, testData, alertData)
 
+    def _startCustomTest(self, newData: "list[dict[str, Any]]") -> "tuple[list[tuple[str, Any]], bool, datetime]":
+        metrics = self._getCustomTestMetrics(newData)
+        isMultiMetric = self._isMultiMetric(metrics)
 
-    def _runModel(self, newData: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", ) -> QuantTestResultDto:
-        return CommonModel(newData, historicalData, testType, forcedLowerThreshold, forcedUpperThreshold, ).run()
+        executedOn = datetime.utcnow()
+        
+        self._insertExecutionEntry(
+            executedOn.isoformat(), CitoTableType.TestExecutions)
 
-    def _runTest(self, newDataPoint, historicalData: "list[tuple[str,float]]") -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        materializationType = self._testDefinition['materialization_type']
-        columnName = self._testDefinition['column_name']
+        return metrics, isMultiMetric, executedOn
+
+    def _runCustomTest(self, newData: "list[dict[str, Any]]", historyByMetric: "dict[Union[str, None], list[dict[str, Any]]]") -> CustomTestExecutionResult:
+        metrics, isMultiMetric, executedOn = self._startCustomTest(newData)
+
+        metricResults = [self._runCustomTestMetric(metric, isMultiMetric, newDataPoint, self._toHistoricalData(
+            historyByMetric[metric if isMultiMetric else None]), executedOn) for metric, newDataPoint in metrics]
+
+        return self._finishCustomTest(metricResults, isMultiMetric)
+
+    def _finishCustomTest(self, metricResults: "list[CustomTestMetricResult]", isMultiMetric: bool) -> CustomTestExecutionResult:
+        targetResourceIds = self._testDefinition['target_resource_ids']
         testSuiteId = self._testDefinition['id']
-        customLowerThreshold = self._testDefinition['custom_lower_threshold']
-        customLowerThresholdMode = self._testDefinition['custom_lower_threshold_mode']
-        customUpperThreshold = self._testDefinition['custom_upper_threshold']
-        customUpperThresholdMode = self._testDefinition['custom_upper_threshold_mode']
-        targetResourceId = self._testDefinition['target_resource_id']
-        testType = self._testDefinition['test_type']
-        feedbackLowerThreshold = self._testDefinition['feedback_lower_threshold']
-        feedbackUpperThreshold = self._testDefinition['feedback_upper_threshold']
         lastAlertSent = self._testDefinition['last_alert_sent']
+        testName = self._testDefinition['name']
 
-        executedOn = datetime.utcnow()
+        if any(metricResult.alertData for metricResult in metricResults):
+            lastAlertSent = self._calculateLastAlertSent(lastAlertSent, tableType=CitoTableType.TestSuitesCustom)
+
+        if not isMultiMetric:
+            metricResult = metricResults[0]
+            return CustomTestExecutionResult(testSuiteId, CustomTest.CustomTest.value, self._executionId, self._organizationId, testName, targetResourceIds, metricResult.isWarmup, metricResult.testData, metricResult.alertData, lastAlertSent)
+
+        # top level fields mirror the most important anomaly (or the first evaluated metric) for consumers of single metric results
+        anomalousResults = [
+            metricResult for metricResult in metricResults if metricResult.testData and metricResult.testData.anomaly]
+        evaluatedResults = [
+            metricResult for metricResult in metricResults if not metricResult.isWarmup]
+        primaryResult = max(anomalousResults, key=lambda metricResult: metricResult.testData.anomaly.importance) if len(
+            anomalousResults) else (evaluatedResults[0] if len(evaluatedResults) else None)
+
+        return CustomTestExecutionResult(testSuiteId, CustomTest.CustomTest.value, self._executionId, self._organizationId, testName, targetResourceIds, not len(evaluatedResults), primaryResult.testData if primaryResult else None, primaryResult.alertData if primaryResult else None, lastAlertSent, metricResults)
+
+    def _loadsModelStates(self) -> bool:
+        return (self._forecastWarmStartEnabled or self._predictAheadEnabled or self._seriesRoutingEnabled) and not self._isQualTest()
+
+    def _getModelStates(self) -> "dict[Union[str, None], dict[str, Any]]":
+        return getSuiteStatesData(
+            self._testSuiteId, self._MODEL_STATE_FIELDS, self._dbConnection, self._organizationId)
+
+    def _getForecastParams(self, metric: Union[str, None]) -> "Union[dict[str, Any], None]":
+        if not self._forecastWarmStartEnabled:
+            return None
+        return self._modelStates.get(metric, {}).get('forecast_params')
+
+    def _getPrecomputedForecast(self, engineName: str, historicalData: "list[tuple[str, float]]", executedOn: datetime, metric: Union[str, None]) -> Union[ForecastDto, None]:
+        if not self._predictAheadEnabled:
+            return None
+
+        forecast = toPrecomputedForecast(self._modelStates.get(
+            metric, {}).get('forecast_prediction'), engineName, historicalData, executedOn)
+        if forecast:
+            logger.info(
+                f'Using forecast precomputed by the previous execution {self._requestLoggingInfo}')
+        return forecast
+
+    def _predictsAhead(self) -> bool:
+        # scheduled executions pay for the next execution's fit, so user triggered ones in between can skip theirs
+        # the time buckets of a span window move with the clock, the next window cannot be derived from this one
+        # a lazy evaluation fits the forecast only for the few points the z-score analysis flags, a prediction would mostly go unused
+        return self._predictAheadEnabled and self._isSystemInternal and self._historyWindow.start is None and self._forecastMode != 'lazy' and self._budget.allowsForecast()
+
+    def _predictAhead(self, pending: PendingPrediction) -> Union[IForecastEngine, None]:
+        window = toNextWindow(pending.historicalData, (self._toProphetDtFormat(pending.executedOn), pending.value),
+                              pending.isAnomaly, self._historyWindow.points)
+        # e.g. an anomaly leaves the window as it was, so the stored prediction still holds
+        if toPrecomputedForecast(self._modelStates.get(pending.metric, {}).get('forecast_prediction'), pending.engineName, window, pending.executedOn):
+            return None
+
+        # the fit of this execution is the closest start for the fit of the next window
+        warmStartParams = pending.fittedParams if self._forecastWarmStartEnabled and pending.fittedParams else self._getForecastParams(pending.metric)
+        predictionEngine = buildForecastEngine(pending.engineName, warmStartParams)
+
+        try:
+            prediction = predict(predictionEngine, pending.engineName, window)
+        except Exception as e:
+            # the result of this execution does not depend on the prediction
+            logger.warning(
+                f'Precomputing the next forecast failed {self._requestLoggingInfo}: {e}')
+            return None
+        if not prediction:
+            return None
+
+        self._writeBuffer.upsert({'_id': toSuiteStateId(self._testSuiteId, pending.metric)}, {'$set': {'test_suite_id': self._testSuiteId, 'metric': pending.metric, 'forecast_prediction': prediction}},
+                                 CitoTableType.TestSuiteStates, self._organizationId)
+        return predictionEngine
+
+    def _runPredictions(self):
+        """Fits the pending predictions and stages their writes. Runs once the results are persisted, so the result never waits for them."""
+        pendingPredictions, self._pendingPredictions = self._pendingPredictions, []
+        for pending in pendingPredictions:
+            if not self._budget.allowsForecast():
+                logger.warning(
+                    f'Remaining execution time too low to precompute the next forecast {self._requestLoggingInfo}')
+                return
+
+            predictionEngine = self._predictAhead(pending)
+            # the parameters of the prediction's fit belong to the window the next execution reads
+            if isinstance(predictionEngine, ProphetForecastEngine):
+                self._stageForecastParams(predictionEngine.fittedParams, pending.metric)
+
+    def _storePredictions(self):
+        try:
+            self._runPredictions()
+            self._writeBuffer.flush(self._dbConnection)
+        except Exception as e:
+            # the results are stored already, the next execution fits its forecast itself
+            logger.warning(
+                f'Storing the precomputed forecast failed {self._requestLoggingInfo}: {e}')
+
+    def _stageForecastParams(self, fittedParams: "Union[dict[str, Any], None]", metric: Union[str, None]):
+        if not self._forecastWarmStartEnabled or not fittedParams:
+            return
+
+        self._writeBuffer.upsert({'_id': toSuiteStateId(self._testSuiteId, metric)}, {'$set': {'test_suite_id': self._testSuiteId, 'metric': metric, 'forecast_params': fittedParams}},
+                                 CitoTableType.TestSuiteStates, self._organizationId)
+
+    def _routeModel(self, historicalData: "list[tuple[str, float]]", executedOn: datetime, metric: Union[str, None]) -> ModelRoute:
+        suiteForecastEngine = self._testDefinition.get('forecast_engine')
+        if not self._seriesRoutingEnabled:
+            return ModelRoute(None, suiteForecastEngine or self._forecastEngine)
+
+        seriesClass = fromSeriesClassDocument(self._modelStates.get(metric, {}).get(
+            'series_class'), executedOn, self._seriesClassTtlHours)
+        if seriesClass is None:
+            seriesClass = classifySeries(historicalData)
+            self._writeBuffer.upsert({'_id': toSuiteStateId(self._testSuiteId, metric)}, {'$set': {'test_suite_id': self._testSuiteId, 'metric': metric, 'series_class': toSeriesClassDocument(seriesClass, executedOn)}},
+                                     CitoTableType.TestSuiteStates, self._organizationId)
+
+        route = routeModel(seriesClass, self._forecastEngine, suiteForecastEngine)
+        # the caller asked for forecast bounds
+        if route.forecastEngine is None and self._forecastBounds:
+            return ModelRoute(seriesClass, suiteForecastEngine or self._forecastEngine)
+        return route
+
+    def _startModelRun(self, newData: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", metric: Union[str, None] = None) -> "tuple[ModelTask, ModelRoute]":
+        executedOn = self._fromIsoFormatToDateTime(newData[0])
+        route = self._routeModel(historicalData, executedOn, metric)
+        self._modelRoutes[metric] = route
+
+        forecastSkipReason = None
+        warmStartParams = None
+        precomputedForecast = None
+        if route.forecastEngine is None:
+            # never fitted, the model skips the forecast analysis
+            engineName = self._forecastEngine
+            forecastSkipReason = ForecastSkipReason.ROUTED
+        else:
+            engineName = route.forecastEngine
+            warmStartParams = self._getForecastParams(metric)
+            precomputedForecast = self._getPrecomputedForecast(
+                engineName, historicalData, executedOn, metric)
+
+        # a precomputed forecast costs nothing, so it is used whatever time is left
+        if not forecastSkipReason and precomputedForecast is None and not self._budget.allowsForecast():
+            logger.warning(
+                f'Remaining execution time too low for forecast analysis. Falling back to z-score analysis {self._requestLoggingInfo}')
+            forecastSkipReason = ForecastSkipReason.DEADLINE
+
+        lazy = self._forecastMode == 'lazy' and not self._forecastBounds
+
+        return ModelTask.build(newData, historicalData, testType, forcedLowerThreshold, forcedUpperThreshold, engineName, warmStartParams,
+                               precomputedForecast, forecastSkipReason, lazy, self._getWindowStatistics(historicalData, metric)), route
+
+    def _finishModelRun(self, newData: "tuple[str, float]", historicalData: "list[tuple[str, float]]", task: ModelTask, route: ModelRoute, modelRun: "tuple[QuantTestResultDto, Union[dict[str, Any], None]]", metric: Union[str, None] = None) -> QuantTestResultDto:
+        testResult, fittedParams = modelRun
+
+        if route.forecastEngine and self._predictsAhead():
+            self._pendingPredictions.append(PendingPrediction(self._fromIsoFormatToDateTime(newData[0]), newData[1], historicalData, bool(
+                testResult.anomaly), task.forecastEngineName, fittedParams, metric))
+        self._stageForecastParams(fittedParams, metric)
+
+        return testResult
+
+    def _runModel(self, newData: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", metric: Union[str, None] = None) -> QuantTestResultDto:
+        task, route = self._startModelRun(newData, historicalData, testType, forcedLowerThreshold, forcedUpperThreshold, metric)
+        return self._finishModelRun(newData, historicalData, task, route, self._modelRunner.run(task), metric)
+
+    def _startTest(self, newDataPoint, historicalData: "list[tuple[str,float]]", executedOn: datetime) -> Union[tuple, None]:
+        """Arguments of the test's model run, None for a warmup."""
+        testType = self._testDefinition['test_type']
         executedOnISOFormat = executedOn.isoformat()
 
         self._insertExecutionEntry(
             executedOnISOFormat, CitoTableType.TestExecutions)
 
-        historicalDataLength = len(historicalData)
-        print('Historical data length: ' + str(historicalDataLength))
-        belowDayBoundary = True if historicalDataLength == 0 else (
-            executedOn - self._fromIsoFormatToDateTime(historicalData[0][0])).days <= self._MIN_HISTORICAL_DATA_DAY_NUMBER_CONDITION
-        if (belowDayBoundary or historicalDataLength <= self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION):
+        if self._isWarmup(executedOn, historicalData):
             self._insertHistoryEntry(
                 newDataPoint, False, None)
 
-            return QuantTestExecutionResult(testSuiteId, testType, self._executionId, self._organizationId, targetResourceId, True, None, None, lastAlertSent)
+            return None
 
-        lowerThreshold = None if feedbackLowerThreshold is None else ForcedThreshold(
-            feedbackLowerThreshold, ForcedThresholdMode.ABSOLUTE, ForcedThresholdType.FEEDBACK)
-        upperThreshold = None if feedbackUpperThreshold is None else ForcedThreshold(
-            feedbackUpperThreshold, ForcedThresholdMode.ABSOLUTE, ForcedThresholdType.FEEDBACK)
+        lowerThreshold, upperThreshold = self._buildForcedThresholds()
 
-        forcedLowerThresholdMode = ForcedThresholdMode.ABSOLUTE
-        if customLowerThresholdMode == ForcedThresholdMode.RELATIVE.value:
-            forcedLowerThresholdMode = ForcedThresholdMode.RELATIVE
-        elif customLowerThresholdMode != ForcedThresholdMode.ABSOLUTE.value:
-            raise Exception('Invalid custom lower threshold mode')
+        relevantHistoricalData = toModelWindow(self._historyWindow, historicalData)
 
-        lowerThreshold = lowerThreshold if customLowerThreshold is None else ForcedThreshold(
-            customLowerThreshold, forcedLowerThresholdMode, ForcedThresholdType.CUSTOM)
+        return ((executedOnISOFormat, newDataPoint), relevantHistoricalData, testType, lowerThreshold, upperThreshold)
 
-        forcedUpperThresholdMode = ForcedThresholdMode.ABSOLUTE
-        if customUpperThresholdMode == ForcedThresholdMode.RELATIVE.value:
-            forcedUpperThresholdMode = ForcedThresholdMode.RELATIVE
-        elif customUpperThresholdMode != ForcedThresholdMode.ABSOLUTE.value:
-            raise Exception('Invalid custom upper threshold mode')
+    def _toWarmupTestResult(self) -> QuantTestExecutionResult:
+        return QuantTestExecutionResult(self._testDefinition['id'], self._testDefinition['test_type'], self._executionId, self._organizationId,
+                                        self._testDefinition['target_resource_id'], True, None, None, self._testDefinition['last_alert_sent'])
 
-        upperThreshold = upperThreshold if customUpperThreshold is None else ForcedThreshold(
-            customUpperThreshold, forcedUpperThresholdMode, ForcedThresholdType.CUSTOM)
+    def _runTest(self, newDataPoint, historicalData: "list[tuple[str,float]]") -> QuantTestExecutionResult:
+        executedOn = datetime.utcnow()
+
+        modelArgs = self._startTest(newDataPoint, historicalData, executedOn)
+        if modelArgs is None:
+            return self._toWarmupTestResult()
 
-        relevantHistoricalData = historicalData if len(
-            historicalData) <= 25 else historicalData[-25:]
+        return self._finishTest(newDataPoint, executedOn, self._runModel(*modelArgs))
+
+    def _finishTest(self, newDataPoint, executedOn: datetime, testResult: QuantTestResultDto) -> QuantTestExecutionResult:
+        databaseName = self._testDefinition['database_name']
+        schemaName = self._testDefinition['schema_name']
+        materializationName = self._testDefinition['materialization_name']
+        materializationType = self._testDefinition['materialization_type']
+        columnName = self._testDefinition['column_name']
+        testSuiteId = self._testDefinition['id']
+        targetResourceId = self._testDefinition['target_resource_id']
+        testType = self._testDefinition['test_type']
+        lastAlertSent = self._testDefinition['last_alert_sent']
 
-        testResult = self._runModel(
-            (executedOnISOFormat, newDataPoint), relevantHistoricalData, testType, lowerThreshold, upperThreshold)
+        executedOnISOFormat = executedOn.isoformat()
 
         self._insertResultEntry(testResult)
 
@@ -478,10 +960,16 @@ class ExecuteTest(IUseCase):
 
         return QuantTestExecutionResult(testSuiteId, testType, self._executionId, self._organizationId, targetResourceId, False, testData, alertData, lastAlertSent)
 
-    def _runSchemaChangeModel(self, oldSchema: "dict[str, ColumnDefinition]", newSchema: "dict[str, ColumnDefinition]") -> QualResultDto:
-        return SchemaChangeModel(newSchema, oldSchema).run()
+    def _runSchemaChangeModel(self, oldSnapshot: Union[SchemaSnapshot, None], newSnapshot: SchemaSnapshot, newSchema: "dict[str, ColumnDefinition]") -> QualResultDto:
+        # equal hashes mean equal schemas, the per column diff is only needed when they differ
+        if not oldSnapshot or oldSnapshot.schemaHash == newSnapshot.schemaHash:
+            return QualResultDto(True, None, newSchema, [])
+        if not oldSnapshot.value:
+            raise Exception('Schema snapshot matching hash not found')
+
+        return SchemaChangeModel(newSchema, oldSnapshot.toSchema()).run()
 
-    def _runSchemaChangeTest(self, oldSchema: "dict[str, ColumnDefinition]", newSchema: "dict[str, ColumnDefinition]") -> QualTestExecutionResult:
+    def _runSchemaChangeTest(self, oldSnapshot: Union[SchemaSnapshot, None], newSnapshot: SchemaSnapshot, newSchema: "dict[str, ColumnDefinition]") -> QualTestExecutionResult:
         databaseName = self._testDefinition['database_name']
         schemaName = self._testDefinition['schema_name']
         materializationName = self._testDefinition['materialization_name']
@@ -495,12 +983,13 @@ class ExecuteTest(IUseCase):
         executedOn = datetime.utcnow().isoformat()
 
         testResult = self._runSchemaChangeModel(
-            oldSchema, newSchema)
+            oldSnapshot, newSnapshot, newSchema)
 
         self._insertExecutionEntry(
             executedOn, CitoTableType.TestExecutionsQual)
 
-        self._insertQualTestResultEntry(testResult)
+        self._insertQualTestResultEntry(
+            testResult, oldSnapshot.schemaHash if oldSnapshot else None)
 
         alertData = None
         alertId = None
@@ -516,94 +1005,60 @@ class ExecuteTest(IUseCase):
 
             lastAlertSent = self._calculateLastAlertSent(lastAlertSent, tableType=CitoTableType.TestSuitesQual)
 
+        if not oldSnapshot or not oldSnapshot.isStored or oldSnapshot.schemaHash != newSnapshot.schemaHash:
+            self._insertSchemaSnapshot(newSnapshot)
+
         self._insertQualHistoryEntry(
-            newSchema, testResult.isIdentical, alertId)
+            newSnapshot.schemaHash, testResult.isIdentical, alertId)
 
         testData = QualTestData(
             executedOn, testResult.deviations, testResult.isIdentical)
         return QualTestExecutionResult(testSuiteId, testType, self._executionId, self._organizationId, targetResourceId, testData, alertData, lastAlertSent)
 
-    def _runMaterializationRowCountTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        materializationType = self._testDefinition['materialization_type']
-
-        newDataQuery = getRowCountQuery(
-            databaseName, schemaName, materializationName, MaterializationType[materializationType])
-
-        newData = self._getNewData(newDataQuery)
-
-        if (len(newData) != 1):
-            raise Exception(
-                f'Mat row count - More than one or no matching new data entries found')
-
-        newDataPoint = newData[0]['ROW_COUNT']
-
-        historicalData = self._getHistoricalData()
-
-        testResult = self._runTest(
-            newDataPoint, historicalData)
-
-        return testResult
-
-    def _runMaterializationColumnCountTest(self) -> QuantTestExecutionResult:
+    def _getQuantTestSpec(self) -> "tuple[str, str, str]":
         databaseName = self._testDefinition['database_name']
         schemaName = self._testDefinition['schema_name']
         materializationName = self._testDefinition['materialization_name']
+        testType = self._testDefinition['test_type']
 
-        newDataQuery = getColumnCountQuery(
-            databaseName, schemaName, materializationName)
-
-        newData = self._getNewData(newDataQuery)
-
-        if (len(newData) != 1):
-            raise Exception(
-                'Mat column count - More than one or no matching new data entries found')
-
-        newDataPoint = newData[0]['COLUMN_COUNT']
-
-        historicalData = self._getHistoricalData()
-
-        testResult = self._runTest(
-            newDataPoint, historicalData)
-
-        return testResult
+        if testType == QuantMatTest.MaterializationRowCount.value:
+            return (getRowCountQuery(databaseName, schemaName, materializationName, MaterializationType[self._testDefinition['materialization_type']]), 'ROW_COUNT', 'Mat row count')
+        elif testType == QuantMatTest.MaterializationColumnCount.value:
+            return (getColumnCountQuery(databaseName, schemaName, materializationName), 'COLUMN_COUNT', 'Mat column count')
+        elif testType == QuantMatTest.MaterializationFreshness.value:
+            return (getFreshnessQuery(databaseName, schemaName, materializationName, self._testDefinition['materialization_type']), 'TIME_DIFF', 'Mat freshness')
 
-    def _runMaterializationFreshnessTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        materializationType = self._testDefinition['materialization_type']
+        columnName = self._testDefinition['column_name']
 
-        newDataQuery = getFreshnessQuery(
-            databaseName, schemaName, materializationName, materializationType)
+        if testType == QuantColumnTest.ColumnCardinality.value:
+            return (getCardinalityQuery(databaseName, schemaName, materializationName, columnName), 'DISTINCT_VALUE_COUNT', 'Col cardinality')
+        elif testType == QuantColumnTest.ColumnDistribution.value:
+            return (getDistributionQuery(databaseName, schemaName, materializationName, columnName), 'MEDIAN', 'Col Distribution')
+        elif testType == QuantColumnTest.ColumnFreshness.value:
+            return (getColumnFreshnessQuery(databaseName, schemaName, materializationName, columnName), 'TIME_DIFF', 'Col Freshness')
+        elif testType == QuantColumnTest.ColumnNullness.value:
+            return (getNullnessQuery(databaseName, schemaName, materializationName, columnName), 'NULLNESS_RATE', 'Col Nullness')
+        elif testType == QuantColumnTest.ColumnUniqueness.value:
+            return (getUniquenessQuery(databaseName, schemaName, materializationName, columnName), 'UNIQUENESS_RATE', 'Col Uniqueness')
+        else:
+            raise Exception('Test type mismatch')
 
-        newData = self._getNewData(newDataQuery)
+    def _toQuantDataPoint(self, newData: "list[dict[str, Any]]") -> Any:
+        _, valueKey, testLabel = self._getQuantTestSpec()
 
         if (len(newData) != 1):
             raise Exception(
-                'Mat freshness - More than one or no matching new data entries found')
-
-        newDataPoint = newData[0]['TIME_DIFF']
+                f'{testLabel} - More than one or no matching new data entries found')
 
-        historicalData = self._getHistoricalData()
+        return newData[0][valueKey]
 
+    def _runQuantTest(self, newData: "list[dict[str, Any]]", historicalData: "list[tuple[str, float]]") -> QuantTestExecutionResult:
         testResult = self._runTest(
-            newDataPoint, historicalData)
+            self._toQuantDataPoint(newData), historicalData)
 
         return testResult
 
-    def _runMaterializationSchemaChangeTest(self) -> QualTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-
-        newDataQuery = getSchemaChangeQuery(
-            databaseName, schemaName, materializationName)
-
-        newData = self._getNewData(newDataQuery)
-
+    def _runMaterializationSchemaChangeTest(self, newData: "list[dict[str, Any]]", oldSnapshot: Union[SchemaSnapshot, None]) -> QualTestExecutionResult:
         newSchema: dict[str, ColumnDefinition] = {}
         for el in newData:
             columnDefinition = el['COLUMN_DEFINITION']
@@ -611,194 +1066,160 @@ class ExecuteTest(IUseCase):
             newSchema[str(ordinalPosition)] = ColumnDefinition(columnDefinition['COLUMN_NAME'],  columnDefinition['DATA_TYPE'],
                                                                columnDefinition['IS_IDENTITY'],  columnDefinition['IS_NULLABLE'],  columnDefinition['ORDINAL_POSITION'])
 
-        oldSchema = self._getLastMatSchema()
-
-        if not oldSchema:
-            oldSchema = newSchema
-
-        testResult = self._runSchemaChangeTest(oldSchema, newSchema)
-
-        return testResult
-
-    def _runColumnCardinalityTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        columnName = self._testDefinition['column_name']
-
-        newDataQuery = getCardinalityQuery(
-            databaseName, schemaName, materializationName, columnName)
-
-        newData = self._getNewData(newDataQuery)
-
-        if (len(newData) != 1):
-            raise Exception(
-                'Col cardinality - More than one or no matching new data entries found')
-
-        newDataPoint = newData[0]['DISTINCT_VALUE_COUNT']
-
-        historicalData = self._getHistoricalData()
+        schemaJson = toSchemaJson(newSchema)
+        newSnapshot = SchemaSnapshot(hashSchemaJson(schemaJson), schemaJson)
 
-        testResult = self._runTest(
-            newDataPoint, historicalData)
+        testResult = self._runSchemaChangeTest(oldSnapshot, newSnapshot, newSchema)
 
         return testResult
 
-    def _runColumnDistributionTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        columnName = self._testDefinition['column_name']
-
-        newDataQuery = getDistributionQuery(
-            databaseName, schemaName, materializationName, columnName)
-
-        newData = self._getNewData(newDataQuery)
-
-        if (len(newData) != 1):
-            raise Exception(
-                'Col Distribution - More than one or no matching new data entries found')
-
-        newDataPoint = newData[0]['MEDIAN']
-
-        historicalData = self._getHistoricalData()
+    def _getTestDefinition(self):
+        getTestEntryResult = self._getTestEntry()
 
-        testResult = self._runTest(
-            newDataPoint, historicalData)
+        organizationResult = [getTestEntryResult]
+        if not len(organizationResult) == 1:
+            raise Exception('Test Definition - More than one or no test found')
 
-        return testResult
+        return organizationResult[0]
 
-    def _runColumnFreshnessTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        columnName = self._testDefinition['column_name']
+    def _isCustomTest(self) -> bool:
+        return 'test_type' not in self._testDefinition
 
-        newDataQuery = getColumnFreshnessQuery(
-            databaseName, schemaName, materializationName, columnName)
+    def _isQualTest(self) -> bool:
+        return self._testType in qualMatTest
 
-        newData = self._getNewData(newDataQuery)
+    def _getNewDataQuery(self) -> str:
+        if self._isCustomTest():
+            return self._testDefinition['sql_logic']
+        if self._isQualTest():
+            return getSchemaChangeQuery(self._testDefinition['database_name'], self._testDefinition['schema_name'], self._testDefinition['materialization_name'])
 
-        if (len(newData) != 1):
-            raise Exception(
-                'Col Freshness - More than one or no matching new data entries found')
+        newDataQuery, _, _ = self._getQuantTestSpec()
+        return newDataQuery
 
-        newDataPoint = newData[0]['TIME_DIFF']
+    def _getHistory(self) -> Union["list[dict[str, Any]]", SchemaSnapshot, None]:
+        if self._isQualTest():
+            return self._getLastMatSchema()
+        return self._getHistoryEntries()
 
-        historicalData = self._getHistoricalData()
+    def _isQuantTest(self) -> bool:
+        return self._testDefinition['test_type'] in quantMatTest or self._testDefinition['test_type'] in quantColumnTest
 
-        testResult = self._runTest(
-            newDataPoint, historicalData)
+    def _evaluate(self, newData: "list[dict[str, Any]]", history: Any) -> Union[QuantTestExecutionResult, QualTestExecutionResult, CustomTestExecutionResult]:
+        testTypeKey = 'test_type'
 
-        return testResult
+        if self._isCustomTest():
+            return self._runCustomTest(newData, history)
+        elif self._testDefinition[testTypeKey] == QualMatTest.MaterializationSchemaChange.value:
+            return self._runMaterializationSchemaChangeTest(newData, history)
+        elif self._isQuantTest():
+            return self._runQuantTest(newData, self._toHistoricalData(history))
+        else:
+            raise Exception('Test type mismatch')
 
-    def _runColumnNullnessTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        columnName = self._testDefinition['column_name']
+    def _timed(self, stage: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._stageTimings[stage] = round(
+                (time.perf_counter() - start) * 1000, 1)
 
-        newDataQuery = getNullnessQuery(
-            databaseName, schemaName, materializationName, columnName)
+    def _logStageTimings(self):
+        logger.info(
+            f'Stage timings in ms {self._requestLoggingInfo}: {self._stageTimings}')
 
-        newData = self._getNewData(newDataQuery)
+    def _loadInputs(self) -> "tuple[list[dict[str, Any]], Any]":
+        modelStatesFuture = _ioExecutor.submit(
+            self._getModelStates) if self._loadsModelStates() else None
 
-        if (len(newData) != 1):
-            raise Exception(
-                'Col Nullness - More than one or no matching new data entries found')
+        # the history window is part of the definition, the history is read while the new data is fetched
+        self._testDefinition = self._timed(
+            'definition', self._getTestDefinition)
+        self._historyWindow = self._toHistoryWindow()
 
-        newDataPoint = newData[0]['NULLNESS_RATE']
+        historyFuture = _ioExecutor.submit(
+            self._timed, 'history', self._getHistory)
 
-        historicalData = self._getHistoricalData()
+        newData = self._timed(
+            'newData', self._getNewData, self._getNewDataQuery())
 
-        testResult = self._runTest(
-            newDataPoint, historicalData)
+        if modelStatesFuture:
+            self._modelStates = modelStatesFuture.result()
 
-        return testResult
+        if not self._isCustomTest():
+            return newData, historyFuture.result()
 
-    def _runColumnUniquenessTest(self) -> QuantTestExecutionResult:
-        databaseName = self._testDefinition['database_name']
-        schemaName = self._testDefinition['schema_name']
-        materializationName = self._testDefinition['materialization_name']
-        columnName = self._testDefinition['column_name']
+        # each metric of a multi metric custom test has its own history window
+        metricFutures = {metric: _ioExecutor.submit(self._getHistoryEntries, metric)
+                         for metric in self._getTaggedHistoryMetrics(newData)}
 
-        newDataQuery = getUniquenessQuery(
-            databaseName, schemaName, materializationName, columnName)
+        historyByMetric = {None: historyFuture.result()}
+        historyByMetric.update(
+            {metric: future.result() for metric, future in metricFutures.items()})
 
-        newData = self._getNewData(newDataQuery)
+        return newData, historyByMetric
 
-        if (len(newData) != 1):
+    def _initExecution(self, request: ExecuteTestRequestDto, auth: ExecuteTestAuthDto):
+        if not request.targetOrgId and not auth.callerOrgId:
+            raise Exception('No organization Id instance provided')
+        if request.targetOrgId and auth.callerOrgId:
             raise Exception(
-                'Col Uniqueness - More than one or no matching new data entries found')
+                'callerOrgId and targetOrgId provided. Not allowed')
 
-        newDataPoint = newData[0]['UNIQUENESS_RATE']
+        if auth.isSystemInternal:
+            if not request.targetOrgId:
+                raise Exception('Target organization id missing')
+            orgId = request.targetOrgId
+        else:
+            if not auth.callerOrgId:
+                raise Exception('Caller organization id missing')
+            orgId = auth.callerOrgId
+
+        self._testSuiteId = request.testSuiteId
+        self._testType = request.testType
+        self._targetOrgId = request.targetOrgId
+        self._organizationId = orgId
+        self._requestLoggingInfo = f'(organizationId: {self._organizationId}, testSuiteId: {self._testSuiteId}, testType: {self._testType})'
+        self._executionId = str(uuid.uuid4())
+        self._jwt = auth.jwt
+        self._forecastBounds = request.forecastBounds
+        self._isSystemInternal = auth.isSystemInternal
+        self._writeBuffer = WriteBuffer()
+        self._stagedResults = {}
+        self._alertClaimTableType = None
+        self._modelStates = {}
+        self._modelRoutes = {}
+        self._pendingPredictions = []
+        self._windowStatistics = {}
+        self._historyCounts = {}
+        self._loadedSuiteStates = set()
+        self._stageTimings = {}
+        self._queryMetrics = []
 
-        historicalData = self._getHistoricalData()
+    def execute(self, request: ExecuteTestRequestDto, auth: ExecuteTestAuthDto) -> ExecuteTestResponseDto:
+        try:
+            self._initExecution(request, auth)
 
-        testResult = self._runTest(
-            newDataPoint, historicalData)
+            ensureOrgIndexes(self._dbConnection, self._organizationId)
 
-        return testResult
+            newData, history = self._timed('inputs', self._loadInputs)
 
-    def _getTestDefinition(self):
-        getTestEntryResult = self._getTestEntry()
+            testResult = self._timed(
+                'evaluate', self._evaluate, newData, history)
 
-        organizationResult = [getTestEntryResult]
-        if not len(organizationResult) == 1:
-            raise Exception('Test Definition - More than one or no test found')
+            self._stageQueryMetrics()
+            self._timed('persist', self._persist)
 
-        return organizationResult[0]
+            # claimed once the results are stored, a failed write does not use up the alert of the next 24 hours. Executions
+            # of a batch are claimed by the batch owner with claimBatchAlert after its flush, and store their predictions with
+            # storeBatchPredictions
+            if self._batchWriteBuffer is None:
+                self._timed('alert', self._claimAlert, testResult)
+                if len(self._pendingPredictions):
+                    self._timed('predict', self._storePredictions)
 
-    def execute(self, request: ExecuteTestRequestDto, auth: ExecuteTestAuthDto) -> ExecuteTestResponseDto:
-        try:
-            if not request.targetOrgId and not auth.callerOrgId:
-                raise Exception('No organization Id instance provided')
-            if request.targetOrgId and auth.callerOrgId:
-                raise Exception(
-                    'callerOrgId and targetOrgId provided. Not allowed')
-
-            if auth.isSystemInternal:
-                if not request.targetOrgId:
-                    raise Exception('Target organization id missing')
-                orgId = request.targetOrgId
-            else:
-                if not auth.callerOrgId:
-                    raise Exception('Caller organization id missing')
-                orgId = auth.callerOrgId
-
-            self._testSuiteId = request.testSuiteId
-            self._testType = request.testType
-            self._targetOrgId = request.targetOrgId
-            self._organizationId = orgId
-            self._requestLoggingInfo = f'(organizationId: {self._organizationId}, testSuiteId: {self._testSuiteId}, testType: {self._testType})'
-            self._executionId = str(uuid.uuid4())
-            self._jwt = auth.jwt
-            self._testDefinition = self._getTestDefinition()
-
-            testTypeKey = 'test_type'
-
-            if testTypeKey not in self._testDefinition:
-                testResult = self._runCustomTest()
-            elif self._testDefinition[testTypeKey] == QuantMatTest.MaterializationRowCount.value:
-                testResult = self._runMaterializationRowCountTest()
-            elif self._testDefinition[testTypeKey] == QuantMatTest.MaterializationColumnCount.value:
-                testResult = self._runMaterializationColumnCountTest()
-            elif self._testDefinition[testTypeKey] == QuantMatTest.MaterializationFreshness.value:
-                testResult = self._runMaterializationFreshnessTest()
-            elif self._testDefinition[testTypeKey] == QuantColumnTest.ColumnCardinality.value:
-                testResult = self._runColumnCardinalityTest()
-            elif self._testDefinition[testTypeKey] == QuantColumnTest.ColumnDistribution.value:
-                testResult = self._runColumnDistributionTest()
-            elif self._testDefinition[testTypeKey] == QuantColumnTest.ColumnFreshness.value:
-                testResult = self._runColumnFreshnessTest()
-            elif self._testDefinition[testTypeKey] == QuantColumnTest.ColumnNullness.value:
-                testResult = self._runColumnNullnessTest()
-            elif self._testDefinition[testTypeKey] == QuantColumnTest.ColumnUniqueness.value:
-                testResult = self._runColumnUniquenessTest()
-            elif self._testDefinition[testTypeKey] == QualMatTest.MaterializationSchemaChange.value:
-                testResult = self._runMaterializationSchemaChangeTest()
-            else:
-                raise Exception('Test type mismatch')
+            self._logStageTimings()
 
             return Result.ok(testResult)
 
@@ -0,0 +1,373 @@
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+import time
+from typing import Any, Union
+from cito_data_query import CitoTableType, qualMatTest, getTestDataAsync, getTestDataBulkAsync, getHistoryDataAsync, getHistoryDataBulkAsync, supportsHistoryBulkAsync, getRunHistoryDataAsync, getBucketHistoryDataAsync, getHistorySpanDataAsync, getRunHistorySpanDataAsync, countHistoryDataAsync, getLastMatSchemaDataAsync, getSuiteStatesDataAsync, claimAlertSlotAsync
+from motor import motor_asyncio
+from mongo_db import get_async_mongo_connection
+from index_manager import ensureOrgIndexesAsync
+from qual_model import SchemaSnapshot
+from query_snowflake import QuerySnowflake, QuerySnowflakeAuthDto, QuerySnowflakeRequestDto
+from execution_budget import ExecutionBudget
+from write_buffer import WriteBuffer
+from i_model_runner import IModelRunner
+from model_runner import InProcessModelRunner, buildModelRunner
+from config import getBatchFlushSize, getModelWorkers
+from suite_state import loadSuiteStateAsync
+from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto, ExecuteTestResponseDto
+from i_forced_threshold import ForcedThreshold
+from quant_model import ResultDto as QuantTestResultDto
+from test_execution_result import CustomTestExecutionResult, CustomTestMetricResult, QualTestExecutionResult, QuantTestExecutionResult
+from test_type import CustomTest, QuantColumnTest, QuantMatTest
+from history_window import toHistoryWindow
+import logging
+
+from result import Result
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@dataclass
+class PrefetchedInputs:
+    definition: "dict[str, Any]"
+    # the untagged window of the given number of latest points, None if the suite reads its history itself
+    historyEntries: "Union[list[dict[str, Any]], None]" = None
+    historyLimit: Union[int, None] = None
+
+
+class AsyncExecuteTest(ExecuteTest):
+    """asyncio variant of ExecuteTest. Reuses its evaluation logic and only swaps the I/O steps."""
+
+    _dbConnection: motor_asyncio.AsyncIOMotorDatabase
+    # inputs read in bulk by executeTestsAsync
+    _prefetchedInputs: Union[PrefetchedInputs, None]
+
+    def __init__(self, querySnowflake: QuerySnowflake, dbConnection: Union[motor_asyncio.AsyncIOMotorDatabase, None] = None, budget: Union[ExecutionBudget, None] = None, writeBuffer: Union[WriteBuffer, None] = None, modelRunner: Union[IModelRunner, None] = None) -> None:
+        self._querySnowflake = querySnowflake
+        self._budget = budget if budget else ExecutionBudget.unlimited()
+        self._batchWriteBuffer = writeBuffer
+        self._modelRunner = modelRunner if modelRunner else InProcessModelRunner()
+        self._pendingPredictions = []
+        self._prefetchedInputs = None
+        self._loadSettings()
+        self._dbConnection = dbConnection if dbConnection is not None else get_async_mongo_connection()
+
+    async def _persistAsync(self):
+        if not self._handOverToBatch():
+            await self._writeBuffer.flushAsync(self._dbConnection)
+
+    async def _claimAlertAsync(self, testResult: Any):
+        if self._alertClaimTableType is None:
+            return
+
+        won, previousLastAlertSent = await claimAlertSlotAsync(
+            self._testSuiteId, self._alertClaimTableType, self._dbConnection, self._organizationId, self._ALERT_THROTTLE_HOURS)
+        self._applyAlertClaim(testResult, won, previousLastAlertSent)
+
+    async def claimBatchAlertAsync(self, result: ExecuteTestResponseDto) -> ExecuteTestResponseDto:
+        """Claims the alert of an execution whose writes the batch flushed."""
+        if not result.success:
+            return result
+
+        try:
+            await self._claimAlertAsync(result.value)
+            return result
+        except Exception as e:
+            logger.exception(
+                f'error: {e}' if e.args[0] else f'error: unknown - {self._requestLoggingInfo}')
+            return Result.fail('')
+
+    async def storeBatchPredictionsAsync(self):
+        """Fits and stores the predictions of an execution whose writes the batch flushed."""
+        if len(self._pendingPredictions):
+            await self._storePredictionsAsync()
+
+    async def _storePredictionsAsync(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._runPredictions)
+            await self._writeBuffer.flushAsync(self._dbConnection)
+        except Exception as e:
+            logger.warning(
+                f'Storing the precomputed forecast failed {self._requestLoggingInfo}: {e}')
+
+    async def _getModelStatesAsync(self) -> "dict[Union[str, None], dict[str, Any]]":
+        return await getSuiteStatesDataAsync(
+            self._testSuiteId, self._MODEL_STATE_FIELDS, self._dbConnection, self._organizationId)
+
+    async def _getTestDefinitionAsync(self) -> Any:
+        if self._prefetchedInputs is not None:
+            return self._prefetchedInputs.definition
+        return await getTestDataAsync(self._testSuiteId, self._testType, self._dbConnection, self._organizationId)
+
+    async def _getHistoryEntriesAsync(self, metric: Union[str, None] = None) -> "list[dict[str, Any]]":
+        if self._countsHistory():
+            self._historyCounts[metric] = await countHistoryDataAsync(
+                self._testSuiteId, self._dbConnection, self._organizationId, metric, self._MIN_HISTORICAL_DATA_TEST_NUMBER_CONDITION + 1)
+
+        window = self._historyWindow
+
+        prefetchedInputs = self._prefetchedInputs
+        if metric is None and prefetchedInputs is not None and window.start is None and prefetchedInputs.historyLimit == window.points:
+            return prefetchedInputs.historyEntries
+
+        if window.start is not None:
+            readHistorySpan = getRunHistorySpanDataAsync if self._isConsolidatedLayout() else getHistorySpanDataAsync
+            return await readHistorySpan(
+                self._testSuiteId, self._dbConnection, self._organizationId, window.start, window.bucketKeyLength, window.points, metric)
+
+        if self._readsSuiteState(window):
+            return self._toStateHistoryEntries(await loadSuiteStateAsync(
+                self._dbConnection, self._organizationId, self._testSuiteId, metric, self._suiteStateWindowSize), metric)
+
+        if self._isBucketedLayout():
+            return await getBucketHistoryDataAsync(
+                self._testSuiteId, self._dbConnection, self._organizationId, self._historyBucketSize, window.points, metric)
+
+        readHistory = getRunHistoryDataAsync if self._isConsolidatedLayout() else getHistoryDataAsync
+        return await readHistory(
+            self._testSuiteId, self._dbConnection, self._organizationId, window.points, metric)
+
+    def _toBulkHistoryLimit(self, testType: Any, testDefinition: "dict[str, Any]") -> Union[int, None]:
+        # suites with a plain window of latest points can share a bulk read, all others read their window themselves
+        if testType in qualMatTest:
+            return None
+        try:
+            window = toHistoryWindow(testDefinition, self._HISTORY_WINDOW_SIZE, self._historyWindowMaxPoints, datetime.utcnow())
+        except Exception:
+            # reported by the suite's own execution
+            return None
+        if window.start is not None or self._readsSuiteState(window):
+            return None
+        return window.points
+
+    def _getBulkHistoryTableType(self) -> CitoTableType:
+        # the bucketed layout writes test_history as well
+        return CitoTableType.TestRuns if self._isConsolidatedLayout() else CitoTableType.TestHistory
+
+    async def _getLastMatSchemaAsync(self) -> Union[SchemaSnapshot, None]:
+
+        result = await getLastMatSchemaDataAsync(
+            self._testSuiteId, self._dbConnection, self._organizationId)
+
+        return self._toMatSchemaSnapshot(result)
+
+    async def _getNewDataAsync(self, query) -> "list[dict[str, Any]]":
+        start = time.perf_counter()
+        getNewDataResult = await self._querySnowflake.executeAsync(
+            QuerySnowflakeRequestDto(query, self._targetOrgId, self._budget.queryTimeout()), QuerySnowflakeAuthDto(self._jwt))
+        self._recordQueryMetrics(getNewDataResult, start)
+
+        return self._toNewData(getNewDataResult)
+
+    async def _getHistoryAsync(self) -> Union["list[dict[str, Any]]", SchemaSnapshot, None]:
+        if self._isQualTest():
+            return await self._getLastMatSchemaAsync()
+        return await self._getHistoryEntriesAsync()
+
+    async def _timedAsync(self, stage: str, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self._stageTimings[stage] = round(
+                (time.perf_counter() - start) * 1000, 1)
+
+    async def _loadInputsAsync(self) -> "tuple[list[dict[str, Any]], Any]":
+        modelStatesTask = asyncio.ensure_future(
+            self._getModelStatesAsync()) if self._loadsModelStates() else None
+        historyTask = None
+
+        try:
+            self._testDefinition = await self._timedAsync(
+                'definition', self._getTestDefinitionAsync())
+            self._historyWindow = self._toHistoryWindow()
+
+            historyTask = asyncio.ensure_future(
+                self._timedAsync('history', self._getHistoryAsync()))
+            newData = await self._timedAsync(
+                'newData', self._getNewDataAsync(self._getNewDataQuery()))
+            if modelStatesTask:
+                self._modelStates = await modelStatesTask
+        except BaseException:
+            if historyTask:
+                historyTask.cancel()
+            if modelStatesTask:
+                modelStatesTask.cancel()
+            raise
+
+        if not self._isCustomTest():
+            return newData, await historyTask
+
+        metrics = self._getTaggedHistoryMetrics(newData)
+        histories = await asyncio.gather(
+            historyTask, *[self._getHistoryEntriesAsync(metric) for metric in metrics])
+
+        return newData, dict(zip([None] + metrics, histories))
+
+    async def _runModelAsync(self, newData: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", metric: Union[str, None] = None) -> QuantTestResultDto:
+        task, route = self._startModelRun(newData, historicalData, testType, forcedLowerThreshold, forcedUpperThreshold, metric)
+        return self._finishModelRun(newData, historicalData, task, route, await self._modelRunner.runAsync(task), metric)
+
+    async def _runCustomTestMetricAsync(self, metric: str, isTagged: bool, newDataPoint: Any, historicalData: "list[tuple[str, float]]", executedOn: datetime) -> CustomTestMetricResult:
+        modelArgs = self._startCustomTestMetric(metric, isTagged, newDataPoint, historicalData, executedOn)
+        if modelArgs is None:
+            return CustomTestMetricResult(metric, True, None, None)
+
+        return self._finishCustomTestMetric(metric, isTagged, newDataPoint, executedOn, await self._runModelAsync(*modelArgs))
+
+    async def _runCustomTestAsync(self, newData: "list[dict[str, Any]]", historyByMetric: "dict[Union[str, None], list[dict[str, Any]]]") -> CustomTestExecutionResult:
+        metrics, isMultiMetric, executedOn = self._startCustomTest(newData)
+
+        # the metrics' models run concurrently
+        metricResults = await asyncio.gather(*[self._runCustomTestMetricAsync(metric, isMultiMetric, newDataPoint, self._toHistoricalData(
+            historyByMetric[metric if isMultiMetric else None]), executedOn) for metric, newDataPoint in metrics])
+
+        return self._finishCustomTest(list(metricResults), isMultiMetric)
+
+    async def _runQuantTestAsync(self, newData: "list[dict[str, Any]]", historicalData: "list[tuple[str, float]]") -> QuantTestExecutionResult:
+        newDataPoint = self._toQuantDataPoint(newData)
+        executedOn = datetime.utcnow()
+
+        modelArgs = self._startTest(newDataPoint, historicalData, executedOn)
+        if modelArgs is None:
+            return self._toWarmupTestResult()
+
+        return self._finishTest(newDataPoint, executedOn, await self._runModelAsync(*modelArgs))
+
+    async def _evaluateAsync(self, newData: "list[dict[str, Any]]", history: Any) -> Union[QuantTestExecutionResult, QualTestExecutionResult, CustomTestExecutionResult]:
+        # only the model runs are CPU bound, the model runner keeps them off the event loop
+        if self._isCustomTest():
+            return await self._runCustomTestAsync(newData, history)
+        elif self._isQuantTest():
+            return await self._runQuantTestAsync(newData, self._toHistoricalData(history))
+
+        return await asyncio.get_running_loop().run_in_executor(None, self._evaluate, newData, history)
+
+    async def execute(self, request: ExecuteTestRequestDto, auth: ExecuteTestAuthDto) -> ExecuteTestResponseDto:
+        try:
+            self._initExecution(request, auth)
+
+            await ensureOrgIndexesAsync(self._dbConnection, self._organizationId)
+
+            newData, history = await self._timedAsync('inputs', self._loadInputsAsync())
+
+            testResult = await self._timedAsync('evaluate', self._evaluateAsync(newData, history))
+
+            self._stageQueryMetrics()
+            await self._timedAsync('persist', self._persistAsync())
+
+            # executions of a batch claim their alert once the batch is flushed
+            if self._batchWriteBuffer is None:
+                await self._timedAsync('alert', self._claimAlertAsync(testResult))
+                if len(self._pendingPredictions):
+                    await self._timedAsync('predict', self._storePredictionsAsync())
+
+            self._logStageTimings()
+
+            return Result.ok(testResult)
+
+        except Exception as e:
+            logger.exception(
+                f'error: {e}' if e.args[0] else f'error: unknown - {self._requestLoggingInfo}')
+            return Result.fail('')
+
+
+async def _prefetchInputsAsync(executions: "list[tuple[ExecuteTestRequestDto, ExecuteTestAuthDto]]", executeTests: "list[AsyncExecuteTest]", dbConnection: motor_asyncio.AsyncIOMotorDatabase) -> "list[Union[PrefetchedInputs, None]]":
+    """Reads the definitions and plain history windows of the executions in bulk, one query per organization and suite collection or window size."""
+    byOrganization: "dict[str, list[int]]" = {}
+    for index, (request, auth) in enumerate(executions):
+        # invalid organizations are reported by the execution itself
+        organizationId = request.targetOrgId if auth.isSystemInternal else auth.callerOrgId
+        if organizationId:
+            byOrganization.setdefault(organizationId, []).append(index)
+
+    prefetched: "list[Union[PrefetchedInputs, None]]" = [None] * len(executions)
+    # on servers older than MongoDB 5.1 the executions read their history windows themselves
+    readsHistoryBulk = len(byOrganization) > 0 and await supportsHistoryBulkAsync(dbConnection)
+    for organizationId, indexes in byOrganization.items():
+        definitions = await getTestDataBulkAsync(
+            [(executions[index][0].testSuiteId, executions[index][0].testType) for index in indexes], dbConnection, organizationId)
+
+        byLimit: "dict[int, list[int]]" = {}
+        for index in indexes:
+            request = executions[index][0]
+            definition = definitions.get(request.testSuiteId)
+            if definition is None:
+                continue
+            prefetched[index] = PrefetchedInputs(definition)
+
+            limit = executeTests[index]._toBulkHistoryLimit(request.testType, definition) if readsHistoryBulk else None
+            if limit:
+                byLimit.setdefault(limit, []).append(index)
+
+        tableType = executeTests[0]._getBulkHistoryTableType()
+        for limit, limitIndexes in byLimit.items():
+            histories = await getHistoryDataBulkAsync(
+                list({executions[index][0].testSuiteId for index in limitIndexes}), dbConnection, organizationId, limit, None, tableType)
+            for index in limitIndexes:
+                prefetched[index].historyEntries = histories[executions[index][0].testSuiteId]
+                prefetched[index].historyLimit = limit
+
+    return prefetched
+
+
+async def executeTestsAsync(executions: "list[tuple[ExecuteTestRequestDto, ExecuteTestAuthDto]]", querySnowflake: QuerySnowflake, dbConnection: motor_asyncio.AsyncIOMotorDatabase, maxConcurrency: int = 100) -> "list[ExecuteTestResponseDto]":
+    """Runs many test executions concurrently, keeping at most maxConcurrency in flight. The writes of completed executions are flushed
+    together in chunks of BATCH_FLUSH_SIZE executions, a failed flush fails the executions of its chunk only."""
+    semaphore = asyncio.Semaphore(maxConcurrency)
+    flushSize = getBatchFlushSize()
+    # the executions' model fits are spread over worker processes
+    modelRunner = buildModelRunner(getModelWorkers())
+
+    writeBuffers = [WriteBuffer() for _ in executions]
+    executeTests = [AsyncExecuteTest(querySnowflake, dbConnection, writeBuffer=writeBuffer, modelRunner=modelRunner) for writeBuffer in writeBuffers]
+    try:
+        prefetched = await _prefetchInputsAsync(executions, executeTests, dbConnection)
+    except Exception as e:
+        # the executions read their inputs themselves
+        logger.exception(f'Bulk read of test inputs failed: {e}')
+        prefetched = [None] * len(executions)
+    for executeTest, prefetchedInputs in zip(executeTests, prefetched):
+        executeTest._prefetchedInputs = prefetchedInputs
+
+    results: "list[ExecuteTestResponseDto]" = [Result.fail('')] * len(executions)
+    completed: "list[int]" = []
+
+    async def flush(indexes: "list[int]"):
+        writeBuffer = WriteBuffer()
+        for index in indexes:
+            writeBuffer.extend(writeBuffers[index])
+
+        try:
+            await writeBuffer.flushAsync(dbConnection)
+        except Exception as e:
+            testSuiteIds = [executions[index][0].testSuiteId for index in indexes]
+            logger.exception(f'Flush of the results of test suites {testSuiteIds} failed: {e}')
+            for index in indexes:
+                results[index] = Result.fail('')
+            return
+
+        claimed = await asyncio.gather(*[executeTests[index].claimBatchAlertAsync(results[index]) for index in indexes])
+        for index, result in zip(indexes, claimed):
+            results[index] = result
+
+        # the next forecasts are fitted once the chunk's results are stored
+        await asyncio.gather(*[executeTests[index].storeBatchPredictionsAsync() for index in indexes if results[index].success])
+
+    async def run(index: int, request: ExecuteTestRequestDto, auth: ExecuteTestAuthDto):
+        async with semaphore:
+            results[index] = await executeTests[index].execute(request, auth)
+
+        completed.append(index)
+        if len(completed) >= flushSize:
+            chunk = completed[:]
+            completed.clear()
+            await flush(chunk)
+
+    await asyncio.gather(*[run(index, request, auth) for index, (request, auth) in enumerate(executions)])
+    if completed:
+        await flush(completed)
+
+    return results
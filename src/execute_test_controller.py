@@ -1,12 +1,13 @@
 from dataclasses import asdict
 import json
-from typing import Any
+from typing import Any, Union
 
 from query_snowflake import QuerySnowflake
 from get_accounts import GetAccounts
 from base_controller import Request, Response
 from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto
 from base_controller import BaseController,  UserAccountInfo
+from execution_budget import ExecutionBudget
 
 import logging
 
@@ -23,18 +24,21 @@ class ExecuteTestController(BaseController):
 
     _getAccounts: GetAccounts
     _querySnowflake: QuerySnowflake
+    _budget: Union[ExecutionBudget, None]
 
-    def __init__(self, getAccounts: GetAccounts, querySnowflake: QuerySnowflake) -> None:
+    def __init__(self, getAccounts: GetAccounts, querySnowflake: QuerySnowflake, budget: Union[ExecutionBudget, None] = None) -> None:
         super().__init__()
         self._getAccounts = getAccounts
         self._querySnowflake = querySnowflake
+        self._budget = budget
 
     def _buildRequestDto(self, body: "dict[str, Any]", pathParams: "dict[str, str]") -> ExecuteTestRequestDto:
         testId = pathParams['testId']
         targetOrgId = body['targetOrgId']
         testType = body['testType']
+        forecastBounds = bool(body.get('forecastBounds', False))
 
-        return ExecuteTestRequestDto(testId, testType, targetOrgId)
+        return ExecuteTestRequestDto(testId, testType, targetOrgId, forecastBounds)
 
     def _buildAuthDto(self, jwt: str, userAccountInfo: UserAccountInfo) -> ExecuteTestAuthDto:
         return ExecuteTestAuthDto(jwt, userAccountInfo.callerOrgId, userAccountInfo.isSystemInternal)
@@ -62,7 +66,7 @@ class ExecuteTestController(BaseController):
             logger.info(
                 f'Executing test suite {requestDto.testSuiteId} for organization {requestDto.targetOrgId if requestDto.targetOrgId else authDto.callerOrgId}...')
 
-            result = ExecuteTest(self._querySnowflake).execute(
+            result = ExecuteTest(self._querySnowflake, self._budget).execute(
                 requestDto, authDto)
 
             if not result.success:
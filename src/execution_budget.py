@@ -0,0 +1,42 @@
+import time
+from typing import Union
+from config import getExecutionBudgetDetails
+
+
+class ExecutionBudget:
+    _deadline: Union[float, None]
+    _forecastReserve: float
+    _persistReserve: float
+    _maxQueryTime: float
+
+    def __init__(self, deadline: Union[float, None]) -> None:
+        self._deadline = deadline
+        self._forecastReserve, self._persistReserve, self._maxQueryTime = getExecutionBudgetDetails()
+
+    @staticmethod
+    def fromRemainingTime(remainingTimeInMillis: int) -> 'ExecutionBudget':
+        return ExecutionBudget(time.monotonic() + remainingTimeInMillis / 1000)
+
+    @staticmethod
+    def unlimited() -> 'ExecutionBudget':
+        return ExecutionBudget(None)
+
+    def remaining(self) -> Union[float, None]:
+        if self._deadline is None:
+            return None
+        return self._deadline - time.monotonic()
+
+    def queryTimeout(self) -> Union[float, None]:
+        remaining = self.remaining()
+        if remaining is None:
+            return self._maxQueryTime
+
+        # the query has to leave enough time for at least the z-score analysis and persisting the result
+        timeout = min(self._maxQueryTime, remaining - self._persistReserve)
+        if timeout <= 0:
+            raise Exception('Execution budget exhausted before querying new data')
+        return timeout
+
+    def allowsForecast(self) -> bool:
+        remaining = self.remaining()
+        return remaining is None or remaining - self._persistReserve >= self._forecastReserve
@@ -28,6 +28,15 @@ class GetAccounts(IUseCase):
     try:
       getAccountsResponse = self._accountApiRepo.getBy({'userId': request.userId}, auth.jwt)
 
+      return Result.ok(getAccountsResponse)
+    except Exception as e:
+      logger.exception(f'error: {e}' if e.args[0] else f'error: unknown')
+      return Result.fail('')
+
+  async def executeAsync(self, request: GetAccountsRequestDto, auth: GetAccountsAuthDto) -> GetAccountsResponseDto:
+    try:
+      getAccountsResponse = await self._accountApiRepo.getByAsync({'userId': request.userId}, auth.jwt)
+
       return Result.ok(getAccountsResponse)
     except Exception as e:
       logger.exception(f'error: {e}' if e.args[0] else f'error: unknown')
@@ -0,0 +1,55 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Union
+
+# Suites choose their model window with one of these fields of their definition:
+#   history_window_points  the latest N points
+#   history_window_days    every point of the last N days, downsampled server side to time buckets
+
+# a time bucket is identified by a prefix of the ISO executed_on (as the roll-ups of compact_history are), finest first
+_bucketWidths = [(timedelta(minutes=10), len('YYYY-MM-DDTHH:M')),
+                 (timedelta(hours=1), len('YYYY-MM-DDTHH')),
+                 (timedelta(days=1), len('YYYY-MM-DD'))]
+
+
+@dataclass(frozen=True)
+class HistoryWindow:
+    # the number of points the model sees at most
+    points: int
+    # ISO executed_on the window starts with, None for a window of the latest points
+    start: Union[str, None] = None
+    bucketKeyLength: Union[int, None] = None
+
+
+def _toBucketKeyLength(span: timedelta, maxPoints: int) -> int:
+    for width, keyLength in _bucketWidths:
+        if span / width <= maxPoints:
+            return keyLength
+    # longer spans keep the latest daily buckets only
+    return _bucketWidths[-1][1]
+
+
+def toHistoryWindow(testDefinition: "dict[str, Any]", defaultPoints: int, maxPoints: int, now: datetime) -> HistoryWindow:
+    days = testDefinition.get('history_window_days')
+    if days is not None:
+        if float(days) <= 0:
+            raise Exception('history_window_days has to be positive')
+        span = timedelta(days=float(days))
+        return HistoryWindow(maxPoints, (now - span).isoformat(), _toBucketKeyLength(span, maxPoints))
+
+    points = testDefinition.get('history_window_points')
+    if points is not None:
+        if int(points) <= 0:
+            raise Exception('history_window_points has to be positive')
+        return HistoryWindow(min(int(points), maxPoints))
+
+    return HistoryWindow(defaultPoints)
+
+
+def toModelWindow(window: HistoryWindow, historicalData: "list[tuple[str, float]]") -> "list[tuple[str, float]]":
+    # next to the window the history holds the suite's first point, which only the warm-up check needs
+    if window.start is None:
+        return historicalData[-window.points:]
+
+    start = datetime.fromisoformat(window.start.split('.')[0])
+    return [point for point in historicalData if datetime.fromisoformat(point[0]) >= start][-window.points:]
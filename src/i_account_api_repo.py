@@ -6,4 +6,8 @@ from account_dto import AccountDto
 class IAccountApiRepo(ABC):
   @abstractmethod
   def getBy(self, params: "dict[str, str]", jwt: str) -> "list[AccountDto]":
+    raise NotImplementedError
+
+  @abstractmethod
+  async def getByAsync(self, params: "dict[str, str]", jwt: str) -> "list[AccountDto]":
     raise NotImplementedError
\ No newline at end of file
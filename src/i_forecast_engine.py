@@ -0,0 +1,23 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+import pandas as pd
+
+
+@dataclass
+class ForecastDto:
+    yhat: float
+    yhatLower: float
+    yhatUpper: float
+    trend: float
+    trendLower: float
+    trendUpper: float
+    # (value, lower, upper) per seasonality, e.g. 'daily' or 'weekly'
+    seasonalities: "dict[str, tuple[float, float, float]]" = field(
+        default_factory=dict)
+
+
+class IForecastEngine(ABC):
+    @abstractmethod
+    def forecast(self, historicalData: pd.DataFrame, at: pd.Timestamp) -> ForecastDto:
+        """Forecasts the value at a point in time from a frame with the columns ds (timestamp) and y (value)."""
+        raise NotImplementedError
@@ -7,5 +7,9 @@ from snowflake_query_result_dto import SnowflakeQueryResultDto
 
 class IIntegrationApiRepo(ABC):
   @abstractmethod
-  def querySnowflake(self, query: str, jwt: str, targetOrgId: Union[str, None]) -> SnowflakeQueryResultDto:
+  def querySnowflake(self, query: str, jwt: str, targetOrgId: Union[str, None], timeout: Union[float, None] = None) -> SnowflakeQueryResultDto:
+    raise NotImplementedError
+
+  @abstractmethod
+  async def querySnowflakeAsync(self, query: str, jwt: str, targetOrgId: Union[str, None], timeout: Union[float, None] = None) -> SnowflakeQueryResultDto:
     raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,48 @@
+from abc import ABC, abstractmethod
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Union
+import numpy as np
+import pandas as pd
+from i_forced_threshold import ForcedThreshold
+from i_forecast_engine import ForecastDto
+from quant_model import ForecastSkipReason, ResultDto
+from window_statistics import WindowStatistics
+from test_type import CustomTest, QuantColumnTest, QuantMatTest
+
+
+@dataclass
+class ModelTask:
+    newDataPoint: "tuple[str, float]"
+    # the history as two arrays instead of a list of tuples, which is cheaper to ship to another process
+    executedOn: np.ndarray
+    values: np.ndarray
+    testType: Union[QuantMatTest, QuantColumnTest, CustomTest]
+    forcedLowerThreshold: Union[ForcedThreshold, None]
+    forcedUpperThreshold: Union[ForcedThreshold, None]
+    # the forecast engine is built where the task runs, only its name and state are shipped
+    forecastEngineName: str
+    warmStartParams: "Union[dict[str, Any], None]" = None
+    precomputedForecast: Union[ForecastDto, None] = None
+    forecastSkipReason: Union[ForecastSkipReason, None] = None
+    lazy: bool = False
+    statistics: Union[WindowStatistics, None] = None
+
+    @staticmethod
+    def build(newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: Union[ForcedThreshold, None], forcedUpperThreshold: Union[ForcedThreshold, None], forecastEngineName: str, warmStartParams: "Union[dict[str, Any], None]" = None, precomputedForecast: Union[ForecastDto, None] = None, forecastSkipReason: Union[ForecastSkipReason, None] = None, lazy: bool = False, statistics: Union[WindowStatistics, None] = None) -> 'ModelTask':
+        return ModelTask(newDataPoint, np.array([executedOn for executedOn, _ in historicalData], dtype='datetime64[s]'), np.array([value for _, value in historicalData], dtype=float),
+                         testType, forcedLowerThreshold, forcedUpperThreshold, forecastEngineName, warmStartParams, precomputedForecast, forecastSkipReason, lazy, statistics)
+
+    def historicalData(self) -> "list[tuple[str, float]]":
+        return list(zip(pd.DatetimeIndex(self.executedOn).strftime('%Y-%m-%d %H:%M:%S'), self.values.tolist()))
+
+
+class IModelRunner(ABC):
+    @abstractmethod
+    def run(self, task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+        """Runs the quant model of a task. Next to the result it returns the parameters of the forecast fit, if one was warm startable."""
+        raise NotImplementedError
+
+    async def runAsync(self, task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+        """Awaitable run. By default the model runs on a thread of the event loop's executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.run, task)
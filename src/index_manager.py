@@ -0,0 +1,218 @@
+import argparse
+from typing import Any, Union
+from pymongo import ASCENDING, DESCENDING, IndexModel, database, monitoring
+from motor import motor_asyncio
+from cito_data_query import CitoTableType
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# Indexes backing the $match/$lookup/find_one/update_one calls in cito_data_query, per org collection type
+_requiredIndexes: "dict[CitoTableType, list[list[tuple[str, int]]]]" = {
+    CitoTableType.TestSuites: [[('id', ASCENDING)]],
+    CitoTableType.TestSuitesQual: [[('id', ASCENDING)]],
+    CitoTableType.TestSuitesCustom: [[('id', ASCENDING)]],
+    CitoTableType.TestHistory: [
+        [('test_suite_id', ASCENDING), ('metric', ASCENDING), ('_id', DESCENDING)],
+        [('execution_id', ASCENDING)]
+    ],
+    CitoTableType.TestHistoryQual: [
+        [('execution_id', ASCENDING)],
+        [('test_suite_id', ASCENDING)]
+    ],
+    CitoTableType.TestExecutions: [
+        [('id', ASCENDING)],
+        [('test_suite_id', ASCENDING), ('executed_on', DESCENDING)],
+        [('executed_on', ASCENDING)]
+    ],
+    CitoTableType.TestExecutionsQual: [
+        [('id', ASCENDING)],
+        [('test_suite_id', ASCENDING), ('executed_on', DESCENDING)]
+    ],
+    CitoTableType.TestResults: [
+        [('test_suite_id', ASCENDING)],
+        [('execution_id', ASCENDING)]
+    ],
+    CitoTableType.TestResultsQual: [
+        [('test_suite_id', ASCENDING)],
+        [('execution_id', ASCENDING)]
+    ],
+    CitoTableType.TestAlerts: [
+        [('test_suite_id', ASCENDING)],
+        [('execution_id', ASCENDING)]
+    ],
+    CitoTableType.TestAlertsQual: [
+        [('test_suite_id', ASCENDING)],
+        [('execution_id', ASCENDING)]
+    ],
+    CitoTableType.TestQueryMetrics: [
+        [('executed_on', DESCENDING)],
+        [('test_suite_id', ASCENDING), ('executed_on', DESCENDING)]
+    ],
+    CitoTableType.TestRuns: [
+        [('id', ASCENDING)],
+        [('test_suite_id', ASCENDING), ('metric', ASCENDING), ('executed_on', DESCENDING)]
+    ],
+    CitoTableType.TestHistoryRollups: [
+        [('test_suite_id', ASCENDING), ('metric', ASCENDING), ('bucket_start', DESCENDING)]
+    ],
+    CitoTableType.TestHistoryBuckets: [
+        [('test_suite_id', ASCENDING), ('metric', ASCENDING), ('last_executed_on', DESCENDING)],
+        [('test_suite_id', ASCENDING), ('metric', ASCENDING), ('count', ASCENDING)]
+    ],
+    CitoTableType.TestSuiteStates: [[('test_suite_id', ASCENDING)]],
+}
+
+# the migration merges into test_runs on id, which requires a unique index
+_uniqueIndexes: "dict[CitoTableType, list[list[tuple[str, int]]]]" = {
+    CitoTableType.TestRuns: [[('id', ASCENDING)]]
+}
+
+# orgs whose collections were already checked by this process (survives across warm lambda invocations)
+_indexedOrganizations: "set[str]" = set()
+
+
+def _toIndexModels(tableType: CitoTableType) -> "list[IndexModel]":
+    return [IndexModel(keys, name='_'.join(f'{key}_{direction}' for key, direction in keys), unique=keys in _uniqueIndexes.get(tableType, [])) for keys in _requiredIndexes[tableType]]
+
+
+def _toOrganizationCollections(collectionNames: "list[str]") -> "dict[str, list[CitoTableType]]":
+    # longest prefix first, so that e.g. test_suites_qual_<org> is not read as test_suites_<org>
+    tableTypes = sorted(_requiredIndexes.keys(),
+                        key=lambda tableType: len(tableType.value), reverse=True)
+
+    organizationCollections: "dict[str, list[CitoTableType]]" = {}
+    for collectionName in collectionNames:
+        tableType = next((tableType for tableType in tableTypes if collectionName.startswith(
+            tableType.value + '_')), None)
+        if not tableType:
+            continue
+        organizationId = collectionName[len(tableType.value) + 1:]
+        organizationCollections.setdefault(organizationId, []).append(tableType)
+
+    return organizationCollections
+
+
+def _getMissingIndexes(tableType: CitoTableType, indexInformation: "dict[str, Any]") -> "list[IndexModel]":
+    existingKeys = [[tuple(element) for element in info['key']]
+                    for info in indexInformation.values()]
+    return [model for model in _toIndexModels(tableType) if [tuple(element) for element in model.document['key'].items()] not in existingKeys]
+
+
+def ensureOrgIndexes(dbConnection: database.Database, organizationId: str):
+    """Creates the required indexes the first time this process sees an organization. create_index is a no-op for existing indexes."""
+    if organizationId in _indexedOrganizations:
+        return
+
+    for tableType in _requiredIndexes:
+        dbConnection[tableType.value + '_' + organizationId].create_indexes(_toIndexModels(tableType))
+
+    _indexedOrganizations.add(organizationId)
+    logger.info(f'Ensured indexes for organization {organizationId}')
+
+
+async def ensureOrgIndexesAsync(dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str):
+    if organizationId in _indexedOrganizations:
+        return
+
+    for tableType in _requiredIndexes:
+        await dbConnection[tableType.value + '_' + organizationId].create_indexes(_toIndexModels(tableType))
+
+    _indexedOrganizations.add(organizationId)
+    logger.info(f'Ensured indexes for organization {organizationId}')
+
+
+def verifyIndexes(dbConnection: database.Database, repair: bool = True) -> "dict[str, list[str]]":
+    """Checks all existing org collections for missing indexes. Returns the missing index names per collection."""
+    missing: "dict[str, list[str]]" = {}
+
+    for organizationId, tableTypes in _toOrganizationCollections(dbConnection.list_collection_names()).items():
+        for tableType in tableTypes:
+            collection = dbConnection[tableType.value + '_' + organizationId]
+            missingIndexes = _getMissingIndexes(tableType, collection.index_information())
+            if not len(missingIndexes):
+                continue
+
+            missing[collection.name] = [model.document['name'] for model in missingIndexes]
+            if repair:
+                collection.create_indexes(missingIndexes)
+
+        if repair:
+            _indexedOrganizations.add(organizationId)
+
+    if len(missing):
+        logger.warning(
+            f'Missing indexes {"(created)" if repair else ""}: {missing}')
+
+    return missing
+
+
+def getCollectionScans(dbConnection: database.Database, limit: int = 50) -> "list[dict[str, Any]]":
+    """Reads recent collection scans from the database profiler. Requires profiling to be enabled (level 1 with slowms or level 2)."""
+    return list(dbConnection['system.profile'].find(
+        {'planSummary': {'$regex': '^COLLSCAN'}},
+        {'_id': 0, 'ns': 1, 'op': 1, 'command': 1, 'millis': 1, 'docsExamined': 1, 'ts': 1}).sort('ts', DESCENDING).limit(limit))
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Logs commands that exceed the slow query threshold, so that queries missing an index show up in the logs."""
+
+    _monitoredCommands = {'find', 'aggregate', 'count',
+                          'distinct', 'findAndModify', 'update', 'delete'}
+
+    _thresholdMs: float
+    _startedCommands: "dict[int, tuple[str, Any]]"
+
+    def __init__(self, thresholdMs: float) -> None:
+        self._thresholdMs = thresholdMs
+        self._startedCommands = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name not in self._monitoredCommands:
+            return
+
+        command = event.command
+        self._startedCommands[event.request_id] = (
+            f'{event.database_name}.{command.get(event.command_name)}', command.get('filter', command.get('pipeline', command.get('query'))))
+
+    def _complete(self, requestId: int, durationMicros: int, commandName: str, failed: bool):
+        startedCommand: Union["tuple[str, Any]", None] = self._startedCommands.pop(
+            requestId, None)
+        if not startedCommand:
+            return
+
+        durationMs = durationMicros / 1000
+        if durationMs < self._thresholdMs:
+            return
+
+        namespace, query = startedCommand
+        logger.warning(
+            f'Slow {commandName}{" (failed)" if failed else ""} on {namespace} took {round(durationMs, 1)} ms: {query}')
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._complete(event.request_id, event.duration_micros,
+                       event.command_name, False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._complete(event.request_id, event.duration_micros,
+                       event.command_name, True)
+
+
+
+if __name__ == '__main__':
+    from mongo_db import get_mongo_connection
+
+    # scans every org collection, so it runs as a job or by hand instead of on cold starts.
+    # Requests still create the indexes of their own organization with ensureOrgIndexes
+    parser = argparse.ArgumentParser(
+        description='Verify (and create) the required indexes of all org collections')
+    parser.add_argument('--check', action='store_true',
+                        help='only report missing indexes, exit with 1 if there are any')
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    missing = verifyIndexes(get_mongo_connection(), repair=not args.check)
+    if args.check and len(missing):
+        raise SystemExit(1)
@@ -1,8 +1,9 @@
 from typing import Union
+import aiohttp
 import requests
 
 from i_integration_api_repo import IIntegrationApiRepo
-from snowflake_query_result_dto import SnowflakeQueryResultDto
+from snowflake_query_result_dto import SnowflakeQueryResultDto, buildSnowflakeQueryMetadata
 import logging
 from config import getIntegrationApiRoot
 
@@ -14,16 +15,42 @@ class IntegrationApiRepo(IIntegrationApiRepo):
     def __init__(self) -> None:
         self._version = 'v1'
         self._apiRoot = getIntegrationApiRoot()
+        self._session: Union[aiohttp.ClientSession, None] = None
 
-    def querySnowflake(self, query: str, jwt: str, targetOrgId: Union[str, None]) -> SnowflakeQueryResultDto:
-        data: "dict[str, Union[str, None]]" = {'query': query}
+    def _getSession(self) -> aiohttp.ClientSession:
+        if not self._session or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
 
-        data['targetOrgId'] = targetOrgId if targetOrgId else None
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def _buildQueryBody(self, query: str, targetOrgId: Union[str, None]) -> "dict[str, str]":
+        # shared by the sync and the async path, so both send the same body. Without a target org the caller's org is queried
+        data = {'query': query}
+        if targetOrgId:
+            data['targetOrgId'] = targetOrgId
+        return data
+
+    def querySnowflake(self, query: str, jwt: str, targetOrgId: Union[str, None], timeout: Union[float, None] = None) -> SnowflakeQueryResultDto:
+        data = self._buildQueryBody(query, targetOrgId)
 
         response = requests.post(f'{self._apiRoot}/api/{self._version}/snowflake/query',
-                                 data=data, headers={'Authorization': f'Bearer {jwt}'})
+                                 data=data, headers={'Authorization': f'Bearer {jwt}'}, timeout=timeout)
         jsonPayload = response.json()
         if response.status_code == 201:
-            return SnowflakeQueryResultDto(jsonPayload)
+            return SnowflakeQueryResultDto(jsonPayload, buildSnowflakeQueryMetadata(jsonPayload.pop('queryMetadata', None)))
         raise Exception(
             jsonPayload['message'] if jsonPayload['message'] else 'Unknown Error')
+
+    async def querySnowflakeAsync(self, query: str, jwt: str, targetOrgId: Union[str, None], timeout: Union[float, None] = None) -> SnowflakeQueryResultDto:
+        data = self._buildQueryBody(query, targetOrgId)
+
+        async with self._getSession().post(f'{self._apiRoot}/api/{self._version}/snowflake/query',
+                                           data=data, headers={'Authorization': f'Bearer {jwt}'}, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            jsonPayload = await response.json(content_type=None)
+            if response.status == 201:
+                return SnowflakeQueryResultDto(jsonPayload, buildSnowflakeQueryMetadata(jsonPayload.pop('queryMetadata', None)))
+            raise Exception(
+                jsonPayload['message'] if jsonPayload['message'] else 'Unknown Error')
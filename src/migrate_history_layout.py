@@ -0,0 +1,172 @@
+import argparse
+from itertools import groupby
+from typing import Any
+from pymongo import database
+from cito_data_query import CitoTableType
+from config import getHistoryBucketSize
+from index_manager import ensureOrgIndexes
+from mongo_db import get_mongo_connection
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _buildExecutionLookup(organizationId: str) -> "list[dict[str, Any]]":
+    return [
+        {
+            '$lookup': {
+                'from': CitoTableType.TestExecutions.value + '_' + organizationId,
+                'localField': 'execution_id',
+                'foreignField': 'id',
+                'as': 'test_executions'
+            }
+        },
+        {
+            '$unwind': {
+                'path': '$test_executions',
+                'preserveNullAndEmptyArrays': False
+            }
+        }
+    ]
+
+
+def _buildMigrationPipeline(organizationId: str) -> "list[dict[str, Any]]":
+    return _buildExecutionLookup(organizationId) + [
+        {
+            '$lookup': {
+                'from': CitoTableType.TestResults.value + '_' + organizationId,
+                'let': {'executionId': '$execution_id', 'metric': {'$ifNull': ['$metric', None]}},
+                'pipeline': [
+                    {
+                        '$match': {
+                            '$expr': {
+                                '$and': [
+                                    {'$eq': ['$execution_id', '$$executionId']},
+                                    {'$eq': [{'$ifNull': ['$metric', None]}, '$$metric']}
+                                ]
+                            }
+                        }
+                    },
+                    {'$project': {'_id': 0, 'id': 0, 'test_type': 0, 'test_suite_id': 0, 'execution_id': 0, 'metric': 0}}
+                ],
+                'as': 'test_results'
+            }
+        },
+        {
+            '$project': {
+                '_id': 0,
+                'id': 1,
+                'test_type': 1,
+                'test_suite_id': 1,
+                'execution_id': 1,
+                'metric': 1,
+                'executed_on': '$test_executions.executed_on',
+                'value': 1,
+                'is_anomaly': 1,
+                'user_feedback_is_anomaly': 1,
+                'alert_id': 1,
+                'result': {'$ifNull': [{'$arrayElemAt': ['$test_results', 0]}, None]}
+            }
+        },
+        {
+            # re-running the migration refreshes existing run documents, e.g. to pick up user feedback
+            '$merge': {
+                'into': CitoTableType.TestRuns.value + '_' + organizationId,
+                'on': 'id',
+                'whenMatched': 'merge',
+                'whenNotMatched': 'insert'
+            }
+        }
+    ]
+
+
+def migrateOrganization(dbConnection: database.Database, organizationId: str):
+    """Converts the split history of an organization into consolidated test_runs documents. Safe to run repeatedly."""
+    ensureOrgIndexes(dbConnection, organizationId)
+
+    dbConnection[CitoTableType.TestHistory.value + '_' + organizationId].aggregate(
+        _buildMigrationPipeline(organizationId), allowDiskUse=True)
+
+    logger.info(
+        f'Migrated organization {organizationId}: {dbConnection[CitoTableType.TestRuns.value + "_" + organizationId].count_documents({})} run documents')
+
+
+def _buildBucketMigrationPipeline(organizationId: str) -> "list[dict[str, Any]]":
+    return _buildExecutionLookup(organizationId) + [
+        {
+            '$project': {
+                '_id': 0,
+                'test_suite_id': 1,
+                'metric': {'$ifNull': ['$metric', None]},
+                'id': 1,
+                't': '$test_executions.executed_on',
+                'v': '$value',
+                'a': '$is_anomaly',
+                'f': '$user_feedback_is_anomaly'
+            }
+        },
+        {'$sort': {'test_suite_id': 1, 'metric': 1, 't': 1}}
+    ]
+
+
+def _toBuckets(points: "list[dict[str, Any]]", bucketSize: int) -> "list[dict[str, Any]]":
+    buckets = []
+    for (testSuiteId, metric), suitePoints in groupby(points, key=lambda point: (point.pop('test_suite_id'), point.pop('metric'))):
+        suitePoints = list(suitePoints)
+        for start in range(0, len(suitePoints), bucketSize):
+            bucketPoints = suitePoints[start:start + bucketSize]
+            buckets.append({
+                'test_suite_id': testSuiteId,
+                'metric': metric,
+                'count': len(bucketPoints),
+                'first_executed_on': bucketPoints[0]['t'],
+                'last_executed_on': bucketPoints[-1]['t'],
+                'points': bucketPoints
+            })
+
+    return buckets
+
+
+def migrateOrganizationToBuckets(dbConnection: database.Database, organizationId: str, bucketSize: int):
+    """Rebuilds the history buckets of an organization from its split history. Existing buckets are replaced."""
+    ensureOrgIndexes(dbConnection, organizationId)
+
+    points = dbConnection[CitoTableType.TestHistory.value + '_' + organizationId].aggregate(
+        _buildBucketMigrationPipeline(organizationId), allowDiskUse=True)
+    buckets = _toBuckets(list(points), bucketSize)
+
+    bucketCollection = dbConnection[CitoTableType.TestHistoryBuckets.value + '_' + organizationId]
+    bucketCollection.delete_many({})
+    if len(buckets):
+        bucketCollection.insert_many(buckets)
+
+    logger.info(
+        f'Migrated organization {organizationId}: {len(buckets)} history buckets')
+
+
+def getOrganizationIds(dbConnection: database.Database) -> "list[str]":
+    historyPrefix = CitoTableType.TestHistory.value + '_'
+    # e.g. test_history_qual_<org> or test_history_buckets_<org>
+    otherPrefixes = tuple(tableType.value + '_' for tableType in CitoTableType if tableType.value.startswith(historyPrefix))
+
+    return sorted(collectionName[len(historyPrefix):] for collectionName in dbConnection.list_collection_names()
+                  if collectionName.startswith(historyPrefix) and not collectionName.startswith(otherPrefixes))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Migrate test history into the consolidated or the bucketed layout (HISTORY_LAYOUT)')
+    parser.add_argument('--org', action='append',
+                        help='organization id to migrate, defaults to all organizations')
+    parser.add_argument('--layout', choices=['consolidated', 'bucketed'], default='consolidated')
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    dbConnection = get_mongo_connection()
+    for organizationId in args.org or getOrganizationIds(dbConnection):
+        if args.layout == 'bucketed':
+            migrateOrganizationToBuckets(dbConnection, organizationId, getHistoryBucketSize())
+        else:
+            migrateOrganization(dbConnection, organizationId)
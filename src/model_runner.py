@@ -0,0 +1,120 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Union
+from i_forecast_engine import IForecastEngine
+from i_model_runner import IModelRunner, ModelTask
+from precomputed_forecast_engine import PrecomputedForecastEngine
+from prophet_forecast_engine import ProphetForecastEngine
+from quant_model import CommonModel, ResultDto, buildForecastEngine
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+def _buildForecastEngine(task: ModelTask) -> IForecastEngine:
+    if task.precomputedForecast is not None:
+        return PrecomputedForecastEngine(task.precomputedForecast)
+    return buildForecastEngine(task.forecastEngineName, task.warmStartParams)
+
+
+def runModelTask(task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+    forecastEngine = _buildForecastEngine(task)
+    result = CommonModel(task.newDataPoint, task.historicalData(), task.testType, task.forcedLowerThreshold,
+                         task.forcedUpperThreshold, forecastEngine, task.statistics).run(task.forecastSkipReason, task.lazy)
+    return result, forecastEngine.fittedParams if isinstance(forecastEngine, ProphetForecastEngine) else None
+
+
+def _initWorker():
+    # the first Prophet instance loads the compiled Stan model, later fits of the worker reuse it
+    from prophet import Prophet
+    Prophet()
+
+
+def availableCores() -> int:
+    # the cores this process may run on, which can be fewer than the machine has
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+
+class InProcessModelRunner(IModelRunner):
+    def run(self, task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+        return runModelTask(task)
+
+
+class ProcessPoolModelRunner(IModelRunner):
+    """Runs models in worker processes, so the CPU bound forecast fits of concurrent executions use more than one core."""
+
+    _pool: ProcessPoolExecutor
+    workers: int
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        # forked workers would inherit the locks of the parent's threads (e.g. the I/O executor and the event loop's)
+        # in whatever state they are, the fork server forks them from a clean single threaded process instead
+        self._pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver'), initializer=_initWorker)
+
+    def run(self, task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+        try:
+            return self._pool.submit(runModelTask, task).result()
+        except BrokenProcessPool as e:
+            # e.g. a worker ran out of memory. The pool is replaced for the next task, this one runs in process
+            logger.warning(f'Model worker pool broke, running the model in process: {e}')
+            _discardProcessPoolRunner(self)
+            return runModelTask(task)
+
+    async def runAsync(self, task: ModelTask) -> "tuple[ResultDto, Union[dict[str, Any], None]]":
+        # awaits the worker's result on the event loop, no executor thread waits for the whole run
+        try:
+            return await asyncio.wrap_future(self._pool.submit(runModelTask, task))
+        except BrokenProcessPool as e:
+            logger.warning(f'Model worker pool broke, running the model in process: {e}')
+            _discardProcessPoolRunner(self)
+            return await asyncio.get_running_loop().run_in_executor(None, runModelTask, task)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# kept for the lifetime of the process, so warm workers are reused by later executions
+_processPoolRunner: Union[ProcessPoolModelRunner, None] = None
+
+
+def _discardProcessPoolRunner(runner: ProcessPoolModelRunner):
+    global _processPoolRunner
+    if _processPoolRunner is runner:
+        _processPoolRunner = None
+    runner.shutdown()
+
+
+def buildModelRunner(workers: int) -> IModelRunner:
+    """Process pool runner with the given number of workers (0 for one per available core), in process if only one core is available."""
+    global _processPoolRunner
+
+    workers = workers or availableCores()
+    if workers <= 1 or availableCores() <= 1:
+        return InProcessModelRunner()
+
+    if _processPoolRunner is not None and _processPoolRunner.workers == workers:
+        return _processPoolRunner
+
+    try:
+        runner = ProcessPoolModelRunner(workers)
+    except OSError as e:
+        # e.g. AWS Lambda lacks /dev/shm, which the pool's locks need
+        logger.warning(f'Cannot start model worker processes, running models in process: {e}')
+        return InProcessModelRunner()
+
+    if _processPoolRunner is not None:
+        _processPoolRunner.shutdown()
+    _processPoolRunner = runner
+    return runner
+
+
+@atexit.register
+def _shutdownProcessPoolRunner():
+    if _processPoolRunner is not None:
+        _processPoolRunner.shutdown()
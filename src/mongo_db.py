@@ -1,12 +1,35 @@
-from pymongo import MongoClient
-from config import getMongoDetails
+from typing import Union
+from pymongo import MongoClient, database
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import getMongoDetails, getSlowQueryThresholdMs
+from index_manager import SlowQueryListener
+
+# one client (and connection pool) per process, warm containers reuse it across invocations.
+# Handing out the same database object also lets collection handles be cached per connection
+_connection: Union[database.Database, None] = None
 
 def get_mongo_connection():
+    global _connection
+
     details = getMongoDetails()
-    client = MongoClient(details[1])
-    print("Successfully connected to MongoDb")
 
     if not details[0]:
         raise Exception("Cannot have undefined database name")
+
+    if _connection is None:
+        client = MongoClient(details[1], event_listeners=[SlowQueryListener(getSlowQueryThresholdMs())])
+        print("Successfully connected to MongoDb")
+        _connection = client[details[0]]
     
-    return client[details[0]]
\ No newline at end of file
+    return _connection
+
+def get_async_mongo_connection():
+    # motor clients are bound to the event loop they are first used on, so they are not shared across calls
+    details = getMongoDetails()
+    client = AsyncIOMotorClient(details[1], event_listeners=[SlowQueryListener(getSlowQueryThresholdMs())])
+    print("Successfully connected to MongoDb (async)")
+
+    if not details[0]:
+        raise Exception("Cannot have undefined database name")
+
+    return client[details[0]]
@@ -0,0 +1,91 @@
+import math
+import numpy as np
+import pandas as pd
+from i_forecast_engine import IForecastEngine, ForecastDto
+
+
+def theilSen(t: np.ndarray, y: np.ndarray) -> "tuple[float, float]":
+    """Robust linear fit: the median of the pairwise slopes and the median intercept."""
+    dt = np.subtract.outer(t, t)
+    dy = np.subtract.outer(y, y)
+    pairs = dt > 0
+    slope = float(np.median(dy[pairs] / dt[pairs])) if pairs.any() else 0.0
+    intercept = float(np.median(y - slope * t))
+    return slope, intercept
+
+
+class NumpyForecastEngine(IForecastEngine):
+    """Robust linear trend (Theil-Sen) plus seasonal naive profiles of the residuals, with analytic prediction intervals."""
+
+    # Prophet's default interval width of 80%
+    _Z = 1.2815515655446004
+    # longest first, each seasonality is fitted on the residuals of the previous ones
+    _SEASONALITIES = [('weekly', 7.0), ('daily', 1.0)]
+    _BACKFIT_ITERATIONS = 3
+
+    @staticmethod
+    def _scale(residuals: np.ndarray) -> float:
+        mad = float(np.median(np.abs(residuals - np.median(residuals))))
+        if mad > 0:
+            return 1.4826 * mad
+        return float(np.std(residuals))
+
+    @staticmethod
+    def _phase(timestamps: pd.DatetimeIndex, name: str) -> np.ndarray:
+        return np.asarray(timestamps.dayofweek if name == 'weekly' else timestamps.hour)
+
+    def _seasonalProfile(self, period: float, t: np.ndarray, phases: np.ndarray, residuals: np.ndarray) -> "dict[int, tuple[float, int]]":
+        # a seasonal profile needs two full periods and more than one point per half period
+        if t[-1] - t[0] < 2 * period or np.median(np.diff(t)) >= period / 2:
+            return {}
+
+        profile = {}
+        for phase in np.unique(phases):
+            samePhase = residuals[phases == phase]
+            if len(samePhase) >= 2:
+                profile[int(phase)] = (float(np.median(samePhase)), len(samePhase))
+        return profile
+
+    def forecast(self, historicalData: pd.DataFrame, at: pd.Timestamp) -> ForecastDto:
+        if not len(historicalData):
+            raise Exception('Cannot forecast without historical data')
+
+        frame = historicalData.assign(ds=pd.to_datetime(historicalData['ds'])).sort_values('ds')
+        timestamps = pd.DatetimeIndex(frame['ds'])
+        origin = timestamps[0]
+        t = np.asarray((timestamps - origin) / pd.Timedelta(days=1), dtype=float)
+        y = np.asarray(frame['y'], dtype=float)
+        x0 = (pd.Timestamp(at) - origin) / pd.Timedelta(days=1)
+
+        # backfitting: the trend is refitted on the deseasonalized values, so partial seasons do not tilt it
+        fitted = np.zeros(len(t))
+        for _ in range(self._BACKFIT_ITERATIONS):
+            slope, intercept = theilSen(t, y - fitted)
+            residuals = y - (intercept + slope * t)
+
+            fitted = np.zeros(len(t))
+            seasonalities = {}
+            for name, period in self._SEASONALITIES:
+                phases = self._phase(timestamps, name)
+                profile = self._seasonalProfile(period, t, phases, residuals - fitted)
+                atPhase = int(self._phase(pd.DatetimeIndex([at]), name)[0])
+                if atPhase not in profile:
+                    continue
+                fitted += np.array([profile.get(int(phase), (0.0, 0))[0] for phase in phases])
+                seasonalities[name] = profile[atPhase]
+
+        residuals = residuals - fitted
+        seasonal = sum(value for value, _ in seasonalities.values())
+
+        scale = self._scale(residuals)
+
+        n = len(t)
+        sxx = float(np.sum((t - t.mean()) ** 2))
+        leverage = 1 / n + ((x0 - t.mean()) ** 2 / sxx if sxx > 0 else 0)
+        trend = intercept + slope * x0
+        trendHalfWidth = self._Z * scale * math.sqrt(leverage)
+        yhatHalfWidth = self._Z * scale * math.sqrt(1 + leverage)
+
+        return ForecastDto(trend + seasonal, trend + seasonal - yhatHalfWidth, trend + seasonal + yhatHalfWidth,
+                           trend, trend - trendHalfWidth, trend + trendHalfWidth,
+                           {name: (value, value - self._Z * scale / math.sqrt(count), value + self._Z * scale / math.sqrt(count)) for name, (value, count) in seasonalities.items()})
@@ -0,0 +1,14 @@
+import pandas as pd
+from i_forecast_engine import IForecastEngine, ForecastDto
+
+
+class PrecomputedForecastEngine(IForecastEngine):
+    """Returns a forecast computed ahead of the execution, e.g. by the suite's previous execution."""
+
+    _forecast: ForecastDto
+
+    def __init__(self, forecast: ForecastDto) -> None:
+        self._forecast = forecast
+
+    def forecast(self, historicalData: pd.DataFrame, at: pd.Timestamp) -> ForecastDto:
+        return self._forecast
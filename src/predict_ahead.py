@@ -0,0 +1,74 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Union
+import pandas as pd
+from i_forecast_engine import IForecastEngine, ForecastDto
+
+# A scheduled execution precomputes the forecast of the suite's next execution and keeps it in the suite state document:
+# { forecast_prediction: { fingerprint, engine, at, valid_until, forecast } }
+# fingerprint identifies the model window the next execution is expected to read. Feedback, anomalies of other executions
+# or a missed execution change the window (or outdate at), and the next execution fits the forecast itself.
+
+
+@dataclass
+class PendingPrediction:
+    """The inputs of a prediction, which is fitted once the execution's results are stored."""
+    executedOn: datetime
+    value: float
+    historicalData: "list[tuple[str, float]]"
+    isAnomaly: bool
+    engineName: str
+    # parameters of the execution's own fit, the closest warm start for the prediction
+    fittedParams: "Union[dict[str, Any], None]"
+    metric: Union[str, None]
+
+
+def toWindowFingerprint(historicalData: "list[tuple[str, float]]") -> str:
+    # values can be read back as int or float, both have to give the same fingerprint
+    return hashlib.sha1(json.dumps([[executedOn, float(value)] for executedOn, value in historicalData]).encode()).hexdigest()
+
+
+def toNextWindow(historicalData: "list[tuple[str, float]]", newDataPoint: "tuple[str, float]", isAnomaly: bool, windowSize: int) -> "list[tuple[str, float]]":
+    # anomalies are not part of the history read, so only a normal point moves the window
+    if isAnomaly:
+        return list(historicalData)
+    return sorted(list(historicalData) + [newDataPoint])[-windowSize:]
+
+
+def _toDocument(forecast: ForecastDto) -> "dict[str, Any]":
+    # engines return numpy scalars, which cannot be stored as they are
+    document = {key: float(value) for key, value in asdict(forecast).items() if key != 'seasonalities'}
+    document['seasonalities'] = {name: [float(value) for value in values]
+                                 for name, values in forecast.seasonalities.items()}
+    return document
+
+
+def _toForecast(document: "dict[str, Any]") -> ForecastDto:
+    return ForecastDto(document['yhat'], document['yhatLower'], document['yhatUpper'], document['trend'], document['trendLower'], document['trendUpper'],
+                       {name: tuple(values) for name, values in document['seasonalities'].items()})
+
+
+def predict(forecastEngine: IForecastEngine, engineName: str, window: "list[tuple[str, float]]") -> "Union[dict[str, Any], None]":
+    """Forecasts the value at the expected time of the next execution, one median execution interval after the window."""
+    executedOn = pd.to_datetime(pd.Series([executedOn for executedOn, _ in window]))
+    interval = executedOn.diff().median()
+    if len(window) < 2 or not interval > pd.Timedelta(0):
+        return None
+
+    at = executedOn.iloc[-1] + interval
+    forecast = forecastEngine.forecast(pd.DataFrame(
+        {'ds': executedOn, 'y': [value for _, value in window]}), at)
+
+    return {'fingerprint': toWindowFingerprint(window), 'engine': engineName, 'at': at.isoformat(),
+            # an execution later than that missed the expected one, the forecast is outdated
+            'valid_until': (at + interval).isoformat(), 'forecast': _toDocument(forecast)}
+
+
+def toPrecomputedForecast(prediction: "Union[dict[str, Any], None]", engineName: str, historicalData: "list[tuple[str, float]]", executedOn: datetime) -> Union[ForecastDto, None]:
+    if not prediction or prediction.get('engine') != engineName or executedOn > datetime.fromisoformat(prediction['valid_until']):
+        return None
+    if prediction['fingerprint'] != toWindowFingerprint(historicalData):
+        return None
+    return _toForecast(prediction['forecast'])
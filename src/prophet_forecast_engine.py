@@ -0,0 +1,121 @@
+from typing import Any, Union
+import numpy as np
+import pandas as pd
+import prophet
+from prophet import Prophet
+from prophet.models import CmdStanPyBackend
+from i_forecast_engine import IForecastEngine, ForecastDto
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# init= only reaches the optimizer on releases whose backend sanitizes custom inits (newer than the pinned 1.1.1).
+# Elsewhere the fit would fail on every warm start, so it stays cold
+_SUPPORTS_WARM_START = hasattr(CmdStanPyBackend, 'sanitize_custom_inits')
+if not _SUPPORTS_WARM_START:
+    logger.info(f'Prophet {prophet.__version__} does not take init parameters, fits are not warm started')
+
+
+class ProphetForecastEngine(IForecastEngine):
+    _SEASONALITIES = ['daily', 'weekly', 'yearly']
+    # bump when the Prophet configuration below changes, parameters fitted by other versions are not reused
+    _MODEL_VERSION = 1
+
+    _warmStartParams: "Union[dict[str, Any], None]"
+    fittedParams: "Union[dict[str, Any], None]"
+    # how the last fit started: 'cold', 'warm' or 'fallback' (a warm start was tried and failed)
+    warmStart: "Union[str, None]"
+
+    def __init__(self, warmStartParams: "Union[dict[str, Any], None]" = None) -> None:
+        self._warmStartParams = warmStartParams
+        self.fittedParams = None
+        self.warmStart = None
+
+    @classmethod
+    def modelVersion(cls) -> str:
+        return f'{cls._MODEL_VERSION}:{prophet.__version__}'
+
+    def _buildModel(self) -> Prophet:
+        # m = Prophet(changepoint_prior_scale=0.1)
+        return Prophet()
+
+    @staticmethod
+    def _changepoints(ds: pd.Series) -> "list[pd.Timestamp]":
+        # same placement as Prophet: evenly spaced over the first 80% of the history, by index
+        histSize = int(np.floor(len(ds) * 0.8))
+        changepointCount = min(25, histSize - 1)
+        if changepointCount <= 0:
+            return []
+        return list(ds.iloc[np.linspace(0, histSize - 1, changepointCount + 1).round().astype(int)].iloc[1:])
+
+    @staticmethod
+    def _trendAt(params: "dict[str, Any]", t: np.ndarray) -> "tuple[np.ndarray, np.ndarray]":
+        changepoints = np.array(params['changepoints_t'])
+        delta = np.array(params['delta'])
+        active = t[:, None] >= changepoints[None, :]
+        slope = params['k'] + active @ delta
+        return slope * t + params['m'] + active @ (-changepoints * delta), slope
+
+    def _toInit(self, historicalData: pd.DataFrame) -> "Union[dict[str, Any], None]":
+        params = self._warmStartParams
+        if not _SUPPORTS_WARM_START or not params or params.get('version') != self.modelVersion():
+            return None
+
+        ds = pd.Series(pd.to_datetime(historicalData['ds'])).sort_values().reset_index(drop=True)
+        tScale = (ds.iloc[-1] - ds.iloc[0]).total_seconds()
+        yScale = float(np.abs(historicalData['y']).max()) or 1.0
+        if not tScale:
+            return None
+
+        # Prophet fits in scaled time and values, both move with the window. The previous trend is re-expressed
+        # in the scaling of the new window, with its slope changes moved onto the new changepoints
+        knots = [ds.iloc[0]] + self._changepoints(ds)
+        tPrevious = np.array([(knot - pd.Timestamp(params['start'])).total_seconds() for knot in knots]) / params['t_scale']
+        level, slope = self._trendAt(params, tPrevious)
+
+        yRatio = params['y_scale'] / yScale
+        slope = slope * yRatio * tScale / params['t_scale']
+
+        return {'k': float(slope[0]), 'm': float(level[0] * yRatio), 'sigma_obs': params['sigma_obs'] * yRatio,
+                'delta': np.diff(slope) if len(knots) > 1 else np.zeros(1), 'beta': np.array(params['beta']) * yRatio}
+
+    def _fit(self, historicalData: pd.DataFrame) -> Prophet:
+        init = self._toInit(historicalData)
+        if init is None:
+            self.warmStart = 'cold'
+            return self._buildModel().fit(historicalData)
+
+        try:
+            m = self._buildModel().fit(historicalData, init=init)
+            self.warmStart = 'warm'
+            return m
+        except Exception as e:
+            # e.g. a seasonality switched on since the last fit and the parameter shapes no longer match
+            logger.warning(f'Warm started fit failed, fitting from scratch: {type(e).__name__}: {e}')
+            self.warmStart = 'fallback'
+            return self._buildModel().fit(historicalData)
+
+    def _toFittedParams(self, m: Prophet) -> "dict[str, Any]":
+        return {'version': self.modelVersion(),
+                # kept with the parameters so that failing warm starts can be counted over the suite states
+                'warm_start': self.warmStart,
+                'k': float(m.params['k'][0][0]), 'm': float(m.params['m'][0][0]), 'sigma_obs': float(m.params['sigma_obs'][0][0]),
+                'delta': [float(value) for value in m.params['delta'][0]], 'beta': [float(value) for value in m.params['beta'][0]],
+                # scaling of the fitted window, needed to carry the parameters over to the next window
+                'start': m.start.isoformat(), 't_scale': m.t_scale.total_seconds(), 'y_scale': float(m.y_scale),
+                'changepoints_t': [float(value) for value in m.changepoints_t]}
+
+    def forecast(self, historicalData: pd.DataFrame, at: pd.Timestamp) -> ForecastDto:
+        m = self._fit(historicalData)
+        self.fittedParams = self._toFittedParams(m)
+
+        future = pd.DataFrame({'ds': pd.date_range(end=at, periods=1)})
+
+        forecast = m.predict(future)
+
+        seasonalities = {name: (forecast[name].values[0], forecast[f'{name}_lower'].values[0], forecast[f'{name}_upper'].values[0])
+                         for name in self._SEASONALITIES if name in forecast.columns}
+
+        return ForecastDto(forecast['yhat'].values[0], forecast['yhat_lower'].values[0], forecast['yhat_upper'].values[0],
+                           forecast['trend'].values[0], forecast['trend_lower'].values[0], forecast['trend_upper'].values[0], seasonalities)
@@ -1,5 +1,7 @@
 
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
+import hashlib
+import json
 from typing import Union
 
 
@@ -12,6 +14,29 @@ class ColumnDefinition:
     ordinalPosition: int
 
 
+@dataclass
+class SchemaSnapshot:
+    schemaHash: str
+    value: Union[str, None]
+    isStored: bool = True
+
+    def toSchema(self) -> "dict[str, ColumnDefinition]":
+        return fromSchemaJson(self.value)
+
+
+def toSchemaJson(schema: "dict[str, ColumnDefinition]") -> str:
+    # canonical form: equal schemas always serialise (and therefore hash) identically
+    return json.dumps({key: asdict(columnDefinition) for key, columnDefinition in schema.items()}, sort_keys=True, separators=(',', ':'))
+
+
+def fromSchemaJson(value: str) -> "dict[str, ColumnDefinition]":
+    return {key: ColumnDefinition(column['columnName'], column['dataType'], column['isIdentity'], column['isNullable'], column['ordinalPosition']) for key, column in json.loads(value).items()}
+
+
+def hashSchemaJson(value: str) -> str:
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
 @dataclass
 class SchemaDiff:
     column_name: "tuple[Union[str, None], Union[str, None]]"
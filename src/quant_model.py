@@ -2,11 +2,16 @@ from i_forced_threshold import ForcedThreshold, ForcedThresholdMode, ForcedThres
 from test_type import CustomTest, QuantColumnTest, QuantMatTest
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from enum import Enum
 import datetime
-from typing import Union
+from typing import Any, Union
+import numpy as np
 import pandas as pd
-from prophet import Prophet
 import math
+from i_forecast_engine import IForecastEngine, ForecastDto
+from prophet_forecast_engine import ProphetForecastEngine
+from numpy_forecast_engine import NumpyForecastEngine
+from window_statistics import WindowStatistics
 
 
 @dataclass
@@ -31,6 +36,12 @@ class _AnomalyResult:
     importance: float
 
 
+class ForecastSkipReason(Enum):
+    DEADLINE = 'deadline'
+    CLEARED = 'cleared'
+    ROUTED = 'routed'
+
+
 @dataclass
 class ResultDto:
     meanAbsoluteDeviation: Union[float, None]
@@ -45,6 +56,29 @@ class ResultDto:
 
     anomaly: Union[_AnomalyResult, None]
 
+    forecastSkipReason: Union[ForecastSkipReason, None] = None
+
+
+_forecastEngines = {'prophet': ProphetForecastEngine, 'numpy': NumpyForecastEngine}
+
+
+def buildForecastEngine(name: str, warmStartParams: "Union[dict[str, Any], None]" = None) -> IForecastEngine:
+    if name not in _forecastEngines:
+        raise Exception(f'Unknown forecast engine {name}')
+    # only Prophet runs an optimizer that can be warm started
+    return ProphetForecastEngine(warmStartParams) if name == 'prophet' else _forecastEngines[name]()
+
+
+# series routed past the forecast are flat, their z-score bounds (nearly) collapse onto the median. The bounds are kept
+# at least this share of the median apart from it, about the width they have at the series router's low variance boundary
+_ROUTED_MIN_BAND_RATIO = 0.01
+# a median of 0 leaves no share to keep, so the band never gets narrower than a floor in the unit of the test type. Rates
+# (0..1) get a tenth of a percentage point, counts and minutes half a unit. Distribution and custom values have no known
+# scale, their floor only keeps the bounds from collapsing
+_ROUTED_MIN_BAND_FLOOR_RATE = 0.001
+_ROUTED_MIN_BAND_FLOOR_COUNT = 0.5
+_ROUTED_MIN_BAND_FLOOR_UNSCALED = 1e-6
+
 
 def _closestValue(arr: "list[float]", x: float) -> float:
     if (not len(arr)):
@@ -60,36 +94,26 @@ def _adjustValue(value: float, testType: Union[QuantMatTest, QuantColumnTest, Cu
     return value if testType == CustomTest.CustomTest or testType == CustomTest.CustomTest.value or testType == QuantColumnTest.ColumnDistribution or testType == QuantColumnTest.ColumnDistribution.value or testType == QuantColumnTest.ColumnFreshness or testType == QuantColumnTest.ColumnFreshness.value or value > 0 else 0
 
 
+def _minimumBandFloor(testType: Union[QuantMatTest, QuantColumnTest, CustomTest]) -> float:
+    testTypeValue = testType.value if isinstance(testType, Enum) else testType
+    if testTypeValue in (QuantColumnTest.ColumnUniqueness.value, QuantColumnTest.ColumnNullness.value):
+        return _ROUTED_MIN_BAND_FLOOR_RATE
+    if testTypeValue in (QuantColumnTest.ColumnDistribution.value, CustomTest.CustomTest.value):
+        return _ROUTED_MIN_BAND_FLOOR_UNSCALED
+    return _ROUTED_MIN_BAND_FLOOR_COUNT
+
+
 class _Analysis(ABC):
-    _newDataPoint: pd.DataFrame
-    _historicalData: pd.DataFrame
     _testType: Union[QuantMatTest, QuantColumnTest, CustomTest]
     _forcedLowerThreshold: "Union[ForcedThreshold, None]"
     _forcedUpperThreshold: "Union[ForcedThreshold, None]"
 
     @abstractmethod
     def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]") -> None:
-        self._newDataPoint = self._buildNewDataPointFrame(newDataPoint)
-        self._historicalData = self._buildHistoricalDF(historicalData)
         self._testType = testType
         self._forcedLowerThreshold = forcedLowerThreshold
         self._forcedUpperThreshold = forcedUpperThreshold
 
-    def _buildNewDataPointFrame(self, newDataPoint: "tuple[str, float]") -> pd.DataFrame:
-        return pd.DataFrame({'ds': pd.Series([newDataPoint[0]]), 'y': pd.Series([newDataPoint[1]])})
-
-    def _buildHistoricalDF(self, historicalData: "list[tuple[str, float]]") -> pd.DataFrame:
-        executedAt = []
-        values = []
-
-        for el in historicalData:
-            executedAt.append(el[0])
-            values.append(el[1])
-
-        frame = {'ds': pd.Series(executedAt), 'y': pd.Series(values)}
-
-        return pd.DataFrame(frame)
-
     @abstractmethod
     def _runAnomalyCheck(self):
         return
@@ -100,6 +124,11 @@ class _Analysis(ABC):
 
 
 class _ZScoreAnalysis(_Analysis):
+    # plain float arrays, the z-score statistics do not need timestamps
+    _newValue: Union[float, None]
+    _historicalValues: np.ndarray
+    # maintained incrementally over the same values, if available
+    _statistics: Union[WindowStatistics, None]
     _median: float
     _medianAbsoluteDeviation: float
     _meanAbsoluteDeviation: Union[float, None]
@@ -109,26 +138,34 @@ class _ZScoreAnalysis(_Analysis):
     _modifiedZScoreThresholdUpper: Union[float, None]
     _modifiedZScoreThresholdLower: Union[float, None]
 
-    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", ) -> None:
+    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", statistics: Union[WindowStatistics, None] = None) -> None:
         super().__init__(newDataPoint, historicalData, testType,
                          forcedLowerThreshold, forcedUpperThreshold)
+        self._newValue = newDataPoint[1]
+        self._statistics = statistics
+        historicalValues = np.fromiter(
+            (el[1] for el in historicalData), dtype=float, count=len(historicalData))
+        # missing values (None becomes nan) are skipped, as the pandas statistics did (they kept infinite values)
+        self._historicalValues = historicalValues[~np.isnan(historicalValues)]
         self._modifiedZScoreThresholdUpper = 8 if self._testType == QuantColumnTest.ColumnNullness or self._testType == QuantColumnTest.ColumnNullness.value \
             or self._testType == QuantColumnTest.ColumnUniqueness or self._testType == QuantColumnTest.ColumnUniqueness.value else 6
         self._modifiedZScoreThresholdLower = -8 if self._testType == QuantColumnTest.ColumnNullness or self._testType == QuantColumnTest.ColumnNullness.value \
             or self._testType == QuantColumnTest.ColumnUniqueness or self._testType == QuantColumnTest.ColumnUniqueness.value else -6
 
-    def _absoluteDeviation(self, x) -> float:
-        return abs(x - self._median)
-
     def _calculateMedianAbsoluteDeviation(self) -> float:
-        values = pd.Series(self._historicalData['y'])
-        self._median = float(values.median())
-        absoluteDeviation = values.apply(self._absoluteDeviation)
-        return float(absoluteDeviation.median())
+        if self._statistics is not None:
+            self._median = self._statistics.median()
+            return self._statistics.medianAbsoluteDeviation()
+
+        self._median = float(np.median(self._historicalValues))
+        return float(np.median(np.abs(self._historicalValues - self._median)))
 
     def _mad(self):
-        values = pd.Series(self._historicalData['y'])
-        return (values - values.mean()).abs().mean()
+        if self._statistics is not None:
+            return self._statistics.meanAbsoluteDeviation()
+        # an infinite value deviates by nan from an infinite mean, pandas skipped those deviations
+        with np.errstate(invalid='ignore'):
+            return np.nanmean(np.abs(self._historicalValues - self._historicalValues.mean()))
 
     def _calculateModifiedZScore(self, y: float) -> Union[float, None]:
         # https://www.ibm.com/docs/en/cognos-analytics/11.1.0?topic=terms-modified-z-score
@@ -136,7 +173,6 @@ class _ZScoreAnalysis(_Analysis):
         if self._medianAbsoluteDeviation == 0 and self._meanAbsoluteDeviation == 0:
             return None
         if self._medianAbsoluteDeviation == 0:
-            self._meanAbsoluteDeviation = self._mad()
             return (y - self._median)/(1.253314*self._meanAbsoluteDeviation)
         return (y - self._median)/(1.486*self._medianAbsoluteDeviation)
 
@@ -151,7 +187,7 @@ class _ZScoreAnalysis(_Analysis):
         return (1.253314*self._meanAbsoluteDeviation)*zScoreBoundary + self._median
 
     def _runAnomalyCheck(self, newMZScore: Union[float, None]) -> _AnalysisResult:
-        y = self._newDataPoint['y'].values[0]
+        y = self._newValue
 
         if y == None:
             raise Exception(
@@ -171,7 +207,7 @@ class _ZScoreAnalysis(_Analysis):
         return _AnalysisResult(self._expectedValue, self._expectedValueUpper, self._expectedValueLower, deviation, isAnomaly)
 
     def _calculateNewModifiedZScore(self) -> Union[float, None]:
-        y = self._newDataPoint['y'].values[0]
+        y = self._newValue
 
         if y == None:
             raise Exception(
@@ -250,6 +286,8 @@ class _ZScoreAnalysis(_Analysis):
 
 
 class _ForecastAnalysis(_Analysis):
+    _newDataPoint: pd.DataFrame
+    _historicalData: pd.DataFrame
     _yhat: float
     _yhat_lower: float
     _yhat_upper: float
@@ -266,9 +304,29 @@ class _ForecastAnalysis(_Analysis):
     _yearly_lower: Union[float, None]
     _yearly_upper: Union[float, None]
 
-    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]") -> None:
+    _engine: IForecastEngine
+
+    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", engine: IForecastEngine) -> None:
         super().__init__(newDataPoint, historicalData,
                          testType, forcedLowerThreshold, forcedUpperThreshold)
+        self._newDataPoint = self._buildNewDataPointFrame(newDataPoint)
+        self._historicalData = self._buildHistoricalDF(historicalData)
+        self._engine = engine
+
+    def _buildNewDataPointFrame(self, newDataPoint: "tuple[str, float]") -> pd.DataFrame:
+        return pd.DataFrame({'ds': pd.Series([newDataPoint[0]]), 'y': pd.Series([newDataPoint[1]])})
+
+    def _buildHistoricalDF(self, historicalData: "list[tuple[str, float]]") -> pd.DataFrame:
+        executedAt = []
+        values = []
+
+        for el in historicalData:
+            executedAt.append(el[0])
+            values.append(el[1])
+
+        frame = {'ds': pd.Series(executedAt), 'y': pd.Series(values)}
+
+        return pd.DataFrame(frame)
 
     def _runAnomalyCheck(self) -> _AnalysisResult:
         y = self._newDataPoint['y'].values[0]
@@ -316,48 +374,26 @@ class _ForecastAnalysis(_Analysis):
 
         return _AnalysisResult(expectedValue, upperBound, lowerBound, deviation, isAnomaly)
 
+    def _seasonality(self, forecast: ForecastDto, name: str) -> "tuple[Union[float, None], Union[float, None], Union[float, None]]":
+        if name not in forecast.seasonalities:
+            return None, None, None
+        return tuple(_adjustValue(value, self._testType) for value in forecast.seasonalities[name])
+
     def analyze(self) -> _AnalysisResult:
-        # m = Prophet(changepoint_prior_scale=0.1)
-        m = Prophet()
-        m.fit(self._historicalData)
-
-        dates = pd.date_range(
-            end=pd.Timestamp.now(),
-            periods=1,
-        )
-
-        future = pd.DataFrame({'ds': dates})
-
-        forecast = m.predict(future)
-
-        self._yhat = _adjustValue(forecast['yhat'].values[0], self._testType)
-        self._yhat_lower = _adjustValue(
-            forecast['yhat_lower'].values[0], self._testType)
-        self._yhat_upper = _adjustValue(
-            forecast['yhat_upper'].values[0], self._testType)
-        self._trend = _adjustValue(forecast['trend'].values[0], self._testType)
-        self._trend_lower = _adjustValue(
-            forecast['trend_lower'].values[0], self._testType)
-        self._trend_upper = _adjustValue(
-            forecast['trend_upper'].values[0], self._testType)
-        self._daily = _adjustValue(
-            forecast['daily'].values[0], self._testType) if 'daily' in forecast.columns else None
-        self._daily_lower = _adjustValue(
-            forecast['daily_lower'].values[0], self._testType) if 'daily_lower' in forecast.columns else None
-        self._daily_upper = _adjustValue(
-            forecast['daily_upper'].values[0], self._testType) if 'daily_upper' in forecast.columns else None
-        self._weekly = _adjustValue(
-            forecast['weekly'].values[0], self._testType) if 'weekly' in forecast.columns else None
-        self._weekly_lower = _adjustValue(
-            forecast['weekly_lower'].values[0], self._testType) if 'weekly_lower' in forecast.columns else None
-        self._weekly_upper = _adjustValue(
-            forecast['weekly_upper'].values[0], self._testType) if 'weekly_upper' in forecast.columns else None
-        self._yearly = _adjustValue(
-            forecast['yearly'].values[0], self._testType) if 'yearly' in forecast.columns else None
-        self._yearly_lower = _adjustValue(
-            forecast['yearly_lower'].values[0], self._testType) if 'yearly_lower' in forecast.columns else None
-        self._yearly_upper = _adjustValue(
-            forecast['yearly_upper'].values[0], self._testType) if 'yearly_upper' in forecast.columns else None
+        forecast = self._engine.forecast(self._historicalData, pd.Timestamp.now())
+
+        self._yhat = _adjustValue(forecast.yhat, self._testType)
+        self._yhat_lower = _adjustValue(forecast.yhatLower, self._testType)
+        self._yhat_upper = _adjustValue(forecast.yhatUpper, self._testType)
+        self._trend = _adjustValue(forecast.trend, self._testType)
+        self._trend_lower = _adjustValue(forecast.trendLower, self._testType)
+        self._trend_upper = _adjustValue(forecast.trendUpper, self._testType)
+        self._daily, self._daily_lower, self._daily_upper = self._seasonality(
+            forecast, 'daily')
+        self._weekly, self._weekly_lower, self._weekly_upper = self._seasonality(
+            forecast, 'weekly')
+        self._yearly, self._yearly_lower, self._yearly_upper = self._seasonality(
+            forecast, 'yearly')
 
         anomalyCheckResult = self._runAnomalyCheck()
 
@@ -371,15 +407,19 @@ class _QuantModel(ABC):
     _forecastAnalysis: _ForecastAnalysis
 
     _testType: Union[QuantMatTest, QuantColumnTest, CustomTest]
+    _forcedLowerThreshold: "Union[ForcedThreshold, None]"
+    _forcedUpperThreshold: "Union[ForcedThreshold, None]"
 
     @ abstractmethod
-    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", ) -> None:
+    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]",  testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", forecastEngine: Union[IForecastEngine, None] = None, statistics: Union[WindowStatistics, None] = None) -> None:
         self._zScoreAnalysis = _ZScoreAnalysis(
-            newDataPoint, historicalData,  testType, forcedLowerThreshold, forcedUpperThreshold)
+            newDataPoint, historicalData,  testType, forcedLowerThreshold, forcedUpperThreshold, statistics)
         self._forecastAnalysis = _ForecastAnalysis(
-            newDataPoint, historicalData,  testType, forcedLowerThreshold, forcedUpperThreshold)
+            newDataPoint, historicalData,  testType, forcedLowerThreshold, forcedUpperThreshold, forecastEngine if forecastEngine else ProphetForecastEngine())
         self._newDataPoint = newDataPoint
         self._testType = testType
+        self._forcedLowerThreshold = forcedLowerThreshold
+        self._forcedUpperThreshold = forcedUpperThreshold
 
     @ staticmethod
     def _calcAnomalyImportance(y: float, lower: float, upper: float) -> float:
@@ -389,12 +429,51 @@ class _QuantModel(ABC):
         if yAbsoluteBoundaryDistance == 0 and boundsIntervalAbsolute == 0:
             raise Exception(
                 'Detected unusual bounds and y value. Cannot calculate importance')
+        # collapsed bounds give an infinite importance, as in the batch analysis
+        if boundsIntervalAbsolute == 0:
+            return math.inf
         importance = yAbsoluteBoundaryDistance / \
             boundsIntervalAbsolute
         return importance
 
-    def run(self) -> ResultDto:
+    def _widenToMinimumBand(self, zScoreAnalysisResult: _ZScoreResult):
+        # forced thresholds are kept as they are
+        band = max(_ROUTED_MIN_BAND_RATIO * abs(zScoreAnalysisResult.median), _minimumBandFloor(self._testType))
+        if self._forcedLowerThreshold is None:
+            zScoreAnalysisResult.expectedValueLower = min(zScoreAnalysisResult.expectedValueLower, _adjustValue(
+                zScoreAnalysisResult.median - band, self._testType))
+        if self._forcedUpperThreshold is None:
+            zScoreAnalysisResult.expectedValueUpper = max(zScoreAnalysisResult.expectedValueUpper, _adjustValue(
+                zScoreAnalysisResult.median + band, self._testType))
+
+    def _buildZScoreResult(self, zScoreAnalysisResult: _ZScoreResult, forecastSkipReason: ForecastSkipReason) -> ResultDto:
+        y = self._newDataPoint[1]
+
+        if forecastSkipReason == ForecastSkipReason.ROUTED:
+            self._widenToMinimumBand(zScoreAnalysisResult)
+
+        isAnomaly = bool(zScoreAnalysisResult.isAnomaly and (
+            y < zScoreAnalysisResult.expectedValueLower or y > zScoreAnalysisResult.expectedValueUpper))
+
+        anomaly = None
+        if (isAnomaly):
+            importance = self._calcAnomalyImportance(
+                y, zScoreAnalysisResult.expectedValueLower, zScoreAnalysisResult.expectedValueUpper)
+
+            anomaly = _AnomalyResult(importance)
+
+        return ResultDto(zScoreAnalysisResult.meanAbsoluteDeviation, zScoreAnalysisResult.medianAbsoluteDeviation, zScoreAnalysisResult.modifiedZScore, zScoreAnalysisResult.expectedValue, zScoreAnalysisResult.expectedValueUpper, zScoreAnalysisResult.expectedValueLower, zScoreAnalysisResult.deviation, anomaly, forecastSkipReason)
+
+    def run(self, forecastSkipReason: Union[ForecastSkipReason, None] = None, lazy: bool = False) -> ResultDto:
         zScoreAnalysisResult = self._zScoreAnalysis.analyze()
+
+        if forecastSkipReason:
+            return self._buildZScoreResult(zScoreAnalysisResult, forecastSkipReason)
+
+        # an anomaly needs both analyses to flag the point, so a point cleared by the z-score stays normal whatever the forecast says
+        if lazy and not zScoreAnalysisResult.isAnomaly:
+            return self._buildZScoreResult(zScoreAnalysisResult, ForecastSkipReason.CLEARED)
+
         forecastAnalysisResult = self._forecastAnalysis.analyze()
 
         expectedValueLower = zScoreAnalysisResult.expectedValueLower if zScoreAnalysisResult.expectedValueLower < forecastAnalysisResult.expectedValueLower else forecastAnalysisResult.expectedValueLower
@@ -421,6 +500,160 @@ class _QuantModel(ABC):
 
 
 class CommonModel(_QuantModel):
-    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]") -> None:
+    def __init__(self, newDataPoint: "tuple[str, float]", historicalData: "list[tuple[str, float]]", testType: Union[QuantMatTest, QuantColumnTest, CustomTest], forcedLowerThreshold: "Union[ForcedThreshold, None]", forcedUpperThreshold: "Union[ForcedThreshold, None]", forecastEngine: Union[IForecastEngine, None] = None, statistics: Union[WindowStatistics, None] = None) -> None:
         super().__init__(newDataPoint, historicalData,
-                         testType, forcedLowerThreshold, forcedUpperThreshold)
+                         testType, forcedLowerThreshold, forcedUpperThreshold, forecastEngine, statistics)
+
+
+class BatchModel:
+    """Scores the z-score analysis of many suites in vectorized passes.
+
+    Histories are passed as a padded matrix (one row per suite) plus the number of valid values per row.
+    The results equal CommonModel(...).run(forecastSkipReason) of each suite. Suites flagged by needsForecast
+    have to run the single suite path if their forecast is to be fitted.
+    """
+
+    _historicalValues: np.ndarray
+    _lengths: np.ndarray
+    _newValues: np.ndarray
+    _testTypes: "list[Union[QuantMatTest, QuantColumnTest, CustomTest]]"
+    _forcedLowerThresholds: "list[Union[ForcedThreshold, None]]"
+    _forcedUpperThresholds: "list[Union[ForcedThreshold, None]]"
+
+    _median: np.ndarray
+    _medianAbsoluteDeviation: np.ndarray
+    _meanAbsoluteDeviation: np.ndarray
+    _isZScoreAnomaly: Union[np.ndarray, None]
+
+    def __init__(self, historicalValues: np.ndarray, lengths: np.ndarray, newValues: "list[float]", testTypes: "list[Union[QuantMatTest, QuantColumnTest, CustomTest]]", forcedLowerThresholds: "list[Union[ForcedThreshold, None]]", forcedUpperThresholds: "list[Union[ForcedThreshold, None]]") -> None:
+        if any(value is None for value in newValues):
+            raise Exception(
+                'Cannot run anomaly check. New data value not found')
+
+        historicalValues = np.asarray(historicalValues, dtype=float)
+        # missing values are skipped as in the single suite analysis, the remaining values of a row are moved to its front
+        isValid = ~np.isnan(historicalValues) & (np.arange(historicalValues.shape[1]) < np.asarray(lengths, dtype=int)[:, None])
+        order = np.argsort(~isValid, axis=1, kind='stable')
+        self._historicalValues = np.take_along_axis(historicalValues, order, axis=1)
+        self._lengths = isValid.sum(axis=1)
+        self._newValues = np.asarray(newValues, dtype=float)
+        self._testTypes = testTypes
+        self._forcedLowerThresholds = forcedLowerThresholds
+        self._forcedUpperThresholds = forcedUpperThresholds
+        self._isZScoreAnomaly = None
+
+    def _calculateStatistics(self):
+        size = len(self._lengths)
+        self._median = np.empty(size)
+        self._medianAbsoluteDeviation = np.empty(size)
+        self._meanAbsoluteDeviation = np.empty(size)
+
+        # rows of equal length are reduced together, so every suite sees the summation order of its single suite analysis
+        for length in np.unique(self._lengths):
+            rows = np.flatnonzero(self._lengths == length)
+            values = np.ascontiguousarray(self._historicalValues[rows, :length])
+
+            median = np.median(values, axis=1)
+            self._median[rows] = median
+            self._medianAbsoluteDeviation[rows] = np.median(
+                np.abs(values - median[:, None]), axis=1)
+            with np.errstate(invalid='ignore'):
+                self._meanAbsoluteDeviation[rows] = np.nanmean(
+                    np.abs(values - values.mean(axis=1)[:, None]), axis=1)
+
+    def _calculateModifiedZScore(self, y: np.ndarray) -> np.ndarray:
+        # nan where the single suite analysis returns None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            modifiedZScore = np.where(self._medianAbsoluteDeviation == 0, (y - self._median)/(
+                1.253314*self._meanAbsoluteDeviation), (y - self._median)/(1.486*self._medianAbsoluteDeviation))
+        return np.where((self._medianAbsoluteDeviation == 0) & (self._meanAbsoluteDeviation == 0), np.nan, modifiedZScore)
+
+    def _calculateBound(self, zScoreBoundary: np.ndarray) -> np.ndarray:
+        return np.where(self._medianAbsoluteDeviation != 0, (1.486*self._medianAbsoluteDeviation)*zScoreBoundary + self._median,
+                        (1.253314*self._meanAbsoluteDeviation)*zScoreBoundary + self._median)
+
+    def _adjustValues(self, values: np.ndarray) -> np.ndarray:
+        isPassThrough = np.array([_adjustValue(-1, testType) == -1 for testType in self._testTypes], dtype=bool)
+        return np.where(isPassThrough | (values > 0), values, 0)
+
+    def _toThresholdArrays(self, forcedThresholds: "list[Union[ForcedThreshold, None]]") -> "tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]":
+        isAbsolute = np.array([forcedThreshold is not None and forcedThreshold.mode == ForcedThresholdMode.ABSOLUTE for forcedThreshold in forcedThresholds], dtype=bool)
+        isRelative = np.array([forcedThreshold is not None and forcedThreshold.mode == ForcedThresholdMode.RELATIVE for forcedThreshold in forcedThresholds], dtype=bool)
+        isFeedback = np.array([forcedThreshold is not None and forcedThreshold.type == ForcedThresholdType.FEEDBACK for forcedThreshold in forcedThresholds], dtype=bool)
+        values = np.array([forcedThreshold.value if forcedThreshold is not None else np.nan for forcedThreshold in forcedThresholds], dtype=float)
+        return isAbsolute, isRelative, isFeedback, values
+
+    def _calculateThreshold(self, forcedThresholds: "list[Union[ForcedThreshold, None]]", defaultZScore: np.ndarray, expectedValue: np.ndarray, isUpper: bool) -> "tuple[np.ndarray, np.ndarray]":
+        isAbsolute, isRelative, isFeedback, values = self._toThresholdArrays(forcedThresholds)
+
+        # absolute: the threshold itself, feedback thresholds are widened by one z-score and 1%
+        absoluteZScore = self._calculateModifiedZScore(values)
+        absoluteZScore = np.where(isFeedback, absoluteZScore + 1 if isUpper else absoluteZScore - 1, absoluteZScore)
+        widening, narrowing = (1.01, .99) if isUpper else (.99, 1.01)
+        absoluteBound = np.where(isFeedback & (values > 0), values * widening,
+                                 np.where(isFeedback & (values < 0), values * narrowing, values))
+
+        relativeBound = self._median * values
+        relativeZScore = self._calculateModifiedZScore(relativeBound)
+
+        calculatedBound = self._calculateBound(defaultZScore)
+        defaultBound = self._adjustValues(np.where(np.isnan(calculatedBound) | (calculatedBound == 0), expectedValue, calculatedBound))
+
+        zScore = np.where(isAbsolute, absoluteZScore, np.where(isRelative, relativeZScore, defaultZScore))
+        bound = np.where(isAbsolute, absoluteBound, np.where(isRelative, relativeBound, defaultBound))
+        return zScore, bound
+
+    def _widenToMinimumBand(self, expectedValueLower: np.ndarray, expectedValueUpper: np.ndarray) -> "tuple[np.ndarray, np.ndarray]":
+        floor = np.array([_minimumBandFloor(testType) for testType in self._testTypes], dtype=float)
+        band = np.maximum(_ROUTED_MIN_BAND_RATIO * np.abs(self._median), floor)
+        isForcedLower = np.array([forcedThreshold is not None for forcedThreshold in self._forcedLowerThresholds], dtype=bool)
+        isForcedUpper = np.array([forcedThreshold is not None for forcedThreshold in self._forcedUpperThresholds], dtype=bool)
+        return (np.where(isForcedLower, expectedValueLower, np.minimum(expectedValueLower, self._adjustValues(self._median - band))),
+                np.where(isForcedUpper, expectedValueUpper, np.maximum(expectedValueUpper, self._adjustValues(self._median + band))))
+
+    def needsForecast(self) -> np.ndarray:
+        """Suites the z-score analysis flags. Only their forecast can still turn them into anomalies."""
+        if self._isZScoreAnomaly is None:
+            self.run(ForecastSkipReason.CLEARED)
+        return self._isZScoreAnomaly
+
+    def run(self, forecastSkipReason: ForecastSkipReason) -> "list[ResultDto]":
+        self._calculateStatistics()
+        y = self._newValues
+
+        expectedValue = self._adjustValues(self._median)
+
+        isWideThreshold = np.array([testType in (QuantColumnTest.ColumnNullness, QuantColumnTest.ColumnNullness.value, QuantColumnTest.ColumnUniqueness, QuantColumnTest.ColumnUniqueness.value)
+                                    for testType in self._testTypes], dtype=bool)
+        zScoreLower, expectedValueLower = self._calculateThreshold(
+            self._forcedLowerThresholds, np.where(isWideThreshold, -8.0, -6.0), expectedValue, False)
+        zScoreUpper, expectedValueUpper = self._calculateThreshold(
+            self._forcedUpperThresholds, np.where(isWideThreshold, 8.0, 6.0), expectedValue, True)
+
+        modifiedZScore = self._calculateModifiedZScore(y)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            deviation = np.where(expectedValue > 0, y / expectedValue - 1, 0)
+
+        isOutOfBounds = (y > expectedValueUpper) | (y < expectedValueLower)
+        hasZScore = ~(np.isnan(modifiedZScore) | np.isnan(zScoreUpper) | np.isnan(zScoreLower))
+        self._isZScoreAnomaly = np.where(hasZScore, (modifiedZScore > zScoreUpper) | (modifiedZScore < zScoreLower), isOutOfBounds)
+
+        if forecastSkipReason == ForecastSkipReason.ROUTED:
+            expectedValueLower, expectedValueUpper = self._widenToMinimumBand(expectedValueLower, expectedValueUpper)
+        isAnomaly = self._isZScoreAnomaly & ((y < expectedValueLower) | (y > expectedValueUpper))
+
+        boundsIntervalAbsolute = expectedValueUpper - expectedValueLower
+        yAbsoluteBoundaryDistance = np.where(y > expectedValueUpper, y - expectedValueUpper, expectedValueLower - y)
+        if np.any(isAnomaly & (yAbsoluteBoundaryDistance == 0) & (boundsIntervalAbsolute == 0)):
+            raise Exception(
+                'Detected unusual bounds and y value. Cannot calculate importance')
+        # collapsed bounds give an infinite importance instead of failing the whole batch
+        with np.errstate(divide='ignore', invalid='ignore'):
+            importance = yAbsoluteBoundaryDistance / boundsIntervalAbsolute
+
+        return [ResultDto(meanAbsoluteDeviation, medianAbsoluteDeviation, None if math.isnan(suiteModifiedZScore) else suiteModifiedZScore,
+                          suiteExpectedValue, upper, lower, suiteDeviation, _AnomalyResult(suiteImportance) if suiteIsAnomaly else None, forecastSkipReason)
+                for meanAbsoluteDeviation, medianAbsoluteDeviation, suiteModifiedZScore, suiteExpectedValue, upper, lower, suiteDeviation, suiteIsAnomaly, suiteImportance
+                in zip(self._meanAbsoluteDeviation.tolist(), self._medianAbsoluteDeviation.tolist(), modifiedZScore.tolist(), expectedValue.tolist(), expectedValueUpper.tolist(),
+                       expectedValueLower.tolist(), deviation.tolist(), isAnomaly.tolist(), importance.tolist())]
@@ -15,6 +15,7 @@ logger.setLevel(logging.INFO)
 class QuerySnowflakeRequestDto:
     query: str
     targetOrgId: Union[str, None]
+    timeout: Union[float, None] = None
 
 
 @dataclass
@@ -33,7 +34,17 @@ class QuerySnowflake(IUseCase):
     def execute(self, request: QuerySnowflakeRequestDto, auth: QuerySnowflakeAuthDto) -> QuerySnowflakeResponseDto:
         try:
             querySnowflakeResponse = self._integrationApiRepo.querySnowflake(
-                request.query, auth.jwt, request.targetOrgId)
+                request.query, auth.jwt, request.targetOrgId, request.timeout)
+
+            return Result.ok(querySnowflakeResponse)
+        except Exception as e:
+            logger.exception(f'error: {e}' if e.args[0] else f'error: unknown')
+            return Result.fail('')
+
+    async def executeAsync(self, request: QuerySnowflakeRequestDto, auth: QuerySnowflakeAuthDto) -> QuerySnowflakeResponseDto:
+        try:
+            querySnowflakeResponse = await self._integrationApiRepo.querySnowflakeAsync(
+                request.query, auth.jwt, request.targetOrgId, request.timeout)
 
             return Result.ok(querySnowflakeResponse)
         except Exception as e:
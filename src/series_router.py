@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Union
+import numpy as np
+import pandas as pd
+from numpy_forecast_engine import theilSen
+
+# The class of a suite's series is cached in its suite state document and recomputed once it is older than the ttl:
+# { series_class: { value, classified_on } }
+
+
+class SeriesClass(Enum):
+    CONSTANT = 'constant'
+    LOW_VARIANCE = 'low_variance'
+    TRENDING = 'trending'
+    SEASONAL = 'seasonal'
+    # none of the above, e.g. noisy or with level shifts
+    IRREGULAR = 'irregular'
+
+
+@dataclass
+class ModelRoute:
+    seriesClass: Union[SeriesClass, None]
+    # None if the forecast analysis is skipped
+    forecastEngine: Union[str, None]
+
+
+# robust spread relative to the level below which a forecast cannot tighten the z-score bounds any further
+_LOW_VARIANCE_RATIO = 0.001
+# a trend over the window this many times the residual spread is more than noise
+_TREND_RATIO = 2.0
+# share of the detrended variance a seasonal profile has to explain
+_SEASONAL_STRENGTH = 0.5
+_SEASONALITIES = [('weekly', 7.0), ('daily', 1.0)]
+
+_cheapForecastEngine = 'numpy'
+
+
+def _robustScale(values: np.ndarray) -> float:
+    return 1.4826 * float(np.median(np.abs(values - np.median(values))))
+
+
+def _seasonalStrength(timestamps: pd.DatetimeIndex, t: np.ndarray, residuals: np.ndarray) -> float:
+    variance = float(np.var(residuals))
+    if variance == 0:
+        return 0.0
+
+    strength = 0.0
+    for name, period in _SEASONALITIES:
+        # same requirement as the forecast engines have: two full periods and more than one point per half period
+        if t[-1] - t[0] < 2 * period or np.median(np.diff(t)) >= period / 2:
+            continue
+
+        phases = np.asarray(timestamps.dayofweek if name == 'weekly' else timestamps.hour)
+        fitted = np.zeros(len(t))
+        for phase in np.unique(phases):
+            samePhase = phases == phase
+            if samePhase.sum() >= 2:
+                fitted[samePhase] = np.median(residuals[samePhase])
+        strength = max(strength, 1 - float(np.var(residuals - fitted)) / variance)
+    return strength
+
+
+def classifySeries(historicalData: "list[tuple[str, float]]") -> SeriesClass:
+    values = np.array([value for _, value in historicalData], dtype=float)
+    if len(values) < 3 or values.min() == values.max():
+        return SeriesClass.CONSTANT
+
+    median = float(np.median(values))
+    if median != 0 and _robustScale(values) / abs(median) < _LOW_VARIANCE_RATIO:
+        return SeriesClass.LOW_VARIANCE
+
+    timestamps = pd.DatetimeIndex(pd.to_datetime([executedOn for executedOn, _ in historicalData]))
+    t = np.asarray((timestamps - timestamps[0]) / pd.Timedelta(days=1), dtype=float)
+    slope, intercept = theilSen(t, values)
+    residuals = values - (intercept + slope * t)
+
+    if _seasonalStrength(timestamps, t, residuals) >= _SEASONAL_STRENGTH:
+        return SeriesClass.SEASONAL
+    if abs(slope) * (t[-1] - t[0]) > _TREND_RATIO * _robustScale(residuals):
+        return SeriesClass.TRENDING
+    return SeriesClass.IRREGULAR
+
+
+def toSeriesClassDocument(seriesClass: SeriesClass, classifiedOn: datetime) -> "dict[str, Any]":
+    return {'value': seriesClass.value, 'classified_on': classifiedOn.isoformat()}
+
+
+def fromSeriesClassDocument(document: "Union[dict[str, Any], None]", now: datetime, ttlHours: float) -> Union[SeriesClass, None]:
+    if not document or now - datetime.fromisoformat(document['classified_on']) > timedelta(hours=ttlHours):
+        return None
+    return SeriesClass(document['value'])
+
+
+def routeModel(seriesClass: SeriesClass, configuredForecastEngine: str, suiteForecastEngine: Union[str, None]) -> ModelRoute:
+    # flat series gain nothing from a forecast, the z-score analysis alone decides
+    if seriesClass in (SeriesClass.CONSTANT, SeriesClass.LOW_VARIANCE):
+        return ModelRoute(seriesClass, None)
+    # an engine chosen for the suite is kept
+    if suiteForecastEngine:
+        return ModelRoute(seriesClass, suiteForecastEngine)
+    # a robust linear trend captures a trending series, only seasonal and irregular ones need the configured forecaster
+    if seriesClass == SeriesClass.TRENDING:
+        return ModelRoute(seriesClass, _cheapForecastEngine)
+    return ModelRoute(seriesClass, configuredForecastEngine)
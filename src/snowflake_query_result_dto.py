@@ -1,7 +1,23 @@
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Union
+
+
+@dataclass
+class SnowflakeQueryMetadataDto:
+  queryId: Union[str, None]
+  warehouse: Union[str, None]
+  elapsedMs: Union[float, None]
+  rowsScanned: Union[int, None]
+  bytesScanned: Union[int, None]
 
 
 @dataclass
 class SnowflakeQueryResultDto:
-  content: Any
\ No newline at end of file
+  content: Any
+  metadata: Union[SnowflakeQueryMetadataDto, None] = None
+
+
+def buildSnowflakeQueryMetadata(payload: Union["dict[str, Any]", None]) -> Union[SnowflakeQueryMetadataDto, None]:
+  if not payload:
+    return None
+  return SnowflakeQueryMetadataDto(payload.get('queryId'), payload.get('warehouse'), payload.get('elapsedMs'), payload.get('rowsScanned'), payload.get('bytesScanned'))
\ No newline at end of file
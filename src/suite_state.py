@@ -0,0 +1,184 @@
+import argparse
+from datetime import datetime
+from typing import Any, Union
+from pymongo import database
+from motor import motor_asyncio
+from window_statistics import WindowStatistics
+from cito_data_query import CitoTableType, getHistoryData, getHistoryDataAsync, countHistoryData, countHistoryDataAsync, getSuiteStateData, getSuiteStateDataAsync, setSuiteStateData, setSuiteStateDataAsync
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# The suite state document caches the model window of a suite (and metric):
+# { _id, test_suite_id, metric, window: [{ t, v }], first: { t, v }, count, statistics: { count, sorted }, rebuilt_on }
+# window holds the latest eligible points, first the oldest eligible point (needed by the warm-up check)
+# and count the number of eligible points. statistics keeps the window's values sorted for incremental
+# median and MAD updates, it belongs to the window version with the same count.
+
+
+def toSuiteStateId(testSuiteId: str, metric: Union[str, None] = None) -> str:
+    return testSuiteId if metric is None else f'{testSuiteId}:{metric}'
+
+
+def buildWindowPointUpdate(testSuiteId: str, metric: Union[str, None], windowSize: int, executedOn: str, value: Any, statistics: Union[WindowStatistics, None] = None, count: Union[int, None] = None) -> "tuple[dict[str, Any], list[dict[str, Any]]]":
+    """Appends an eligible point to the window of an existing suite state in one atomic pipeline update.
+
+    statistics already holds the point and belongs to the state version with the given count."""
+    # plain object expression: the timestamp is an iso string and the value numeric, so neither is read as a field path
+    point = {'t': executedOn, 'v': value}
+
+    fields = {
+        'window': {'$slice': [{'$concatArrays': [{'$ifNull': ['$window', []]}, [point]]}, -windowSize]},
+        'count': {'$add': [{'$ifNull': ['$count', 0]}, 1]},
+        'first': {'$ifNull': ['$first', point]}
+    }
+    if statistics is not None:
+        # a concurrent append changed the window since it was read, the statistics are dropped and rebuilt on the next read
+        fields['statistics'] = {'$cond': [{'$eq': [{'$ifNull': ['$count', 0]}, count]}, {
+            '$literal': statistics.toDocument(count + 1)}, '$$REMOVE']}
+
+    return {'_id': toSuiteStateId(testSuiteId, metric)}, [{'$set': fields}]
+
+
+def buildWindowResetUpdate(testSuiteId: str, metric: Union[str, None]) -> "tuple[dict[str, Any], dict[str, Any]]":
+    """Drops the window of a suite state an execution appended to without reading it, the next read rebuilds it from the history.
+
+    The state may not exist yet, so unlike the window point update this one upserts."""
+    return {'_id': toSuiteStateId(testSuiteId, metric)}, {'$set': {'test_suite_id': testSuiteId, 'metric': metric}, '$unset': {'window': '', 'statistics': ''}}
+
+
+def toWindowStatistics(state: "dict[str, Any]") -> WindowStatistics:
+    return WindowStatistics.fromDocument(state.get('statistics'), [point['v'] for point in state['window']], state['count'])
+
+
+def toHistoryEntries(state: "dict[str, Any]") -> "list[dict[str, Any]]":
+    entries = [{'executed_on': point['t'], 'value': point['v']}
+               for point in state['window']]
+
+    # same shape as the history read: next to the latest points the oldest one
+    first = state.get('first')
+    if first and state['count'] > len(entries):
+        entries.insert(0, {'executed_on': first['t'], 'value': first['v']})
+
+    return entries
+
+
+def _toStateFields(testSuiteId: str, metric: Union[str, None], windowSize: int, historyEntries: "list[dict[str, Any]]", count: int) -> "dict[str, Any]":
+    points = sorted((entry['executed_on'], entry['value'])
+                    for entry in historyEntries)
+    window = points[-windowSize:]
+
+    return {
+        'test_suite_id': testSuiteId,
+        'metric': metric,
+        'window': [{'t': executedOn, 'v': value} for executedOn, value in window],
+        'first': {'t': points[0][0], 'v': points[0][1]} if len(points) else None,
+        'count': count,
+        'statistics': WindowStatistics([value for _, value in window]).toDocument(count),
+        'rebuilt_on': datetime.utcnow().isoformat()
+    }
+
+
+def rebuildSuiteState(dbConnection: database.Database, organizationId: str, testSuiteId: str, metric: Union[str, None], windowSize: int) -> "dict[str, Any]":
+    """Rebuilds the window of a suite state from the raw history."""
+    historyEntries = getHistoryData(
+        testSuiteId, dbConnection, organizationId, windowSize, metric)
+    count = countHistoryData(
+        testSuiteId, dbConnection, organizationId, metric)
+
+    fields = _toStateFields(testSuiteId, metric, windowSize, historyEntries, count)
+    setSuiteStateData(toSuiteStateId(testSuiteId, metric),
+                      fields, dbConnection, organizationId)
+
+    return fields
+
+
+async def rebuildSuiteStateAsync(dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, testSuiteId: str, metric: Union[str, None], windowSize: int) -> "dict[str, Any]":
+    historyEntries = await getHistoryDataAsync(
+        testSuiteId, dbConnection, organizationId, windowSize, metric)
+    count = await countHistoryDataAsync(
+        testSuiteId, dbConnection, organizationId, metric)
+
+    fields = _toStateFields(testSuiteId, metric, windowSize, historyEntries, count)
+    await setSuiteStateDataAsync(toSuiteStateId(testSuiteId, metric),
+                                 fields, dbConnection, organizationId)
+
+    return fields
+
+
+def loadSuiteState(dbConnection: database.Database, organizationId: str, testSuiteId: str, metric: Union[str, None], windowSize: int) -> "dict[str, Any]":
+    state = getSuiteStateData(toSuiteStateId(
+        testSuiteId, metric), dbConnection, organizationId)
+
+    # suites executed before the state was introduced get their state on first use
+    if not state or 'window' not in state:
+        return rebuildSuiteState(dbConnection, organizationId, testSuiteId, metric, windowSize)
+    return state
+
+
+async def loadSuiteStateAsync(dbConnection: motor_asyncio.AsyncIOMotorDatabase, organizationId: str, testSuiteId: str, metric: Union[str, None], windowSize: int) -> "dict[str, Any]":
+    state = await getSuiteStateDataAsync(toSuiteStateId(
+        testSuiteId, metric), dbConnection, organizationId)
+
+    if not state or 'window' not in state:
+        return await rebuildSuiteStateAsync(dbConnection, organizationId, testSuiteId, metric, windowSize)
+    return state
+
+
+def applyUserFeedback(dbConnection: database.Database, organizationId: str, historyId: str, userFeedbackIsAnomaly: int, windowSize: int):
+    """Sets the user feedback of a history entry in all history layouts and rebuilds the window of its suite."""
+    historyEntry = dbConnection[CitoTableType.TestHistory.value + '_' + organizationId].find_one_and_update(
+        {'id': historyId}, {'$set': {'user_feedback_is_anomaly': userFeedbackIsAnomaly}})
+    if not historyEntry:
+        raise Exception('History entry matching id not found')
+
+    dbConnection[CitoTableType.TestRuns.value + '_' + organizationId].update_one(
+        {'id': historyId}, {'$set': {'user_feedback_is_anomaly': userFeedbackIsAnomaly}})
+    dbConnection[CitoTableType.TestHistoryBuckets.value + '_' + organizationId].update_one(
+        {'test_suite_id': historyEntry['test_suite_id'], 'points.id': historyId}, {'$set': {'points.$.f': userFeedbackIsAnomaly}})
+
+    # feedback can move a point into (or out of) the middle of the window, so the window is rebuilt
+    rebuildSuiteState(dbConnection, organizationId,
+                      historyEntry['test_suite_id'], historyEntry.get('metric'), windowSize)
+
+
+def repairSuiteStates(dbConnection: database.Database, organizationId: str, windowSize: int) -> int:
+    """Rebuilds every suite state of an organization whose window drifted from the raw history. Returns the number of repaired states."""
+    repaired = 0
+    for state in dbConnection[CitoTableType.TestSuiteStates.value + '_' + organizationId].find({}, {'test_suite_id': 1, 'metric': 1, 'window': 1, 'first': 1, 'count': 1}):
+        historyEntries = getHistoryData(
+            state['test_suite_id'], dbConnection, organizationId, windowSize, state.get('metric'))
+        count = countHistoryData(
+            state['test_suite_id'], dbConnection, organizationId, state.get('metric'))
+
+        expected = _toStateFields(
+            state['test_suite_id'], state.get('metric'), windowSize, historyEntries, count)
+        if all(state.get(key) == expected[key] for key in ('window', 'first', 'count')):
+            continue
+
+        setSuiteStateData(state['_id'], expected, dbConnection, organizationId)
+        repaired += 1
+
+    logger.info(
+        f'Repaired {repaired} suite states of organization {organizationId}')
+
+    return repaired
+
+
+if __name__ == '__main__':
+    from mongo_db import get_mongo_connection
+    from config import getSuiteStateWindowSize
+
+    parser = argparse.ArgumentParser(
+        description='Rebuild suite state windows that drifted from the raw test history')
+    parser.add_argument('--org', action='append', required=True,
+                        help='organization id to repair')
+    args = parser.parse_args()
+
+    logging.basicConfig()
+
+    dbConnection = get_mongo_connection()
+    for organizationId in args.org:
+        repairSuiteStates(dbConnection, organizationId,
+                          getSuiteStateWindowSize())
@@ -65,6 +65,13 @@ class QualTestAlertData(_AlertData):
 class CustomTestAlertData(_AlertData):
     expectedValue: float
 
+@dataclass
+class CustomTestMetricResult:
+    metric: str
+    isWarmup: bool
+    testData: Union[CustomTestData, None]
+    alertData: Union[CustomTestAlertData, None]
+
 @dataclass
 class _TestExecutionResult:
     testSuiteId: str
@@ -96,4 +103,5 @@ class CustomTestExecutionResult(_TestExecutionResult):
     isWarmup: bool
     testData: Union[CustomTestData, None]
     alertData: Union[CustomTestAlertData, None]
-    lastAlertSent: Union[str, None]
\ No newline at end of file
+    lastAlertSent: Union[str, None]
+    metrics: Union["list[CustomTestMetricResult]", None] = None
\ No newline at end of file
@@ -0,0 +1,108 @@
+from bisect import bisect_left, insort
+from collections import deque
+import math
+from typing import Any, Union
+import numpy as np
+from bson.binary import Binary
+
+
+def _toValue(value: Any) -> Union[float, None]:
+    # missing values (None or nan) are skipped by the statistics, as by the full recomputation
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
+class WindowStatistics:
+    """Median, median absolute deviation and mean absolute deviation of a sliding window.
+
+    The values are kept sorted, so adding and evicting a point is a binary search plus a list move instead of a sort,
+    the median is a lookup and the median absolute deviation a selection over two sorted sequences.
+    Missing values take a place in the window but not in the statistics."""
+
+    _sorted: "list[float]"
+    # values in arrival order (None if missing), the oldest one is evicted first
+    _window: "deque[Union[float, None]]"
+
+    def __init__(self, window: "list[Any]", sortedValues: "Union[list[float], None]" = None) -> None:
+        self._window = deque(_toValue(value) for value in window)
+        self._sorted = sortedValues if sortedValues is not None else sorted(
+            value for value in self._window if value is not None)
+
+    def __len__(self) -> int:
+        return len(self._window)
+
+    def add(self, value: Any, windowSize: int):
+        value = _toValue(value)
+        if value is not None:
+            insort(self._sorted, value)
+        self._window.append(value)
+
+        while len(self._window) > windowSize:
+            evicted = self._window.popleft()
+            if evicted is not None:
+                del self._sorted[bisect_left(self._sorted, evicted)]
+
+    def median(self) -> float:
+        n = len(self._sorted)
+        if not n:
+            raise Exception('Cannot calculate median of an empty window')
+        if n % 2:
+            return self._sorted[n // 2]
+        return (self._sorted[n // 2 - 1] + self._sorted[n // 2]) / 2
+
+    def _kthDeviation(self, k: int, median: float, split: int) -> float:
+        # deviations below the median ascend from split - 1 downwards, the ones above it from split upwards
+        values = self._sorted
+        lowerCount, upperCount = split, len(values) - split
+
+        def lower(index: int) -> float:
+            return median - values[split - 1 - index]
+
+        def upper(index: int) -> float:
+            return values[split + index] - median
+
+        # binary search for the number of lower deviations among the k + 1 smallest
+        low, high = max(0, k + 1 - upperCount), min(k + 1, lowerCount)
+        while low < high:
+            taken = (low + high) // 2
+            if upper(k - taken) > lower(taken):
+                low = taken + 1
+            else:
+                high = taken
+
+        candidates = []
+        if low > 0:
+            candidates.append(lower(low - 1))
+        if k + 1 - low > 0:
+            candidates.append(upper(k - low))
+        return max(candidates)
+
+    def medianAbsoluteDeviation(self) -> float:
+        median = self.median()
+        split = bisect_left(self._sorted, median)
+        n = len(self._sorted)
+        if n % 2:
+            return self._kthDeviation(n // 2, median, split)
+        return (self._kthDeviation(n // 2 - 1, median, split) + self._kthDeviation(n // 2, median, split)) / 2
+
+    def meanAbsoluteDeviation(self) -> float:
+        # needs every value anyway, one vectorized pass in arrival order (the summation order of the full recomputation)
+        values = np.fromiter((value for value in self._window if value is not None), dtype=float, count=len(self._sorted))
+        return float(np.mean(np.abs(values - values.mean())))
+
+    def toDocument(self, count: int) -> "dict[str, Any]":
+        # raw doubles, about two thirds of the size of a bson array of the same values
+        return {'count': count, 'sorted': Binary(np.asarray(self._sorted, dtype='<f8').tobytes())}
+
+    @staticmethod
+    def fromDocument(document: "Union[dict[str, Any], None]", window: "list[Any]", count: int) -> 'WindowStatistics':
+        # stored statistics of another window version (e.g. dropped by a concurrent update) are rebuilt from the window
+        if not document or document.get('count') != count:
+            return WindowStatistics(window)
+
+        sortedValues = np.frombuffer(bytes(document['sorted']), dtype='<f8').tolist()
+        if len(sortedValues) != sum(_toValue(value) is not None for value in window):
+            return WindowStatistics(window)
+        return WindowStatistics(window, sortedValues)
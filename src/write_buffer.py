@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Union
+from pymongo import InsertOne, UpdateOne, database
+from pymongo.write_concern import WriteConcern
+from motor import motor_asyncio
+from cito_data_query import CitoTableType, bulkWriteTableData, bulkWriteTableDataAsync
+from config import getWriteConcernDetails
+
+
+class WriteBuffer:
+    """Collects the writes of one execution (or a batch of executions) and flushes them with one unordered bulk write per collection."""
+
+    _operations: "dict[tuple[CitoTableType, str], list[Union[InsertOne, UpdateOne]]]"
+    _writeConcerns: "dict[str, WriteConcern]"
+
+    def __init__(self) -> None:
+        self._operations = {}
+        self._writeConcerns = {tableType: WriteConcern(**options)
+                               for tableType, options in getWriteConcernDetails().items()}
+
+    def __len__(self) -> int:
+        return sum(len(operations) for operations in self._operations.values())
+
+    def insert(self, document: "dict[str, Any]", tableType: CitoTableType, organizationId: str):
+        self._operations.setdefault(
+            (tableType, organizationId), []).append(InsertOne(document))
+
+    def update(self, testSuiteId: str, tableType: CitoTableType, columnName: str, value: Any, organizationId: str):
+        self._operations.setdefault((tableType, organizationId), []).append(
+            UpdateOne({'id': testSuiteId}, {'$set': {columnName: value}}))
+
+    def updateOne(self, filter: "dict[str, Any]", update: Any, tableType: CitoTableType, organizationId: str):
+        self._operations.setdefault((tableType, organizationId), []).append(
+            UpdateOne(filter, update))
+
+    def upsert(self, filter: "dict[str, Any]", update: "dict[str, Any]", tableType: CitoTableType, organizationId: str):
+        self._operations.setdefault((tableType, organizationId), []).append(
+            UpdateOne(filter, update, upsert=True))
+
+    def extend(self, other: 'WriteBuffer'):
+        for key, operations in other._operations.items():
+            self._operations.setdefault(key, []).extend(operations)
+
+    def clear(self):
+        self._operations = {}
+
+    def _takeOperations(self) -> "list[tuple[CitoTableType, str, list[Union[InsertOne, UpdateOne]], Union[WriteConcern, None]]]":
+        operations = [(tableType, organizationId, tableOperations, self._writeConcerns.get(tableType.value))
+                      for (tableType, organizationId), tableOperations in self._operations.items()]
+        self.clear()
+        return operations
+
+    def flush(self, dbConnection: database.Database):
+        for tableType, organizationId, operations, writeConcern in self._takeOperations():
+            bulkWriteTableData(operations, tableType,
+                               dbConnection, organizationId, writeConcern)
+
+    async def flushAsync(self, dbConnection: motor_asyncio.AsyncIOMotorDatabase):
+        # collections are independent, so their bulk writes can be in flight at the same time
+        await asyncio.gather(*[bulkWriteTableDataAsync(operations, tableType, dbConnection, organizationId, writeConcern)
+                               for tableType, organizationId, operations, writeConcern in self._takeOperations()])
@@ -0,0 +1,111 @@
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import execute_test  # noqa: E402
+from cito_data_query import CitoTableType, _buildAlertClaimUpdate, _toAlertClaim  # noqa: E402
+from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from write_buffer import WriteBuffer  # noqa: E402
+
+_cutoff = '2023-01-01T00:00:00'
+
+
+def test_unset_or_expired_slot_is_won():
+    assert _toAlertClaim({}, _cutoff) == (True, None)
+    assert _toAlertClaim({'last_alert_sent': '2022-12-31T12:00:00'}, _cutoff) == (True, '2022-12-31T12:00:00')
+
+
+def test_recent_slot_is_lost():
+    assert _toAlertClaim({'last_alert_sent': '2023-01-01T08:00:00'}, _cutoff) == (False, '2023-01-01T08:00:00')
+
+
+def test_missing_suite_is_rejected():
+    with pytest.raises(Exception):
+        _toAlertClaim(None, _cutoff)
+
+
+def test_claim_update_only_sets_a_claimable_slot():
+    update = _buildAlertClaimUpdate('2023-01-02T00:00:00', _cutoff)
+    isClaimable, now, kept = update[0]['$set']['last_alert_sent']['$cond']
+
+    assert isClaimable == {'$or': [{'$eq': [{'$ifNull': ['$last_alert_sent', None]}, None]}, {'$lte': ['$last_alert_sent', _cutoff]}]}
+    assert (now, kept) == ('2023-01-02T00:00:00', '$last_alert_sent')
+
+
+class _AlertSlots:
+    """Serializes the claims as the server does with the atomic update."""
+
+    def __init__(self):
+        self.lastAlertSent = None
+        self.claims = 0
+
+    def claim(self, testSuiteId, tableType, dbConnection, organizationId, windowHours):
+        self.claims += 1
+        now = datetime.utcnow()
+        won, previous = _toAlertClaim({'last_alert_sent': self.lastAlertSent}, (now - timedelta(hours=windowHours)).isoformat())
+        if won:
+            self.lastAlertSent = now.isoformat()
+        return won, previous
+
+
+def _buildExecuteTest(monkeypatch, slots, persist=None, writeBuffer=None):
+    monkeypatch.setattr(execute_test, 'get_mongo_connection', lambda: None)
+    monkeypatch.setattr(execute_test, 'ensureOrgIndexes', lambda dbConnection, organizationId: None)
+    monkeypatch.setattr(execute_test, 'claimAlertSlot', slots.claim)
+
+    executeTest = ExecuteTest(None, writeBuffer=writeBuffer)
+    executeTest._loadInputs = lambda: (None, None)
+
+    def evaluate(newData, history):
+        executeTest._alertClaimTableType = CitoTableType.TestSuites
+        return SimpleNamespace(lastAlertSent=None)
+    executeTest._evaluate = evaluate
+    executeTest._stageQueryMetrics = lambda: None
+    executeTest._persist = persist if persist else lambda: None
+    return executeTest
+
+
+def _execute(executeTest):
+    return executeTest.execute(ExecuteTestRequestDto('suite', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))
+
+
+def test_concurrent_executions_alert_once(monkeypatch):
+    slots = _AlertSlots()
+    first = _execute(_buildExecuteTest(monkeypatch, slots))
+    second = _execute(_buildExecuteTest(monkeypatch, slots))
+
+    # the caller alerts if lastAlertSent is unset or older than the window
+    assert first.value.lastAlertSent is None
+    assert second.value.lastAlertSent == slots.lastAlertSent
+
+
+def test_failed_persist_does_not_claim_the_slot(monkeypatch):
+    def persist():
+        raise Exception('Bulk write of documents failed')
+
+    slots = _AlertSlots()
+    result = _execute(_buildExecuteTest(monkeypatch, slots, persist))
+
+    assert not result.success
+    assert slots.claims == 0
+    assert slots.lastAlertSent is None
+
+
+def test_batch_execution_is_claimed_after_the_flush(monkeypatch):
+    slots = _AlertSlots()
+    executeTest = _buildExecuteTest(monkeypatch, slots, writeBuffer=WriteBuffer())
+    result = _execute(executeTest)
+
+    assert slots.claims == 0
+
+    result = executeTest.claimBatchAlert(result)
+
+    assert result.success
+    assert slots.claims == 1
+    assert result.value.lastAlertSent is None
@@ -0,0 +1,119 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import compact_history  # noqa: E402
+from compact_history import _isKept, _toRollups, compactOrganization  # noqa: E402
+
+_org = 'org'
+_now = datetime(2023, 3, 1, 12, 0, 0)
+
+
+class _Collection:
+    """Records the writes and serves the finds of one collection."""
+
+    def __init__(self, documents=None):
+        self.documents = documents or []
+        self.calls = []
+
+    def find(self, *args, **kwargs):
+        return list(self.documents)
+
+    def find_one(self, filter, *args, **kwargs):
+        return next((document for document in self.documents if document['_id'] == filter['_id']), None)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args))
+
+
+class _Database(dict):
+    def __missing__(self, name):
+        self[name] = _Collection()
+        return self[name]
+
+
+def _historyEntry(executionId, value, **fields):
+    return dict({'id': f'h-{executionId}', 'execution_id': executionId, 'test_suite_id': 'suite', 'test_type': 'MaterializationRowCount', 'value': value}, **fields)
+
+
+def test_rollups_have_deterministic_ids_and_skip_non_numeric_values():
+    executedOnById = {'e1': '2023-01-01T01:00:00', 'e2': '2023-01-01T02:00:00', 'e3': '2023-01-01T03:00:00'}
+    entries = [_historyEntry('e1', 1.0), _historyEntry('e2', 3.0), _historyEntry('e3', None)]
+
+    rollups = _toRollups(entries, executedOnById, 'daily')
+
+    assert rollups == _toRollups(entries, executedOnById, 'daily')
+    assert len(rollups) == 1
+    assert rollups[0]['_id'] == 'suite:None:2023-01-01'
+    assert (rollups[0]['min'], rollups[0]['max'], rollups[0]['mean'], rollups[0]['count']) == (1.0, 3.0, 2.0, 2)
+
+
+def test_kept_entries_are_not_rolled_up():
+    executedOnById = {'e1': '2023-01-01T01:00:00', 'e2': '2023-01-01T02:00:00', 'e3': '2023-01-01T03:00:00'}
+    entries = [_historyEntry('e1', 1.0), _historyEntry('e2', 3.0, alert_id='alert'), _historyEntry('e3', 5.0, user_feedback_is_anomaly=0)]
+
+    rollups = _toRollups(entries, executedOnById, 'daily')
+
+    assert (rollups[0]['min'], rollups[0]['max'], rollups[0]['count']) == (1.0, 1.0, 1)
+    assert _toRollups(entries[1:], executedOnById, 'daily') == []
+
+
+def test_alerts_anomalies_and_feedback_stay_raw():
+    assert not _isKept(_historyEntry('e1', 1.0, alert_id=None, is_anomaly=False, user_feedback_is_anomaly=-1))
+    assert _isKept(_historyEntry('e1', 1.0, alert_id='alert'))
+    assert _isKept(_historyEntry('e1', 1.0, is_anomaly=True))
+    assert _isKept(_historyEntry('e1', 1.0, user_feedback_is_anomaly=0))
+
+
+def _stubSteps(monkeypatch, days, jobs):
+    dbConnection = _Database()
+    dbConnection['test_compaction_jobs_' + _org] = _Collection([{'_id': day, 'status': status} for day, status in jobs.items()])
+    steps = []
+    monkeypatch.setattr(compact_history, 'ensureOrgIndexes', lambda dbConnection, organizationId: None)
+    monkeypatch.setattr(compact_history, '_getDays', lambda dbConnection, organizationId, cutoff: days)
+    monkeypatch.setattr(compact_history, '_rollUpDay', lambda dbConnection, organizationId, dayStart, dayEnd, granularity: steps.append(('roll_up', dayStart)))
+    monkeypatch.setattr(compact_history, '_deleteDay', lambda dbConnection, organizationId, dayStart, dayEnd, archive: steps.append(('delete', dayStart)))
+    monkeypatch.setattr(compact_history, '_refreshSuiteStates', lambda dbConnection, organizationId, dayStart, windowSize: steps.append(('refresh', dayStart)))
+    monkeypatch.setattr(compact_history, '_setJobStatus', lambda dbConnection, organizationId, dayStart, status: steps.append((status, dayStart)))
+    return dbConnection, steps
+
+
+def test_resumed_run_skips_done_days_and_rolled_up_roll_ups(monkeypatch):
+    dbConnection, steps = _stubSteps(monkeypatch, ['2023-01-01', '2023-01-02'], {'2023-01-01': 'done', '2023-01-02': 'rolled_up'})
+
+    assert compactOrganization(dbConnection, _org, 30, 'daily', False, 25, _now) == 1
+    assert steps == [('delete', '2023-01-02'), ('refresh', '2023-01-02'), ('done', '2023-01-02')]
+
+
+def test_day_interrupted_after_its_deletion_is_finished(monkeypatch):
+    # its executions are gone, so the day lies before the oldest execution
+    dbConnection, steps = _stubSteps(monkeypatch, ['2023-01-02'], {'2023-01-01': 'rolled_up'})
+
+    assert compactOrganization(dbConnection, _org, 30, 'daily', False, 25, _now) == 2
+    assert [step for step in steps if step[1] == '2023-01-01'] == [('delete', '2023-01-01'), ('refresh', '2023-01-01'), ('done', '2023-01-01')]
+
+
+def test_deleted_points_are_pulled_from_buckets():
+    dbConnection = _Database()
+    compact_history._trimBuckets(dbConnection, _org, [_historyEntry('e1', 1.0), _historyEntry('e2', 2.0)])
+
+    (_, (filter, update)), (_, (emptyFilter,)) = dbConnection['test_history_buckets_' + _org].calls
+    assert filter == {'test_suite_id': {'$in': ['suite']}, 'points.id': {'$in': ['h-e1', 'h-e2']}}
+    assert update == {'$pull': {'points': {'id': {'$in': ['h-e1', 'h-e2']}}}}
+    assert emptyFilter == {'points': {'$size': 0}}
+
+
+def test_only_existing_suite_states_are_rebuilt(monkeypatch):
+    dbConnection = _Database()
+    dbConnection['test_compaction_jobs_' + _org] = _Collection([{'_id': '2023-01-01', 'status': 'rolled_up', 'suite_states': [
+        {'test_suite_id': 'suite', 'metric': None}, {'test_suite_id': 'suite', 'metric': 'rows'}]}])
+    dbConnection['test_suite_states_' + _org] = _Collection([{'_id': 'suite:rows'}])
+    rebuilt = []
+    monkeypatch.setattr(compact_history, 'rebuildSuiteState', lambda dbConnection, organizationId, testSuiteId, metric, windowSize: rebuilt.append((testSuiteId, metric, windowSize)))
+
+    compact_history._refreshSuiteStates(dbConnection, _org, '2023-01-01', 25)
+
+    assert rebuilt == [('suite', 'rows', 25)]
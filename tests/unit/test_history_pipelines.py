@@ -0,0 +1,147 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+from cito_data_query import CitoTableType, _buildHistoryBulkPipeline, _buildHistoryPipeline, _buildHistorySpanPipeline, _buildRunHistoryPipeline, _getBucketLimit, _supportsHistoryBulk, _toBucketHistory, _toHistoryBulk, buildBucketPointUpsert  # noqa: E402
+import execute_test_async  # noqa: E402
+from execute_test import ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from execute_test_async import AsyncExecuteTest, _prefetchInputsAsync  # noqa: E402
+
+
+def _lookups(pipeline):
+    return [stage['$lookup'] for stage in pipeline if '$lookup' in stage and 'pipeline' in stage['$lookup']]
+
+
+def test_history_pipeline_reads_latest_and_first_entry():
+    pipeline = _buildHistoryPipeline('suite', 'org', 25)
+
+    assert pipeline[1:3] == [{'$sort': {'_id': -1}}, {'$limit': 25}]
+    assert pipeline[3]['$unionWith']['pipeline'][1:] == [{'$sort': {'_id': 1}}, {'$limit': 1}]
+
+
+def test_bulk_pipeline_limits_every_suite_in_its_lookup():
+    pipeline = _buildHistoryBulkPipeline(['a', 'b'], 'org', 25, None, CitoTableType.TestHistory)
+    latest, first = _lookups(pipeline)
+
+    assert pipeline[0] == {'$documents': [{'test_suite_id': 'a'}, {'test_suite_id': 'b'}]}
+    # no stage groups the full history of a suite
+    assert not any('$group' in stage for stage in pipeline)
+    assert (latest['from'], latest['localField'], latest['foreignField']) == ('test_history_org', 'test_suite_id', 'test_suite_id')
+    assert latest['pipeline'][1:3] == [{'$sort': {'_id': -1}}, {'$limit': 25}]
+    assert first['pipeline'][1:3] == [{'$sort': {'_id': 1}}, {'$limit': 1}]
+    assert latest['pipeline'][0]['$match']['metric'] is None
+
+
+def test_bulk_pipeline_reads_runs_of_consolidated_layout():
+    pipeline = _buildHistoryBulkPipeline(['a'], 'org', 10, 'rows', CitoTableType.TestRuns)
+    latest, _ = _lookups(pipeline)
+
+    assert latest['from'] == 'test_runs_org'
+    assert latest['pipeline'][1:3] == [{'$sort': {'executed_on': -1}}, {'$limit': 10}]
+    assert latest['pipeline'][0]['$match']['metric'] == 'rows'
+    # executed_on is part of the run, no lookup of the executions
+    assert not any(stage.get('$lookup', {}).get('from') == 'test_executions_org' for stage in pipeline)
+
+
+def test_suites_without_history_map_to_empty_list():
+    results = [{'test_suite_id': 'a', 'executed_on': '2023-01-01', 'value': 1}]
+
+    assert _toHistoryBulk(['a', 'b'], results) == {'a': [{'executed_on': '2023-01-01', 'value': 1}], 'b': []}
+
+
+def test_bulk_history_needs_mongodb_5_1():
+    assert not _supportsHistoryBulk({'versionArray': [4, 4, 18, 0]})
+    assert not _supportsHistoryBulk({'versionArray': [5, 0, 9, 0]})
+    assert _supportsHistoryBulk({'versionArray': [5, 1, 0, 0]})
+    assert _supportsHistoryBulk({'versionArray': [7, 0, 2, 0]})
+
+
+def test_older_servers_only_read_definitions_in_bulk(monkeypatch):
+    async def supportsHistoryBulk(dbConnection):
+        return False
+
+    async def getTestDataBulk(suites, dbConnection, organizationId):
+        return {'a': {}}
+
+    async def getHistoryDataBulk(*args):
+        raise Exception('MongoDB 5.1 needed')
+    monkeypatch.setattr(execute_test_async, 'supportsHistoryBulkAsync', supportsHistoryBulk)
+    monkeypatch.setattr(execute_test_async, 'getTestDataBulkAsync', getTestDataBulk)
+    monkeypatch.setattr(execute_test_async, 'getHistoryDataBulkAsync', getHistoryDataBulk)
+    executeTest = AsyncExecuteTest(None, dbConnection=object())
+    executeTest._suiteStateEnabled = False
+
+    prefetched = asyncio.run(_prefetchInputsAsync([(ExecuteTestRequestDto('a', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))], [executeTest], object()))
+
+    assert prefetched[0].definition == {}
+    assert prefetched[0].historyEntries is None
+
+
+def test_only_plain_point_windows_are_read_in_bulk():
+    executeTest = AsyncExecuteTest(None, dbConnection=object())
+    executeTest._suiteStateEnabled = False
+
+    assert executeTest._toBulkHistoryLimit('MaterializationRowCount', {}) == 25
+    assert executeTest._toBulkHistoryLimit('MaterializationRowCount', {'history_window_points': 60}) == 60
+    assert executeTest._toBulkHistoryLimit('MaterializationRowCount', {'history_window_days': 7}) is None
+    assert executeTest._toBulkHistoryLimit('MaterializationSchemaChange', {}) is None
+    assert executeTest._toBulkHistoryLimit('MaterializationRowCount', {'history_window_points': 0}) is None
+
+    executeTest._suiteStateEnabled = True
+    assert executeTest._toBulkHistoryLimit('MaterializationRowCount', {}) is None
+
+
+def test_unlimited_history_pipeline_reads_every_eligible_entry():
+    pipeline = _buildHistoryPipeline('suite', 'org')
+
+    assert pipeline[0] == {'$match': {'test_suite_id': 'suite', 'metric': None, '$or': [
+        {'is_anomaly': {'$ne': True}}, {'user_feedback_is_anomaly': {'$eq': 0}}]}}
+    assert not any('$limit' in stage for stage in pipeline)
+
+
+def test_run_history_pipeline_reads_without_lookup():
+    pipeline = _buildRunHistoryPipeline('suite', 'org', 25, 'rows')
+
+    assert pipeline[0]['$match']['metric'] == 'rows'
+    assert pipeline[1:3] == [{'$sort': {'executed_on': -1}}, {'$limit': 25}]
+    assert pipeline[3]['$unionWith']['coll'] == 'test_runs_org'
+    assert not any('$lookup' in stage for stage in pipeline)
+
+
+def test_span_pipeline_downsamples_to_bucket_prefixes():
+    pipeline = _buildHistorySpanPipeline('suite', 'org', '2023-01-01T00:00:00', len('YYYY-MM-DD'), 400)
+    group = next(stage['$group'] for stage in pipeline if '$group' in stage)
+
+    assert pipeline[0]['$match']['_id'] == {'$gte': ObjectId.from_datetime(datetime(2023, 1, 1))}
+    assert group['_id'] == {'$substr': ['$executed_on', 0, 10]}
+    assert {'$limit': 400} in pipeline
+    # the first entry is only added if it lies before the window
+    assert pipeline[-1]['$unionWith']['pipeline'][-1] == {'$match': {'executed_on': {'$lt': '2023-01-01T00:00:00'}}}
+
+
+def test_bucket_limit_covers_a_partially_filled_newest_bucket():
+    assert _getBucketLimit(25, 100) == 2
+    assert _getBucketLimit(200, 100) == 3
+    assert _getBucketLimit(None, 100) is None
+
+
+def test_bucket_history_keeps_latest_points_and_the_first_one():
+    buckets = [{'points': [{'t': '2023-01-03', 'v': 3}, {'t': '2023-01-04', 'v': 4}]}, {'points': [{'t': '2023-01-01', 'v': 1}, {'t': '2023-01-02', 'v': 2}]}]
+
+    assert _toBucketHistory(buckets, 2) == [{'executed_on': '2023-01-01', 'value': 1}, {'executed_on': '2023-01-03', 'value': 3}, {'executed_on': '2023-01-04', 'value': 4}]
+    assert len(_toBucketHistory(buckets, None)) == 4
+
+
+def test_bucket_point_is_pushed_into_an_open_bucket():
+    point = {'id': 'h', 't': '2023-01-01T00:00:00', 'v': 1.0, 'a': False, 'f': -1}
+    filter, update = buildBucketPointUpsert('suite', None, 100, point)
+
+    assert filter == {'test_suite_id': 'suite', 'metric': None, 'count': {'$lt': 100}}
+    assert update['$push'] == {'points': point}
+    assert (update['$min'], update['$max']) == ({'first_executed_on': point['t']}, {'last_executed_on': point['t']})
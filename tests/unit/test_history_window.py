@@ -0,0 +1,93 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import execute_test  # noqa: E402
+from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from history_window import HistoryWindow, toHistoryWindow, toModelWindow  # noqa: E402
+
+_now = datetime(2023, 3, 1, 12, 0, 0)
+
+
+def _buildHistory(days, pointsPerDay):
+    return [((_now - timedelta(days=days) + timedelta(hours=24 / pointsPerDay * index)).strftime('%Y-%m-%d %H:%M:%S'), float(index))
+            for index in range(days * pointsPerDay)]
+
+
+def test_default_window_without_suite_fields():
+    assert toHistoryWindow({}, 25, 400, _now) == HistoryWindow(25)
+
+
+def test_point_window_is_capped():
+    assert toHistoryWindow({'history_window_points': 60}, 25, 400, _now) == HistoryWindow(60)
+    assert toHistoryWindow({'history_window_points': 5000}, 25, 400, _now) == HistoryWindow(400)
+
+
+@pytest.mark.parametrize('days, bucketKeyLength', [(1, len('YYYY-MM-DDTHH:M')), (14, len('YYYY-MM-DDTHH')), (28, len('YYYY-MM-DD')), (3650, len('YYYY-MM-DD'))])
+def test_span_window_uses_finest_bucket_within_max_points(days, bucketKeyLength):
+    window = toHistoryWindow({'history_window_days': days}, 25, 400, _now)
+
+    assert window.points == 400
+    assert window.start == (_now - timedelta(days=days)).isoformat()
+    assert window.bucketKeyLength == bucketKeyLength
+
+
+@pytest.mark.parametrize('definition', [{'history_window_days': 0}, {'history_window_points': -1}])
+def test_non_positive_window_is_rejected(definition):
+    with pytest.raises(Exception):
+        toHistoryWindow(definition, 25, 400, _now)
+
+
+def test_point_model_window_keeps_latest_points():
+    history = _buildHistory(10, 1)
+
+    assert toModelWindow(HistoryWindow(3), history) == history[-3:]
+
+
+def test_span_model_window_drops_first_entry_before_start():
+    # the first entry is only read for the warm-up check
+    history = [('2022-01-01 00:00:00', 1.0)] + _buildHistory(7, 24)
+    window = toHistoryWindow({'history_window_days': 7}, 25, 400, _now)
+
+    assert toModelWindow(window, history) == history[1:]
+
+
+def _buildExecuteTest(monkeypatch, definition, eligibleCount):
+    monkeypatch.setattr(execute_test, 'get_mongo_connection', lambda: None)
+    executeTest = ExecuteTest(None)
+    executeTest._initExecution(ExecuteTestRequestDto('suite', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))
+    executeTest._testDefinition = definition
+    executeTest._historyWindow = executeTest._toHistoryWindow()
+
+    # the window start is taken from the clock
+    now = datetime.utcnow()
+    entries = [{'executed_on': (now - timedelta(days=eligibleCount - index)).isoformat(), 'value': 1.0} for index in range(eligibleCount)]
+    monkeypatch.setattr(execute_test, 'getHistoryData',
+                        lambda testSuiteId, dbConnection, organizationId, limit, metric: entries[:1] + entries[-limit:])
+    monkeypatch.setattr(execute_test, 'getHistorySpanData',
+                        lambda testSuiteId, dbConnection, organizationId, start, bucketKeyLength, bucketLimit, metric: entries[:1] + [entry for entry in entries[1:] if entry['executed_on'] >= start])
+    monkeypatch.setattr(execute_test, 'countHistoryData',
+                        lambda testSuiteId, dbConnection, organizationId, metric, limit: min(eligibleCount, limit))
+    return executeTest
+
+
+@pytest.mark.parametrize('definition', [{'history_window_points': 5}, {'history_window_days': 7}])
+def test_small_window_leaves_warm_up_by_eligible_count(monkeypatch, definition):
+    # a daily suite never holds more than 5 (or 7) points in its window, but has 30 in its history
+    executeTest = _buildExecuteTest(monkeypatch, definition, 30)
+    historicalData = executeTest._toHistoricalData(executeTest._getHistoryEntries())
+
+    assert len(historicalData) <= 10
+    assert not executeTest._isWarmup(datetime.utcnow(), historicalData)
+
+
+def test_small_window_stays_in_warm_up_with_few_eligible_points(monkeypatch):
+    executeTest = _buildExecuteTest(monkeypatch, {'history_window_points': 5}, 9)
+    historicalData = executeTest._toHistoricalData(executeTest._getHistoryEntries())
+
+    assert executeTest._isWarmup(datetime.utcnow(), historicalData)
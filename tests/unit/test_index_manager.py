@@ -0,0 +1,84 @@
+import os
+import sys
+
+from pymongo import ASCENDING, DESCENDING
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import index_manager  # noqa: E402
+from cito_data_query import CitoTableType  # noqa: E402
+from index_manager import _getMissingIndexes, _toIndexModels, _toOrganizationCollections, ensureOrgIndexes, verifyIndexes  # noqa: E402
+
+
+class _Collection:
+    def __init__(self, name, indexInformation=None):
+        self.name = name
+        self._indexInformation = indexInformation or {'_id_': {'key': [('_id', 1)]}}
+        self.created = []
+
+    def index_information(self):
+        return self._indexInformation
+
+    def create_indexes(self, models):
+        self.created.extend(model.document['name'] for model in models)
+
+
+class _Database(dict):
+    def __missing__(self, name):
+        self[name] = _Collection(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self.keys())
+
+
+def test_index_models_are_named_after_their_keys():
+    models = _toIndexModels(CitoTableType.TestHistory)
+
+    assert [model.document['name'] for model in models] == ['test_suite_id_1_metric_1__id_-1', 'execution_id_1']
+    assert [list(model.document['key'].items()) for model in models] == [[('test_suite_id', ASCENDING), ('metric', ASCENDING), ('_id', DESCENDING)], [('execution_id', ASCENDING)]]
+
+
+def test_runs_id_index_is_unique():
+    models = {model.document['name']: model.document for model in _toIndexModels(CitoTableType.TestRuns)}
+
+    assert models['id_1']['unique']
+    assert not models['test_suite_id_1_metric_1_executed_on_-1'].get('unique', False)
+
+
+def test_org_collections_are_matched_by_longest_prefix():
+    collections = _toOrganizationCollections(['test_suites_org', 'test_suites_qual_org', 'test_history_buckets_org', 'archive_test_history_org', 'accounts'])
+
+    assert collections == {'org': [CitoTableType.TestSuites, CitoTableType.TestSuitesQual, CitoTableType.TestHistoryBuckets]}
+
+
+def test_only_missing_indexes_are_reported():
+    indexInformation = {'_id_': {'key': [('_id', 1)]}, 'execution_id_1': {'key': [('execution_id', 1)]}}
+
+    missing = _getMissingIndexes(CitoTableType.TestHistory, indexInformation)
+
+    assert [model.document['name'] for model in missing] == ['test_suite_id_1_metric_1__id_-1']
+
+
+def test_verify_reports_without_repairing(monkeypatch):
+    monkeypatch.setattr(index_manager, '_indexedOrganizations', set())
+    dbConnection = _Database()
+    dbConnection['test_suites_org'] = _Collection('test_suites_org', {'id_1': {'key': [('id', 1)]}})
+    dbConnection['test_results_org'] = _Collection('test_results_org')
+
+    assert verifyIndexes(dbConnection, repair=False) == {'test_results_org': ['test_suite_id_1', 'execution_id_1']}
+    assert dbConnection['test_results_org'].created == []
+    assert 'org' not in index_manager._indexedOrganizations
+
+
+def test_org_indexes_are_ensured_once_per_process(monkeypatch):
+    monkeypatch.setattr(index_manager, '_indexedOrganizations', set())
+    dbConnection = _Database()
+
+    ensureOrgIndexes(dbConnection, 'org')
+    created = len(dbConnection['test_history_org'].created)
+    ensureOrgIndexes(dbConnection, 'org')
+
+    assert created == 2
+    assert len(dbConnection['test_history_org'].created) == 2
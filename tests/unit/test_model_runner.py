@@ -0,0 +1,59 @@
+import asyncio
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import model_runner  # noqa: E402
+from i_forecast_engine import ForecastDto  # noqa: E402
+from i_model_runner import ModelTask  # noqa: E402
+from model_runner import InProcessModelRunner, ProcessPoolModelRunner, buildModelRunner  # noqa: E402
+from quant_model import ForecastSkipReason  # noqa: E402
+
+_history = [(f'2023-01-{day + 1:02d} 00:00:00', 100.0 + day % 3) for day in range(25)]
+
+
+def test_task_ships_engine_name_and_parameters_only():
+    task = ModelTask.build(('2023-01-26 00:00:00', 101.0), _history, 'MaterializationRowCount', None, None, 'prophet', {'version': 'x'})
+
+    assert pickle.loads(pickle.dumps(task)).warmStartParams == {'version': 'x'}
+    assert b'prophet_forecast_engine' not in pickle.dumps(task)
+
+
+def test_precomputed_forecast_is_used_without_fit():
+    forecast = ForecastDto(101.0, 50.0, 150.0, 101.0, 50.0, 150.0)
+    task = ModelTask.build(('2023-01-26 00:00:00', 140.0), _history, 'MaterializationRowCount', None, None, 'prophet', None, forecast)
+
+    result, fittedParams = InProcessModelRunner().run(task)
+
+    # the point is out of the z-score bounds but within the precomputed forecast
+    assert result.anomaly is None
+    assert fittedParams is None
+
+
+def test_skipped_forecast_returns_no_parameters():
+    task = ModelTask.build(('2023-01-26 00:00:00', 101.0), _history, 'MaterializationRowCount', None, None, 'prophet', None, None, ForecastSkipReason.ROUTED)
+
+    assert InProcessModelRunner().run(task)[1] is None
+
+
+def test_process_pool_runner_is_reused(monkeypatch):
+    monkeypatch.setattr(model_runner, 'availableCores', lambda: 4)
+    monkeypatch.setattr(model_runner, '_processPoolRunner', None)
+
+    runner = buildModelRunner(2)
+    try:
+        assert isinstance(runner, ProcessPoolModelRunner)
+        assert buildModelRunner(2) is runner
+        # workers are not forked from the threaded parent
+        assert runner._pool._mp_context.get_start_method() == 'forkserver'
+    finally:
+        runner.shutdown()
+
+
+def test_async_run_equals_run():
+    task = ModelTask.build(('2023-01-26 00:00:00', 101.0), _history, 'MaterializationRowCount', None, None, 'prophet', None, None, ForecastSkipReason.ROUTED)
+
+    assert asyncio.run(InProcessModelRunner().runAsync(task)) == InProcessModelRunner().run(task)
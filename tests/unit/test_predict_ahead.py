@@ -0,0 +1,121 @@
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import execute_test  # noqa: E402
+from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from history_window import HistoryWindow  # noqa: E402
+from i_forecast_engine import ForecastDto, IForecastEngine  # noqa: E402
+from predict_ahead import predict, toNextWindow, toPrecomputedForecast, toWindowFingerprint  # noqa: E402
+from write_buffer import WriteBuffer  # noqa: E402
+
+_window = [('2023-01-01 00:00:00', 1.0), ('2023-01-02 00:00:00', 2.0), ('2023-01-03 00:00:00', 3.0)]
+
+
+class _Engine(IForecastEngine):
+    def __init__(self):
+        self.at = None
+
+    def forecast(self, historicalData, at):
+        self.at = at
+        return ForecastDto(4.0, 3.0, 5.0, 4.0, 3.5, 4.5, {'weekly': (0.1, 0.0, 0.2)})
+
+
+def test_fingerprint_ignores_the_numeric_type():
+    assert toWindowFingerprint([('2023-01-01 00:00:00', 1)]) == toWindowFingerprint([('2023-01-01 00:00:00', 1.0)])
+
+
+def test_only_a_normal_point_moves_the_window():
+    newDataPoint = ('2023-01-04 00:00:00', 4.0)
+
+    assert toNextWindow(_window, newDataPoint, True, 3) == _window
+    assert toNextWindow(_window, newDataPoint, False, 3) == _window[1:] + [newDataPoint]
+
+
+def test_prediction_is_made_one_interval_after_the_window():
+    engine = _Engine()
+    prediction = predict(engine, 'prophet', _window)
+
+    assert str(engine.at) == '2023-01-04 00:00:00'
+    assert (prediction['at'], prediction['valid_until']) == ('2023-01-04T00:00:00', '2023-01-05T00:00:00')
+    assert prediction['forecast']['seasonalities'] == {'weekly': [0.1, 0.0, 0.2]}
+
+
+def test_window_without_interval_is_not_predicted():
+    assert predict(_Engine(), 'prophet', _window[:1]) is None
+
+
+@pytest.mark.parametrize('engineName, window, executedOn, expected', [
+    ('prophet', _window, datetime(2023, 1, 4), True),
+    ('numpy', _window, datetime(2023, 1, 4), False),
+    ('prophet', _window[1:], datetime(2023, 1, 4), False),
+    # the expected execution was missed
+    ('prophet', _window, datetime(2023, 1, 5, 1), False),
+])
+def test_precomputed_forecast_requires_same_engine_window_and_time(engineName, window, executedOn, expected):
+    prediction = predict(_Engine(), 'prophet', _window)
+
+    assert (toPrecomputedForecast(prediction, engineName, window, executedOn) is not None) == expected
+
+
+def _buildExecuteTest(monkeypatch, forecastMode='eager'):
+    monkeypatch.setattr(execute_test, 'get_mongo_connection', lambda: None)
+    monkeypatch.setenv('PREDICT_AHEAD', 'true')
+    monkeypatch.setenv('FORECAST_MODE', forecastMode)
+    executeTest = ExecuteTest(None)
+    executeTest._initExecution(ExecuteTestRequestDto('suite', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))
+    executeTest._testDefinition = {}
+    executeTest._historyWindow = HistoryWindow(25)
+    return executeTest
+
+
+def test_lazy_evaluation_does_not_predict_ahead(monkeypatch):
+    assert _buildExecuteTest(monkeypatch)._predictsAhead()
+    assert not _buildExecuteTest(monkeypatch, 'lazy')._predictsAhead()
+
+
+def test_prediction_is_fitted_after_the_model_run(monkeypatch):
+    executeTest = _buildExecuteTest(monkeypatch)
+    monkeypatch.setattr(executeTest._modelRunner, 'run', lambda task: (SimpleNamespace(anomaly=None), None))
+    predicted = []
+    monkeypatch.setattr(executeTest, '_predictAhead', lambda pending: predicted.append(pending))
+
+    executeTest._runModel(('2023-01-04 00:00:00', 4.0), _window, 'MaterializationRowCount', None, None)
+
+    assert predicted == []
+    assert len(executeTest._pendingPredictions) == 1
+
+    executeTest._runPredictions()
+
+    assert [pending.value for pending in predicted] == [4.0]
+    assert executeTest._pendingPredictions == []
+
+
+def test_batch_execution_predicts_after_the_flush(monkeypatch):
+    monkeypatch.setattr(execute_test, 'get_mongo_connection', lambda: None)
+    monkeypatch.setattr(execute_test, 'ensureOrgIndexes', lambda dbConnection, organizationId: None)
+    executeTest = ExecuteTest(None, writeBuffer=WriteBuffer())
+    executeTest._loadInputs = lambda: (None, None)
+
+    def evaluate(newData, history):
+        executeTest._pendingPredictions.append(SimpleNamespace(value=4.0))
+        return SimpleNamespace()
+    executeTest._evaluate = evaluate
+    executeTest._stageQueryMetrics = lambda: None
+    stored = []
+    monkeypatch.setattr(executeTest, '_storePredictions', lambda: stored.append(len(executeTest._pendingPredictions)))
+
+    result = executeTest.execute(ExecuteTestRequestDto('suite', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))
+
+    assert result.success
+    assert stored == []
+
+    executeTest.storeBatchPredictions()
+
+    assert stored == [1]
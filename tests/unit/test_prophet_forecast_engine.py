@@ -0,0 +1,59 @@
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import prophet_forecast_engine  # noqa: E402
+from prophet_forecast_engine import ProphetForecastEngine  # noqa: E402
+
+_history = pd.DataFrame({'ds': pd.date_range('2023-01-01', periods=20), 'y': [float(100 + index) for index in range(20)]})
+
+
+class _Model:
+    def __init__(self, failsWithInit):
+        self._failsWithInit = failsWithInit
+        self.init = None
+
+    def fit(self, historicalData, init=None):
+        if init is not None and self._failsWithInit:
+            raise ValueError('shape mismatch')
+        self.init = init
+        return self
+
+
+def test_fit_without_matching_params_is_cold(monkeypatch):
+    engine = ProphetForecastEngine({'version': 'other'})
+    monkeypatch.setattr(engine, '_buildModel', lambda: _Model(False))
+
+    assert engine._fit(_history).init is None
+    assert engine.warmStart == 'cold'
+
+
+def test_failed_warm_start_falls_back_and_is_recorded(monkeypatch):
+    engine = ProphetForecastEngine({'version': ProphetForecastEngine.modelVersion()})
+    monkeypatch.setattr(engine, '_toInit', lambda historicalData: {'k': 0.0})
+    monkeypatch.setattr(engine, '_buildModel', lambda: _Model(True))
+
+    assert engine._fit(_history).init is None
+    assert engine.warmStart == 'fallback'
+
+
+def test_warm_start_passes_init(monkeypatch):
+    engine = ProphetForecastEngine({'version': ProphetForecastEngine.modelVersion()})
+    monkeypatch.setattr(engine, '_toInit', lambda historicalData: {'k': 0.0})
+    monkeypatch.setattr(engine, '_buildModel', lambda: _Model(False))
+
+    assert engine._fit(_history).init == {'k': 0.0}
+    assert engine.warmStart == 'warm'
+
+
+def test_installed_prophet_without_init_support_fits_cold(monkeypatch):
+    monkeypatch.setattr(prophet_forecast_engine, '_SUPPORTS_WARM_START', False)
+    engine = ProphetForecastEngine({'version': ProphetForecastEngine.modelVersion()})
+    monkeypatch.setattr(engine, '_buildModel', lambda: _Model(True))
+
+    assert engine._fit(_history).init is None
+    assert engine.warmStart == 'cold'
@@ -0,0 +1,215 @@
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+from i_forced_threshold import ForcedThreshold, ForcedThresholdMode, ForcedThresholdType  # noqa: E402
+from quant_model import BatchModel, CommonModel, ForecastSkipReason, _ZScoreAnalysis  # noqa: E402
+from window_statistics import WindowStatistics  # noqa: E402
+
+
+class _PandasZScoreAnalysis(_ZScoreAnalysis):
+    """The former pandas based statistics, kept as reference for the array based implementation."""
+
+    def _calculateMedianAbsoluteDeviation(self) -> float:
+        values = pd.Series(self._historicalValues)
+        self._median = float(values.median())
+        absoluteDeviation = values.apply(lambda x: abs(x - self._median))
+        return float(absoluteDeviation.median())
+
+    def _mad(self):
+        values = pd.Series(self._historicalValues)
+        return (values - values.mean()).abs().mean()
+
+
+def _buildHistory(values):
+    return [(f'2023-01-01 {index // 60:02d}:{index % 60:02d}:00', value) for index, value in enumerate(values)]
+
+
+def _buildCases():
+    rng = random.Random(0)
+    cases = []
+    for _ in range(200):
+        size = rng.randint(10, 40)
+        values = rng.choice([
+            [rng.gauss(100, 10) for _ in range(size)],
+            [rng.randint(0, 20) for _ in range(size)],
+            [rng.gauss(-50, 30) for _ in range(size)]
+        ])
+        newValue = rng.choice([values[0], rng.gauss(100, 30), rng.randint(0, 30)])
+        cases.append((values, newValue, None, None))
+
+    # zero median absolute deviation (mean absolute deviation fallback) and constant history
+    cases.append(([5.0] * 9 + [9.0], 7.0, None, None))
+    cases.append(([5.0] * 10, 5.0, None, None))
+    cases.append(([5.0] * 10, 6.0, None, None))
+
+    for mode in ForcedThresholdMode:
+        for thresholdType in ForcedThresholdType:
+            cases.append(([rng.gauss(100, 10) for _ in range(20)], 130.0, ForcedThreshold(
+                80, mode, thresholdType), ForcedThreshold(120 if mode == ForcedThresholdMode.ABSOLUTE else 1.2, mode, thresholdType)))
+
+    return cases
+
+
+@pytest.mark.parametrize('testType', ['MaterializationRowCount', 'ColumnNullness', 'CustomTest'])
+def test_z_score_result_equals_pandas_implementation(testType):
+    for values, newValue, forcedLowerThreshold, forcedUpperThreshold in _buildCases():
+        newDataPoint = ('2023-01-02 00:00:00', newValue)
+        history = _buildHistory(values)
+
+        expected = _PandasZScoreAnalysis(
+            newDataPoint, history, testType, forcedLowerThreshold, forcedUpperThreshold).analyze()
+        actual = _ZScoreAnalysis(
+            newDataPoint, history, testType, forcedLowerThreshold, forcedUpperThreshold).analyze()
+
+        assert actual == expected
+
+
+def test_z_score_skips_missing_historical_values():
+    values = [1, 2, None, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+    newDataPoint = ('2023-01-02 00:00:00', 100.0)
+
+    # the pandas statistics skipped missing values
+    expected = _PandasZScoreAnalysis(newDataPoint, _buildHistory(
+        [value for value in values if value is not None]), 'MaterializationRowCount', None, None).analyze()
+    actual = _ZScoreAnalysis(newDataPoint, _buildHistory(values), 'MaterializationRowCount', None, None).analyze()
+
+    assert actual == expected
+    assert actual.median == pd.Series(values, dtype=float).median() == 6.0
+    assert actual.isAnomaly
+
+
+def test_z_score_keeps_infinite_historical_values():
+    values = [1, 2, None, 3, 4, 5, 6, 7, 8, 9, 10, math.inf]
+    newDataPoint = ('2023-01-02 00:00:00', 100.0)
+
+    expected = _PandasZScoreAnalysis(newDataPoint, _buildHistory(
+        [value for value in values if value is not None]), 'MaterializationRowCount', None, None).analyze()
+    actual = _ZScoreAnalysis(newDataPoint, _buildHistory(values), 'MaterializationRowCount', None, None).analyze()
+
+    assert actual == expected
+    assert actual.median == 6.0
+
+    batchResult = BatchModel(np.array([values], dtype=float), [len(values)], [100.0], ['MaterializationRowCount'], [None], [None]).run(ForecastSkipReason.DEADLINE)[0]
+    assert batchResult == CommonModel(newDataPoint, _buildHistory(values), 'MaterializationRowCount', None, None).run(ForecastSkipReason.DEADLINE)
+
+
+@pytest.mark.parametrize('forecastSkipReason', [ForecastSkipReason.DEADLINE, ForecastSkipReason.ROUTED])
+def test_batch_results_equal_single_suite_path(forecastSkipReason):
+    cases = _buildCases()
+    testTypes = ['MaterializationRowCount', 'ColumnNullness', 'CustomTest']
+    testTypes = [testTypes[index % len(testTypes)] for index in range(len(cases))]
+
+    historicalValues = np.full((len(cases), max(len(case[0]) for case in cases)), np.nan)
+    for index, (values, _, _, _) in enumerate(cases):
+        historicalValues[index, :len(values)] = values
+
+    batchModel = BatchModel(historicalValues, [len(case[0]) for case in cases], [case[1] for case in cases], testTypes,
+                            [case[2] for case in cases], [case[3] for case in cases])
+    results = batchModel.run(forecastSkipReason)
+
+    for (values, newValue, forcedLowerThreshold, forcedUpperThreshold), testType, result in zip(cases, testTypes, results):
+        expected = CommonModel(('2023-01-02 00:00:00', newValue), _buildHistory(
+            values), testType, forcedLowerThreshold, forcedUpperThreshold).run(forecastSkipReason)
+
+        assert result == expected
+
+
+def test_batch_skips_missing_historical_values():
+    cases = [([1, 2, None, 3, 4, 5, 6, 7, 8, 9, 10, 11], 100.0), ([None, 5.0, 5.0, 6.0, 5.0], 5.0), ([4.0, 8.0, 6.0, 7.0], 30.0)]
+
+    historicalValues = np.full((len(cases), 12), np.nan)
+    for index, (values, _) in enumerate(cases):
+        historicalValues[index, :len(values)] = values
+
+    results = BatchModel(historicalValues, [len(case[0]) for case in cases], [case[1] for case in cases], ['MaterializationRowCount'] * len(cases),
+                         [None] * len(cases), [None] * len(cases)).run(ForecastSkipReason.DEADLINE)
+
+    for (values, newValue), result in zip(cases, results):
+        expected = CommonModel(('2023-01-02 00:00:00', newValue), _buildHistory(
+            values), 'MaterializationRowCount', None, None).run(ForecastSkipReason.DEADLINE)
+
+        assert result == expected
+    assert results[0].anomaly is not None
+
+
+@pytest.mark.parametrize('values', [[100.0] * 20, [100.0 + 0.01 * (index % 3) for index in range(20)]])
+def test_routed_flat_series_keeps_a_minimum_band(values):
+    history = _buildHistory(values)
+
+    zScoreOnly = CommonModel(('2023-01-02 00:00:00', 100.5), history, 'MaterializationRowCount', None, None).run(ForecastSkipReason.DEADLINE)
+    routed = CommonModel(('2023-01-02 00:00:00', 100.5), history, 'MaterializationRowCount', None, None).run(ForecastSkipReason.ROUTED)
+    shifted = CommonModel(('2023-01-02 00:00:00', 105.0), history, 'MaterializationRowCount', None, None).run(ForecastSkipReason.ROUTED)
+
+    # the median absolute deviation is (nearly) zero, a tiny change alone leaves the z-score bounds
+    assert zScoreOnly.anomaly is not None
+    assert routed.anomaly is None
+    assert routed.expectedValueUpper - routed.expectedValueLower >= 2.0
+    assert shifted.anomaly is not None
+
+
+@pytest.mark.parametrize('testType', ['MaterializationRowCount', 'ColumnNullness'])
+def test_routed_zero_series_keeps_a_minimum_band(testType):
+    # a median of 0 gives the ratio nothing to widen, the floor keeps the bounds apart
+    history = [(f'2024-01-{day:02d} 00:00:00', 0.0) for day in range(1, 21)]
+    newDataPoint = ('2024-01-25 00:00:00', 1.0)
+
+    result = CommonModel(newDataPoint, history, testType, None, None).run(ForecastSkipReason.ROUTED)
+    batchResult = BatchModel(np.zeros((1, 20)), [20], [1.0], [testType], [None], [None]).run(ForecastSkipReason.ROUTED)[0]
+
+    assert result.expectedValueUpper > result.expectedValueLower == 0
+    assert result.anomaly is not None and math.isfinite(result.anomaly.importance)
+    assert batchResult == result
+
+
+def test_routed_band_keeps_forced_thresholds():
+    result = CommonModel(('2023-01-02 00:00:00', 100.5), _buildHistory([100.0] * 20), 'MaterializationRowCount', None, ForcedThreshold(
+        100.2, ForcedThresholdMode.ABSOLUTE, ForcedThresholdType.CUSTOM)).run(ForecastSkipReason.ROUTED)
+
+    assert result.expectedValueUpper == 100.2
+    assert result.expectedValueLower <= 99.0
+    assert result.anomaly is not None
+
+
+def test_streaming_statistics_equal_full_recomputation():
+    rng = random.Random(0)
+    for values, newValue, forcedLowerThreshold, forcedUpperThreshold in _buildCases():
+        windowSize = len(values)
+        # slide a window over a longer series, each new point evicts the oldest one
+        series = [rng.choice(values) for _ in range(windowSize)] + values
+        statistics = WindowStatistics(series[:windowSize])
+        for value in series[windowSize:]:
+            statistics.add(value, windowSize)
+
+        newDataPoint = ('2023-01-02 00:00:00', newValue)
+        history = _buildHistory(values)
+
+        expected = _ZScoreAnalysis(newDataPoint, history, 'MaterializationRowCount',
+                                   forcedLowerThreshold, forcedUpperThreshold).analyze()
+        actual = _ZScoreAnalysis(newDataPoint, history, 'MaterializationRowCount',
+                                 forcedLowerThreshold, forcedUpperThreshold, statistics).analyze()
+
+        assert actual == expected
+
+
+def test_streaming_statistics_skip_missing_values():
+    values = [3.0, None, 7.0, 1.0, float('nan'), 9.0, 4.0, 4.0]
+    statistics = WindowStatistics([None, 2.0, 8.0])
+    for value in values:
+        statistics.add(value, len(values))
+
+    newDataPoint = ('2023-01-02 00:00:00', 20.0)
+    history = _buildHistory(values)
+
+    assert len(statistics) == len(values)
+    assert _ZScoreAnalysis(newDataPoint, history, 'MaterializationRowCount', None, None, statistics).analyze() == _ZScoreAnalysis(
+        newDataPoint, history, 'MaterializationRowCount', None, None).analyze()
+    assert WindowStatistics.fromDocument(statistics.toDocument(3), values, 3).median() == statistics.median()
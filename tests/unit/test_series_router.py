@@ -0,0 +1,57 @@
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+from series_router import ModelRoute, SeriesClass, classifySeries, fromSeriesClassDocument, routeModel, toSeriesClassDocument  # noqa: E402
+
+_start = datetime(2023, 1, 1)
+
+
+def _buildHistory(values, hours=24):
+    return [((_start + timedelta(hours=hours * index)).strftime('%Y-%m-%d %H:%M:%S'), value) for index, value in enumerate(values)]
+
+
+_noise = [(index * 7919 % 13 - 6) / 6 for index in range(56)]
+
+
+@pytest.mark.parametrize('history, expected', [
+    (_buildHistory([5.0] * 30), SeriesClass.CONSTANT),
+    (_buildHistory([5.0, 6.0]), SeriesClass.CONSTANT),
+    (_buildHistory([1000.0 + 0.001 * value for value in _noise]), SeriesClass.LOW_VARIANCE),
+    (_buildHistory([100.0 + 5 * index + value for index, value in enumerate(_noise)]), SeriesClass.TRENDING),
+    # hourly points with a strong daily profile
+    (_buildHistory([100.0 + 20 * math.sin(2 * math.pi * index / 24) + value for index, value in enumerate(_noise * 2)], hours=1), SeriesClass.SEASONAL),
+    (_buildHistory([100.0 + 10 * value for value in _noise]), SeriesClass.IRREGULAR),
+])
+def test_series_are_classified(history, expected):
+    assert classifySeries(history) == expected
+
+
+@pytest.mark.parametrize('seriesClass', [SeriesClass.CONSTANT, SeriesClass.LOW_VARIANCE])
+def test_flat_series_skip_the_forecast(seriesClass):
+    # whatever the suite asks for, the z-score analysis (with its minimum band) decides
+    assert routeModel(seriesClass, 'prophet', 'prophet') == ModelRoute(seriesClass, None)
+
+
+def test_suite_engine_is_kept_for_other_series():
+    assert routeModel(SeriesClass.TRENDING, 'prophet', 'prophet') == ModelRoute(SeriesClass.TRENDING, 'prophet')
+
+
+def test_trending_series_use_the_cheap_engine():
+    assert routeModel(SeriesClass.TRENDING, 'prophet', None) == ModelRoute(SeriesClass.TRENDING, 'numpy')
+    assert routeModel(SeriesClass.SEASONAL, 'prophet', None) == ModelRoute(SeriesClass.SEASONAL, 'prophet')
+    assert routeModel(SeriesClass.IRREGULAR, 'prophet', None) == ModelRoute(SeriesClass.IRREGULAR, 'prophet')
+
+
+def test_series_class_expires_after_the_ttl():
+    document = toSeriesClassDocument(SeriesClass.SEASONAL, _start)
+
+    assert fromSeriesClassDocument(document, _start + timedelta(hours=23), 24) == SeriesClass.SEASONAL
+    assert fromSeriesClassDocument(document, _start + timedelta(hours=25), 24) is None
+    assert fromSeriesClassDocument(None, _start, 24) is None
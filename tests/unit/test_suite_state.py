@@ -0,0 +1,104 @@
+import os
+import sys
+
+from pymongo import UpdateOne
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import execute_test  # noqa: E402
+from cito_data_query import CitoTableType  # noqa: E402
+from execute_test import ExecuteTest, ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from history_window import HistoryWindow  # noqa: E402
+from suite_state import buildWindowPointUpdate, buildWindowResetUpdate, toHistoryEntries, toSuiteStateId  # noqa: E402
+from window_statistics import WindowStatistics  # noqa: E402
+
+
+def test_suite_state_id_is_tagged_with_metric():
+    assert toSuiteStateId('suite') == 'suite'
+    assert toSuiteStateId('suite', 'rows') == 'suite:rows'
+
+
+def test_window_point_update_appends_and_slices():
+    filter, update = buildWindowPointUpdate('suite', 'rows', 25, '2023-01-01T00:00:00', 5)
+    fields = update[0]['$set']
+
+    assert filter == {'_id': 'suite:rows'}
+    assert fields['window'] == {'$slice': [{'$concatArrays': [{'$ifNull': ['$window', []]}, [{'t': '2023-01-01T00:00:00', 'v': 5}]]}, -25]}
+    assert fields['count'] == {'$add': [{'$ifNull': ['$count', 0]}, 1]}
+    assert 'statistics' not in fields
+
+
+def test_window_point_update_keeps_statistics_of_the_read_version_only():
+    statistics = WindowStatistics([1.0, 2.0, 5.0])
+    _, update = buildWindowPointUpdate('suite', None, 25, '2023-01-01T00:00:00', 5, statistics, 2)
+    condition, kept, dropped = update[0]['$set']['statistics']['$cond']
+
+    assert condition == {'$eq': [{'$ifNull': ['$count', 0]}, 2]}
+    assert kept['$literal']['count'] == 3
+    assert dropped == '$$REMOVE'
+
+
+def test_window_reset_update_upserts():
+    filter, update = buildWindowResetUpdate('suite', None)
+
+    assert filter == {'_id': 'suite'}
+    assert update == {'$set': {'test_suite_id': 'suite', 'metric': None}, '$unset': {'window': '', 'statistics': ''}}
+
+
+def test_history_entries_include_first_point_outside_window():
+    state = {'window': [{'t': '2023-01-03', 'v': 3}], 'first': {'t': '2023-01-01', 'v': 1}, 'count': 3}
+
+    assert toHistoryEntries(state) == [{'executed_on': '2023-01-01', 'value': 1}, {'executed_on': '2023-01-03', 'value': 3}]
+    assert toHistoryEntries({**state, 'count': 1}) == [{'executed_on': '2023-01-03', 'value': 3}]
+
+
+def _buildExecuteTest(monkeypatch):
+    monkeypatch.setattr(execute_test, 'get_mongo_connection', lambda: None)
+    executeTest = ExecuteTest(None)
+    executeTest._suiteStateEnabled = True
+    executeTest._initExecution(ExecuteTestRequestDto('suite', 'MaterializationRowCount', 'org'), ExecuteTestAuthDto('jwt', None, True))
+    executeTest._executedOn = '2023-01-01T00:00:00'
+    return executeTest
+
+
+def _stateOperations(executeTest):
+    return executeTest._writeBuffer._operations[(CitoTableType.TestSuiteStates, 'org')]
+
+
+def test_unread_suite_state_is_reset_instead_of_appended_to(monkeypatch):
+    # a plain update of a missing state would fail the bulk write of the whole execution
+    executeTest = _buildExecuteTest(monkeypatch)
+    executeTest._stageWindowPoint(5, None)
+
+    filter, update = buildWindowResetUpdate('suite', None)
+    assert _stateOperations(executeTest) == [UpdateOne(filter, update, upsert=True)]
+
+
+def test_read_suite_state_is_appended_to(monkeypatch):
+    executeTest = _buildExecuteTest(monkeypatch)
+    executeTest._toStateHistoryEntries({'window': [], 'first': None, 'count': 0}, None)
+    executeTest._stageWindowPoint(5, None)
+
+    filter, update = buildWindowPointUpdate('suite', None, executeTest._suiteStateWindowSize, '2023-01-01T00:00:00', 5)
+    assert _stateOperations(executeTest) == [UpdateOne(filter, update)]
+
+
+def test_missing_value_is_appended_without_statistics(monkeypatch):
+    executeTest = _buildExecuteTest(monkeypatch)
+    executeTest._streamingStatisticsEnabled = True
+    executeTest._toStateHistoryEntries({'window': [{'t': '2022-12-31T00:00:00', 'v': 1.0}], 'first': None, 'count': 1}, None)
+    executeTest._stageWindowPoint(None, None)
+
+    statistics, _ = executeTest._windowStatistics[None]
+    assert len(statistics) == 2
+    assert statistics.median() == 1.0
+
+
+def test_state_window_size_is_configurable(monkeypatch):
+    monkeypatch.setenv('SUITE_STATE_WINDOW_SIZE', '60')
+    executeTest = _buildExecuteTest(monkeypatch)
+
+    assert executeTest._readsSuiteState(HistoryWindow(25))
+    assert executeTest._readsSuiteState(HistoryWindow(60))
+    assert not executeTest._readsSuiteState(HistoryWindow(61))
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from pymongo import InsertOne, UpdateOne
+
+sys.path.insert(0, os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', '..', 'src'))
+
+import execute_test_async  # noqa: E402
+import write_buffer  # noqa: E402
+from cito_data_query import CitoTableType, _checkBulkWriteResult  # noqa: E402
+from execute_test import ExecuteTestAuthDto, ExecuteTestRequestDto  # noqa: E402
+from execute_test_async import AsyncExecuteTest, executeTestsAsync  # noqa: E402
+from model_runner import InProcessModelRunner  # noqa: E402
+from result import Result  # noqa: E402
+from write_buffer import WriteBuffer  # noqa: E402
+
+
+def _recordBulkWrites(monkeypatch):
+    writes = []
+
+    def bulkWrite(operations, tableType, dbConnection, organizationId, writeConcern=None):
+        writes.append((tableType, organizationId, operations))
+
+    async def bulkWriteAsync(operations, tableType, dbConnection, organizationId, writeConcern=None):
+        bulkWrite(operations, tableType, dbConnection, organizationId, writeConcern)
+
+    monkeypatch.setattr(write_buffer, 'bulkWriteTableData', bulkWrite)
+    monkeypatch.setattr(write_buffer, 'bulkWriteTableDataAsync', bulkWriteAsync)
+    return writes
+
+
+def test_flush_writes_one_bulk_per_collection(monkeypatch):
+    writes = _recordBulkWrites(monkeypatch)
+    writeBuffer = WriteBuffer()
+    writeBuffer.insert({'id': 'a'}, CitoTableType.TestHistory, 'org')
+    writeBuffer.insert({'id': 'b'}, CitoTableType.TestHistory, 'org')
+    writeBuffer.upsert({'_id': 's'}, {'$set': {'count': 1}}, CitoTableType.TestSuiteStates, 'org')
+    writeBuffer.update('suite', CitoTableType.TestSuites, 'last_alert_sent', None, 'other')
+
+    assert len(writeBuffer) == 4
+    writeBuffer.flush(None)
+
+    assert writes == [(CitoTableType.TestHistory, 'org', [InsertOne({'id': 'a'}), InsertOne({'id': 'b'})]),
+                      (CitoTableType.TestSuiteStates, 'org', [UpdateOne({'_id': 's'}, {'$set': {'count': 1}}, upsert=True)]),
+                      (CitoTableType.TestSuites, 'other', [UpdateOne({'id': 'suite'}, {'$set': {'last_alert_sent': None}})])]
+    assert len(writeBuffer) == 0
+
+
+def test_extend_and_flush_async(monkeypatch):
+    writes = _recordBulkWrites(monkeypatch)
+    batch, execution = WriteBuffer(), WriteBuffer()
+    batch.insert({'id': 'a'}, CitoTableType.TestHistory, 'org')
+    execution.insert({'id': 'b'}, CitoTableType.TestHistory, 'org')
+    batch.extend(execution)
+
+    asyncio.run(batch.flushAsync(None))
+
+    assert writes == [(CitoTableType.TestHistory, 'org', [InsertOne({'id': 'a'}), InsertOne({'id': 'b'})])]
+
+
+def test_bulk_write_result_must_cover_every_operation():
+    operations = [InsertOne({'id': 'a'}), UpdateOne({'_id': 's'}, {'$set': {}})]
+
+    _checkBulkWriteResult(SimpleNamespace(acknowledged=True, inserted_count=1, matched_count=1, upserted_count=0), operations)
+    with pytest.raises(Exception):
+        # e.g. the update did not match a document
+        _checkBulkWriteResult(SimpleNamespace(acknowledged=True, inserted_count=1, matched_count=0, upserted_count=0), operations)
+
+
+def _runBatch(monkeypatch, testSuiteIds, failingTestSuiteId):
+    monkeypatch.setenv('BATCH_FLUSH_SIZE', '2')
+    monkeypatch.setattr(execute_test_async, 'buildModelRunner', lambda workers: InProcessModelRunner())
+
+    async def noPrefetch(executions, executeTests, dbConnection):
+        return [None] * len(executions)
+    monkeypatch.setattr(execute_test_async, '_prefetchInputsAsync', noPrefetch)
+
+    async def execute(self, request, auth):
+        self._alertClaimTableType = None
+        self._batchWriteBuffer.insert({'test_suite_id': request.testSuiteId}, CitoTableType.TestHistory, 'org')
+        return Result.ok(SimpleNamespace(testSuiteId=request.testSuiteId))
+    monkeypatch.setattr(AsyncExecuteTest, 'execute', execute)
+
+    flushed = []
+
+    async def flushAsync(self, dbConnection):
+        testSuiteIds = [operation._doc['test_suite_id'] for operations in self._operations.values() for operation in operations]
+        if failingTestSuiteId in testSuiteIds:
+            raise Exception('Bulk write of documents failed')
+        flushed.append(testSuiteIds)
+    monkeypatch.setattr(WriteBuffer, 'flushAsync', flushAsync)
+
+    auth = ExecuteTestAuthDto('jwt', None, True)
+    results = asyncio.run(executeTestsAsync([(ExecuteTestRequestDto(testSuiteId, 'MaterializationRowCount', 'org'), auth)
+                                             for testSuiteId in testSuiteIds], None, object()))
+    return results, flushed
+
+
+def test_batch_is_flushed_in_chunks(monkeypatch):
+    results, flushed = _runBatch(monkeypatch, ['a', 'b', 'c', 'd', 'e'], None)
+
+    assert [result.success for result in results] == [True] * 5
+    assert sorted(len(chunk) for chunk in flushed) == [1, 2, 2]
+    assert sorted(testSuiteId for chunk in flushed for testSuiteId in chunk) == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_failed_flush_fails_its_chunk_only(monkeypatch):
+    results, flushed = _runBatch(monkeypatch, ['a', 'b', 'c', 'd', 'e'], 'c')
+
+    # the executions complete in order, c shares its chunk with d
+    assert [result.success for result in results] == [True, True, False, False, True]
+    assert sorted(testSuiteId for chunk in flushed for testSuiteId in chunk) == ['a', 'b', 'e']